@@ -0,0 +1,83 @@
+"""
+Utilidades de logging estructurado para GarzonGoQR
+
+- RequestIdMiddleware: asigna un ID de correlación a cada request
+- RequestIdFilter: agrega ese ID a cada LogRecord
+- JsonFormatter: formatea los registros como una línea JSON
+
+La configuración (LOGGING) vive en GarzonGoQR/settings.py y cambia según DJANGO_ENV.
+"""
+import json
+import logging
+import uuid
+from contextvars import ContextVar
+
+
+REQUEST_ID_HEADER = 'HTTP_X_REQUEST_ID'
+RESPONSE_REQUEST_ID_HEADER = 'X-Request-ID'
+
+_request_id = ContextVar('request_id', default='-')
+
+
+def get_request_id():
+    """ID de correlación del request actual ('-' fuera de un request)"""
+    return _request_id.get()
+
+
+class RequestIdMiddleware:
+    """
+    Asigna un ID de correlación por request (respeta X-Request-ID si viene del proxy)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.META.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        request.request_id = request_id
+        token = _request_id.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_id.reset(token)
+
+        response[RESPONSE_REQUEST_ID_HEADER] = request_id
+        return response
+
+
+class RequestIdFilter(logging.Filter):
+    """Agrega record.request_id para usarlo en los formatters"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatter que emite una línea JSON por registro
+    """
+
+    # Atributos estándar de LogRecord que no se copian como campos extra
+    RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+        'message', 'asctime', 'request_id',
+    }
+
+    def format(self, record):
+        payload = {
+            'timestamp': self.formatTime(record, '%Y-%m-%dT%H:%M:%S%z'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+
+        # Campos pasados con extra={...}
+        for key, value in record.__dict__.items():
+            if key not in self.RESERVED_ATTRS and not key.startswith('_'):
+                payload[key] = value
+
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+
+        return json.dumps(payload, ensure_ascii=False, default=str)
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'GarzonGoQR.request_logging.RequestIdMiddleware',  # ← ID de correlación para logs (PRIMERO)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'restaurants.middleware.TenantMiddleware',  # ← Agregar TEMPRANO
@@ -170,9 +171,140 @@ SESSION_COOKIE_AGE = 86400  # 24 horas
 # 🔒 Protocolo para URLs de QR cuando se usan dominios personalizados
 USE_HTTPS = not DEBUG  # HTTPS en producción, HTTP en desarrollo
 
+# 🖼️ Caché de imágenes QR renderizadas (la clave incluye UUID y URL, no hace falta invalidar)
+QR_CACHE_TTL = 60 * 60 * 24 * 30  # 30 días
+
+# 🖨️ Exportación masiva de QR (PDF/ZIP): procesos para renderizar en paralelo
+# (comando export_table_qrs; la descarga web renderiza en el mismo proceso)
+QR_EXPORT_WORKERS = min(4, os.cpu_count() or 1)
+
+# 📤 Exportación de pedidos y ventas (CSV/XLSX): filas leídas por vuelta del cursor
+EXPORT_CHUNK_SIZE = 2000
+
+# 🍳 Cola del KDS: segundos antes del cursor que se vuelven a leer en cada poll
+# (updated_at no sigue el orden de commit)
+KDS_CURSOR_OVERLAP = 5
+
+# 📲 Buffer de escaneos QR: los TableScanLog y total_scans se escriben en lote
+SCAN_BUFFER_FLUSH_INTERVAL = 2    # Segundos entre vaciados del buffer
+SCAN_BUFFER_MAX_EVENTS = 500      # Vaciar antes si se acumulan tantos escaneos
+SCAN_BUFFER_MAX_PENDING = 10000   # Máximo en memoria; sobre eso se descartan los más antiguos
+
+# 🔢 Contadores agrupados (platos/bebidas preparados): segundos entre escrituras
+COUNTER_FLUSH_INTERVAL = 5
+
+# 🔁 Hilos de vaciado en segundo plano (escaneos, contadores, eventos, mesas):
+# intentos antes de descartar una unidad de trabajo que no se puede escribir
+BACKGROUND_FLUSH_MAX_ATTEMPTS = 5
+
+# 👥 Rol de empleado por (usuario, restaurante) cacheado (se invalida por señales)
+STAFF_ROLE_CACHE_TTL = 300
+
+# 📊 Estadísticas de cocina/bar del día (una agregación, caché corto)
+STATION_STATS_TTL = 15
+
+# 🧾 Estadísticas de pedidos del día (una agregación, se invalida al cambiar un pedido)
+ORDER_STATS_TTL = 30
+
+# 📡 Eventos de pedidos por WebSocket: agrupación y control de flujo
+ORDER_EVENTS_COALESCE_WINDOW = 0.1      # Ventana de agrupación por grupo (segundos; 0 = sin agrupar)
+ORDER_EVENTS_MAX_PENDING = 1000         # Enviar antes si se acumulan tantos eventos
+ORDER_EVENTS_CONNECTION_QUEUE = 100     # Pedidos pendientes por conexión antes de descartar
+
+# 🪑 Estado de mesas por garzón (proyección en caché, actualizada por eventos)
+WAITER_TABLE_STATE_TTL = 300            # Reconstrucción completa como máximo cada N segundos
+TABLE_STATE_REFRESH_WINDOW = 0.5        # Segundos para juntar mesas modificadas antes de recalcular
+
 # 🕐 Configuración de sesiones de mesa
 TABLE_SESSION_DURATION = 60      # Duración total de sesión (minutos)
 TABLE_INACTIVITY_TIMEOUT = 45    # Tiempo máximo sin actividad (minutos)
+TABLE_SESSION_ACTIVITY_WRITE_INTERVAL = 60  # Escribir last_activity como máximo cada N segundos
+TABLE_SNAPSHOT_TTL = 300         # TTL del estado de mesa cacheado para validar sesiones (segundos)
+
+# ============================================================================
+# ⚡ CACHÉ DE RESOLUCIÓN DE TENANTS
+# ============================================================================
+
+TENANT_CACHE_LOCAL_TTL = 30       # TTL del LRU en memoria de cada proceso (segundos)
+TENANT_CACHE_TTL = 300            # TTL en el caché compartido (segundos)
+TENANT_CACHE_MAX_ENTRIES = 512    # Máximo de slugs en el LRU local
+
+# ============================================================================
+# 🍽️ CACHÉ DEL MENÚ
+# ============================================================================
+
+# Los datos derivados del menú se cachean por versión (menu/menu_cache.py);
+# toda edición del menú cambia la versión, el TTL solo limita la memoria usada
+MENU_PRICE_TABLE_TTL = 3600       # Tabla de precios por tenant (segundos)
+MENU_SNAPSHOT_TTL = 3600          # Snapshot JSON del menú público (segundos)
+MENU_SEARCH_BACKEND = 'memory'    # 'memory' (índice en proceso) o 'postgres' (SearchVector + GIN)
+
+# ============================================================================
+# 🧾 NUMERACIÓN DE PEDIDOS
+# ============================================================================
+
+# Números reservados por proceso en cada acceso al contador diario del restaurante.
+# 1 = numeración contigua (cada pedido bloquea el contador); >1 = menos contención, con huecos
+ORDER_NUMBER_BLOCK_SIZE = 10
+
+# ============================================================================
+# 📝 LOGGING
+# ============================================================================
+
+# Formato: 'verbose' (texto legible) o 'json' (pipeline de logs). Nivel de las apps.
+LOG_FORMAT = os.environ.get('DJANGO_LOG_FORMAT', 'verbose')
+LOG_LEVEL = os.environ.get('DJANGO_LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'GarzonGoQR.request_logging.RequestIdFilter',
+        },
+    },
+    'formatters': {
+        'verbose': {
+            'format': '%(asctime)s %(levelname)s [%(name)s] [%(request_id)s] %(message)s',
+        },
+        'json': {
+            '()': 'GarzonGoQR.request_logging.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['request_id'],
+            'formatter': LOG_FORMAT,
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': 'WARNING',
+    },
+    'loggers': {
+        'django': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'restaurants': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'menu': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'orders': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
 
 # ============================================================================
 # 🌍 CONFIGURACIÓN POR ENTORNO (OPCIONAL)
@@ -185,7 +317,13 @@ if ENVIRONMENT == 'production':
     # 🚀 PRODUCCIÓN - Configurar cuando subas a servidor
     # QR_BASE_URL = "https://tudominio.com"
     # USE_HTTPS = True
-    pass
+    
+    # Logs en JSON y sin DEBUG en los hot paths (salvo override por variable de entorno)
+    LOG_FORMAT = os.environ.get('DJANGO_LOG_FORMAT', 'json')
+    LOG_LEVEL = os.environ.get('DJANGO_LOG_LEVEL', 'INFO')
+    LOGGING['handlers']['console']['formatter'] = LOG_FORMAT
+    for _app_logger in ('restaurants', 'menu', 'orders'):
+        LOGGING['loggers'][_app_logger]['level'] = LOG_LEVEL
     
 elif ENVIRONMENT == 'staging':
     # 🧪 STAGING - Configurar si tienes servidor de pruebas  
@@ -1,6 +1,7 @@
 from decimal import Decimal
 from django.conf import settings
-from .models import MenuItem, MenuVariant, MenuAddon, MenuModifier
+from .models import MenuItem
+from .pricing import get_price_table, price_line, reprice_cart
 
 
 class Cart:
@@ -21,6 +22,7 @@ class Cart:
             cart = self.session[settings.CART_SESSION_ID] = {}
         
         self.cart = cart
+        self._pricing = None
     
     def add(self, menu_item, quantity=1, variant_id=None, addon_ids=None, modifier_ids=None, override_quantity=False):
         """
@@ -29,6 +31,27 @@ class Cart:
         addon_ids = addon_ids or []
         modifier_ids = modifier_ids or []
         
+        # Precios desde la tabla de precios del tenant (opciones inválidas se descartan)
+        line = price_line(
+            get_price_table(menu_item.tenant_id),
+            menu_item.id,
+            variant_id=variant_id,
+            addon_ids=addon_ids,
+            modifier_ids=modifier_ids,
+            strict=False
+        )
+        variant_id = line.get('variant_id', variant_id)
+        addon_ids = line.get('addon_ids', addon_ids)
+        modifier_ids = line.get('modifier_ids', modifier_ids)
+        
+        base_price = line.get('base_price', menu_item.current_price)
+        variant_price = line.get('variant_price', Decimal('0'))
+        variant_name = line.get('variant_name')
+        addon_price = line.get('addon_price', Decimal('0'))
+        addon_names = line.get('addon_names', [])
+        modifier_price = line.get('modifier_price', Decimal('0'))
+        modifier_names = line.get('modifier_names', [])
+        
         # Crear un ID único para este item específico (producto + variantes + addons + modifiers)
         item_id = str(menu_item.id)
         variant_key = f"variant_{variant_id}" if variant_id else "no_variant"
@@ -37,38 +60,6 @@ class Cart:
         
         cart_item_id = f"{item_id}_{variant_key}_{addons_key}_{modifiers_key}"
         
-        # Calcular precio base
-        base_price = menu_item.current_price
-        
-        # Agregar precio de variante
-        variant_price = Decimal('0')
-        variant_name = None
-        if variant_id:
-            try:
-                variant = MenuVariant.objects.get(id=variant_id, menu_item=menu_item)
-                variant_price = variant.price_modifier
-                variant_name = variant.name
-            except MenuVariant.DoesNotExist:
-                pass
-        
-        # Agregar precios de addons
-        addon_price = Decimal('0')
-        addon_names = []
-        if addon_ids:
-            addons = MenuAddon.objects.filter(id__in=addon_ids, menu_items=menu_item)
-            for addon in addons:
-                addon_price += addon.price
-                addon_names.append(addon.name)
-        
-        # Agregar precios de modificadores
-        modifier_price = Decimal('0')
-        modifier_names = []
-        if modifier_ids:
-            modifiers = MenuModifier.objects.filter(id__in=modifier_ids, menu_items=menu_item)
-            for modifier in modifiers:
-                modifier_price += modifier.price_modifier
-                modifier_names.append(modifier.name)
-        
         # Precio total por unidad
         unit_price = base_price + variant_price + addon_price + modifier_price
         
@@ -103,8 +94,36 @@ class Cart:
         """
         Marcar la sesión como modificada para asegurar que se guarde
         """
+        self._pricing = None
         self.session.modified = True
     
+    def reprice(self):
+        """
+        Recalcular el carrito completo en el servidor (una vez por instancia)
+        
+        Actualiza en la sesión los precios que hayan cambiado y retorna un CartPricing
+        con las líneas no disponibles o sin stock en .issues
+        """
+        if self._pricing is None:
+            tenant_id = self.tenant.id if self.tenant else None
+            pricing = reprice_cart(tenant_id, self.cart)
+            
+            changed = False
+            for cart_item_id, line in pricing.lines.items():
+                if 'unit_price' not in line:
+                    continue
+                item = self.cart[cart_item_id]
+                for field in ('unit_price', 'base_price', 'variant_price', 'addon_price', 'modifier_price'):
+                    value = str(line[field])
+                    if item.get(field) != value:
+                        item[field] = value
+                        changed = True
+            if changed:
+                self.session.modified = True
+            
+            self._pricing = pricing
+        return self._pricing
+    
     def remove(self, cart_item_id):
         """
         Remover un producto del carrito
@@ -133,14 +152,16 @@ class Cart:
     
     def __iter__(self):
         """
-        Iterar sobre los items del carrito y obtener los productos de la base de datos
+        Iterar sobre los items del carrito (con precios recalculados) y obtener los productos de la base de datos
         """
+        pricing = self.reprice()
         menu_item_ids = [item['menu_item_id'] for item in self.cart.values()]
-        menu_items = MenuItem.objects.filter(id__in=menu_item_ids)
-        cart = self.cart.copy()
+        menu_items = {str(mi.id): mi for mi in MenuItem.objects.filter(id__in=menu_item_ids)}
         
-        for cart_item_id, item in cart.items():
-            menu_item = next((mi for mi in menu_items if str(mi.id) == item['menu_item_id']), None)
+        for cart_item_id, stored_item in self.cart.items():
+            # Copia: los objetos agregados abajo no deben terminar en la sesión
+            item = dict(stored_item)
+            menu_item = menu_items.get(item['menu_item_id'])
             if menu_item:
                 # Incluir el objeto MenuItem para templates (necesario para cart.html)
                 item['menu_item'] = menu_item
@@ -152,6 +173,9 @@ class Cart:
                 item['unit_price'] = str(unit_price)
                 item['total_price'] = str(total_price)
                 
+                # Problemas detectados al revalidar (no disponible, sin stock, etc.)
+                item['pricing_issue'] = pricing.lines[cart_item_id]['issue']
+                
                 yield item
     
     def __len__(self):
@@ -162,9 +186,9 @@ class Cart:
     
     def get_total_price(self):
         """
-        Calcular el precio total del carrito
+        Calcular el precio total del carrito (recalculado en el servidor, solo líneas válidas)
         """
-        return sum(Decimal(item['unit_price']) * item['quantity'] for item in self.cart.values())
+        return self.reprice().total
     
     def get_total_items(self):
         """
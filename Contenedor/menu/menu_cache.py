@@ -0,0 +1,33 @@
+"""
+Versión del menú por tenant
+
+Cada tenant tiene un token de versión en el caché compartido. Toda edición del
+menú (ver menu/signals.py) lo reemplaza, y los datos derivados del menú (tabla
+de precios, snapshots, etc.) usan la versión en su clave de caché. Así una
+edición invalida todo de una vez sin borrar claves una por una.
+"""
+import uuid
+
+from django.core.cache import cache
+
+
+MENU_VERSION_KEY = "menu_version_{tenant_id}"
+
+
+def get_menu_version(tenant_id):
+    """Versión actual del menú de un tenant (se crea si no existe)"""
+    key = MENU_VERSION_KEY.format(tenant_id=tenant_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add() para no pisar una versión creada en paralelo por otro proceso
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_menu_version(tenant_id):
+    """Invalidar todo lo cacheado del menú de un tenant"""
+    version = uuid.uuid4().hex
+    cache.set(MENU_VERSION_KEY.format(tenant_id=tenant_id), version, timeout=None)
+    return version
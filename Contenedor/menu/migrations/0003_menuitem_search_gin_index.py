@@ -0,0 +1,37 @@
+# Índice GIN para la búsqueda full-text del menú (menu/search.py)
+
+from django.db import migrations
+
+
+INDEX_NAME = 'menu_item_search_gin'
+
+
+def _search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    # Misma expresión que PostgresMenuSearchBackend usa al consultar
+    return GinIndex(SearchVector('name', 'description', config='simple'), name=INDEX_NAME)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('menu', 'MenuItem'), _search_index())
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('menu', 'MenuItem'), _search_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0002_menuitem_item_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,51 @@
+# Búsqueda del menú sin acentos: configuración de texto con unaccent e índice GIN sobre ella
+
+from django.db import migrations
+
+
+SEARCH_CONFIG = 'menu_unaccent'
+INDEX_NAME = 'menu_item_search_gin'
+
+
+def _search_index(config):
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    # Misma expresión que PostgresMenuSearchBackend usa al consultar
+    return GinIndex(SearchVector('name', 'description', config=config), name=INDEX_NAME)
+
+
+def use_unaccent_config(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    schema_editor.execute(f"DROP TEXT SEARCH CONFIGURATION IF EXISTS {SEARCH_CONFIG}")
+    schema_editor.execute(f"CREATE TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} (COPY = simple)")
+    schema_editor.execute(
+        f"ALTER TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} "
+        f"ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple"
+    )
+
+    menu_item = apps.get_model('menu', 'MenuItem')
+    schema_editor.remove_index(menu_item, _search_index('simple'))
+    schema_editor.add_index(menu_item, _search_index(SEARCH_CONFIG))
+
+
+def use_simple_config(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    menu_item = apps.get_model('menu', 'MenuItem')
+    schema_editor.remove_index(menu_item, _search_index(SEARCH_CONFIG))
+    schema_editor.add_index(menu_item, _search_index('simple'))
+    schema_editor.execute(f"DROP TEXT SEARCH CONFIGURATION IF EXISTS {SEARCH_CONFIG}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0003_menuitem_search_gin_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_unaccent_config, use_simple_config),
+    ]
@@ -0,0 +1,240 @@
+"""
+Motor de precios del carrito
+
+Los precios guardados en la sesión (Cart) son solo una referencia para mostrar:
+el carrito completo se recalcula en el servidor contra una tabla de precios del
+tenant (precio actual, variantes, extras, modificadores, disponibilidad y stock).
+
+La tabla se arma con una consulta por modelo y se guarda en el caché compartido
+bajo la versión del menú del tenant (ver menu/menu_cache.py), así que cualquier
+edición del menú la invalida.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .menu_cache import get_menu_version
+from .models import MenuItem, MenuVariant, MenuAddon, MenuModifier
+
+logger = logging.getLogger(__name__)
+
+
+PRICE_TABLE_KEY = "menu_price_table_{tenant_id}_{version}"
+
+
+class CartPricingError(Exception):
+    """El carrito tiene productos no disponibles o sin stock suficiente"""
+
+
+# ============================================================================
+# TABLA DE PRECIOS POR TENANT
+# ============================================================================
+
+def get_price_table(tenant_id):
+    """
+    Tabla de precios del tenant (cacheada por versión del menú)
+    """
+    key = PRICE_TABLE_KEY.format(tenant_id=tenant_id, version=get_menu_version(tenant_id))
+    table = cache.get(key)
+    if table is None:
+        table = build_price_table(tenant_id)
+        cache.set(key, table, timeout=getattr(settings, 'MENU_PRICE_TABLE_TTL', 3600))
+    return table
+
+
+def build_price_table(tenant_id):
+    """
+    Armar la tabla de precios desde la BD (una consulta por modelo)
+    """
+    items = {}
+    for row in MenuItem.objects.filter(tenant_id=tenant_id).values(
+        'id', 'name', 'base_price', 'discounted_price', 'is_available',
+        'stock_quantity', 'category__is_active'
+    ):
+        items[str(row['id'])] = {
+            'name': row['name'],
+            'price': row['discounted_price'] if row['discounted_price'] else row['base_price'],
+            'available': row['is_available'] and row['category__is_active'],
+            'stock': row['stock_quantity'],
+        }
+
+    variants = {}
+    for row in MenuVariant.objects.filter(tenant_id=tenant_id).values(
+        'id', 'menu_item_id', 'name', 'price_modifier', 'is_available'
+    ):
+        variants[str(row['id'])] = {
+            'menu_item_id': str(row['menu_item_id']),
+            'name': row['name'],
+            'price': row['price_modifier'],
+            'available': row['is_available'],
+        }
+
+    return {
+        'items': items,
+        'variants': variants,
+        'addons': _options_with_items(MenuAddon, tenant_id, 'price'),
+        'modifiers': _options_with_items(MenuModifier, tenant_id, 'price_modifier'),
+    }
+
+
+def _options_with_items(model, tenant_id, price_field):
+    """Extras/modificadores con los productos compatibles (join sobre la tabla M2M)"""
+    options = {}
+    for row in model.objects.filter(tenant_id=tenant_id).values(
+        'id', 'name', price_field, 'is_available', 'menu_items'
+    ):
+        option = options.setdefault(str(row['id']), {
+            'name': row['name'],
+            'price': row[price_field],
+            'available': row['is_available'],
+            'menu_item_ids': set(),
+        })
+        if row['menu_items']:
+            option['menu_item_ids'].add(str(row['menu_items']))
+    return options
+
+
+# ============================================================================
+# CÁLCULO DE PRECIOS
+# ============================================================================
+
+def price_line(table, menu_item_id, quantity=1, variant_id=None, addon_ids=None, modifier_ids=None, strict=True):
+    """
+    Precio de una línea del carrito según la tabla de precios
+
+    Con strict=False las opciones inválidas se descartan en silencio (al agregar
+    al carrito); con strict=True se reportan en 'issue' (al revalidar).
+    """
+    menu_item_id = str(menu_item_id)
+    item = table['items'].get(menu_item_id)
+    if item is None:
+        return {'issue': 'Producto no encontrado'}
+
+    issue = None if item['available'] else 'Producto no disponible'
+
+    variant_price = Decimal('0')
+    variant_name = None
+    if variant_id:
+        variant = table['variants'].get(str(variant_id))
+        if variant and variant['menu_item_id'] == menu_item_id and variant['available']:
+            variant_price = variant['price']
+            variant_name = variant['name']
+        elif strict:
+            issue = issue or 'Variante no disponible'
+        else:
+            variant_id = None
+
+    addon_price, addon_names, addon_ids, addon_issue = _price_options(
+        table['addons'], menu_item_id, addon_ids, strict
+    )
+    modifier_price, modifier_names, modifier_ids, modifier_issue = _price_options(
+        table['modifiers'], menu_item_id, modifier_ids, strict
+    )
+    issue = issue or (addon_issue and 'Extra no disponible') or (modifier_issue and 'Modificador no disponible')
+
+    unit_price = item['price'] + variant_price + addon_price + modifier_price
+
+    return {
+        'name': item['name'],
+        'base_price': item['price'],
+        'variant_id': variant_id,
+        'variant_name': variant_name,
+        'variant_price': variant_price,
+        'addon_ids': addon_ids,
+        'addon_names': addon_names,
+        'addon_price': addon_price,
+        'modifier_ids': modifier_ids,
+        'modifier_names': modifier_names,
+        'modifier_price': modifier_price,
+        'unit_price': unit_price,
+        'total_price': unit_price * quantity,
+        'issue': issue,
+    }
+
+
+def _price_options(options, menu_item_id, option_ids, strict):
+    price = Decimal('0')
+    names = []
+    valid_ids = []
+    has_issue = False
+
+    for option_id in option_ids or []:
+        option = options.get(str(option_id))
+        if option and option['available'] and menu_item_id in option['menu_item_ids']:
+            price += option['price']
+            names.append(option['name'])
+            valid_ids.append(option_id)
+        elif strict:
+            has_issue = True
+
+    return price, names, (list(option_ids or []) if strict else valid_ids), has_issue
+
+
+class CartPricing:
+    """
+    Resultado de recalcular un carrito completo
+    """
+
+    def __init__(self, lines):
+        self.lines = lines  # cart_item_id -> línea calculada
+
+    @property
+    def issues(self):
+        return [
+            {'cart_item_id': cart_item_id, 'name': line.get('name', ''), 'reason': line['issue']}
+            for cart_item_id, line in self.lines.items()
+            if line['issue']
+        ]
+
+    @property
+    def is_valid(self):
+        return not any(line['issue'] for line in self.lines.values())
+
+    @property
+    def total(self):
+        """Total de las líneas válidas"""
+        return sum(
+            (line['total_price'] for line in self.lines.values() if not line['issue']),
+            Decimal('0')
+        )
+
+    def error_message(self):
+        return '; '.join(
+            f"{issue['name']}: {issue['reason']}" if issue['name'] else issue['reason']
+            for issue in self.issues
+        )
+
+
+def reprice_cart(tenant_id, cart_items):
+    """
+    Recalcular todas las líneas de un carrito (dict de la sesión) en una pasada
+    """
+    table = get_price_table(tenant_id)
+    lines = {}
+    quantities = defaultdict(int)
+
+    for cart_item_id, item in cart_items.items():
+        lines[cart_item_id] = price_line(
+            table,
+            item['menu_item_id'],
+            quantity=item['quantity'],
+            variant_id=item.get('variant_id'),
+            addon_ids=item.get('addon_ids'),
+            modifier_ids=item.get('modifier_ids'),
+        )
+        quantities[str(item['menu_item_id'])] += item['quantity']
+
+    # Stock: la suma de todas las líneas del mismo producto
+    for cart_item_id, item in cart_items.items():
+        line = lines[cart_item_id]
+        stock = table['items'].get(str(item['menu_item_id']), {}).get('stock')
+        if not line['issue'] and stock is not None and quantities[str(item['menu_item_id'])] > stock:
+            line['issue'] = 'Stock insuficiente'
+
+    pricing = CartPricing(lines)
+    if not pricing.is_valid:
+        logger.info("Carrito con %s líneas inválidas (tenant %s)", len(pricing.issues), tenant_id)
+    return pricing
@@ -0,0 +1,268 @@
+"""
+Búsqueda de productos del menú
+
+Dos backends con la misma interfaz (search(tenant, query, limit)):
+
+- MemoryMenuSearchBackend (por defecto): índice invertido por tenant en memoria
+  del proceso, armado desde el snapshot del menú (menu/snapshot.py). Cuando la
+  versión del menú cambia solo se re-tokenizan los productos que cambiaron.
+  Tokenización sin acentos, coincidencia por prefijo y ranking por campo
+  (nombre > categoría > descripción).
+- PostgresMenuSearchBackend: SearchVector sobre nombre y descripción con índice
+  GIN (migraciones menu 0003/0004, solo en PostgreSQL). Usa la configuración
+  de texto menu_unaccent (simple + unaccent), así "cafe" encuentra "café" igual
+  que en el backend en memoria.
+
+El backend se elige con settings.MENU_SEARCH_BACKEND ('memory' o 'postgres').
+"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .snapshot import get_menu_snapshot
+
+
+# Peso de cada campo en el ranking
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category_name': 2.0,
+    'short_description': 1.0,
+    'description': 1.0,
+}
+
+# Bonus cuando el token coincide completo (no solo como prefijo)
+EXACT_MATCH_BONUS = 0.5
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Minúsculas y sin acentos ('Piña Colada' -> 'pina colada')"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def _result(item):
+    return {
+        'id': item['id'],
+        'name': item['name'],
+        'slug': item['slug'],
+        'category': item['category_name'],
+        'price': item['current_price'],
+        'image': item['image'],
+        'is_featured': item['is_featured'],
+    }
+
+
+# ============================================================================
+# ÍNDICE EN MEMORIA
+# ============================================================================
+
+class TenantSearchIndex:
+    """
+    Índice invertido de los productos de un tenant
+    """
+
+    def __init__(self):
+        self.version = None
+        self.items = {}        # item_id -> dict del snapshot
+        self._docs = {}        # item_id -> {término: peso}
+        self._postings = {}    # término -> {item_id: peso}
+        self._terms = []       # vocabulario ordenado (para prefijos con bisect)
+
+    def sync(self, version, items):
+        """
+        Actualizar el índice a una versión del menú (incremental por producto)
+        """
+        current = {item['id']: item for item in items}
+
+        for item_id in set(self.items) - set(current):
+            self._remove(item_id)
+
+        for item_id, item in current.items():
+            previous = self.items.get(item_id)
+            if previous is None or self._indexed_fields(previous) != self._indexed_fields(item):
+                self._remove(item_id)
+                self._add(item_id, item)
+
+        self.items = current
+        self._terms = sorted(self._postings)
+        self.version = version
+
+    @staticmethod
+    def _indexed_fields(item):
+        return tuple(item.get(field) for field in FIELD_WEIGHTS)
+
+    def _add(self, item_id, item):
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(item.get(field)):
+                if weights.get(term, 0) < weight:
+                    weights[term] = weight
+
+        self._docs[item_id] = weights
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[item_id] = weight
+
+    def _remove(self, item_id):
+        for term in self._docs.pop(item_id, {}):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(item_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _matches(self, token):
+        """item_id -> puntaje para un token de la consulta (exacto o prefijo)"""
+        scores = {}
+        start = bisect_left(self._terms, token)
+        for term in self._terms[start:]:
+            if not term.startswith(token):
+                break
+            bonus = EXACT_MATCH_BONUS if term == token else 0.0
+            for item_id, weight in self._postings[term].items():
+                score = weight + bonus
+                if scores.get(item_id, 0) < score:
+                    scores[item_id] = score
+        return scores
+
+    def search(self, query, limit=10):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        # Todos los tokens deben coincidir (AND); el puntaje es la suma
+        scores = None
+        for token in dict.fromkeys(tokens):
+            matches = self._matches(token)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    item_id: score + matches[item_id]
+                    for item_id, score in scores.items()
+                    if item_id in matches
+                }
+            if not scores:
+                return []
+
+        ranked = sorted(
+            scores.items(),
+            key=lambda pair: (-pair[1], not self.items[pair[0]]['is_featured'], self.items[pair[0]]['name'])
+        )
+        return [self.items[item_id] for item_id, _ in ranked[:limit]]
+
+
+class MemoryMenuSearchBackend:
+    """
+    Índices en memoria por tenant, sincronizados con la versión del snapshot
+    """
+
+    def __init__(self):
+        self._indexes = {}  # tenant_id -> TenantSearchIndex
+        self._lock = threading.Lock()
+
+    def search(self, tenant, query, limit=10, restaurant=None):
+        snapshot = get_menu_snapshot(tenant, restaurant)
+
+        with self._lock:
+            index = self._indexes.get(tenant.id)
+            if index is None:
+                index = self._indexes[tenant.id] = TenantSearchIndex()
+            if index.version != snapshot.version:
+                items = [item for category in snapshot.categories for item in category['items']]
+                index.sync(snapshot.version, items)
+            results = index.search(query, limit)
+
+        return [_result(item) for item in results]
+
+
+# ============================================================================
+# BACKEND POSTGRESQL
+# ============================================================================
+
+class PostgresMenuSearchBackend:
+    """
+    Búsqueda con SearchVector/SearchQuery usando el índice GIN de menu_menuitem
+    """
+
+    # Debe coincidir con la expresión del índice (migración menu 0004)
+    SEARCH_CONFIG = 'menu_unaccent'
+
+    def search(self, tenant, query, limit=10, restaurant=None):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+        from django.db.models import Q
+        from .models import MenuCategory, MenuItem
+
+        # Mismos tokens que el índice en memoria (sin acentos, solo \w)
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        vector = SearchVector('name', 'description', config=self.SEARCH_CONFIG)
+        search_query = SearchQuery(
+            ' & '.join(f"{token}:*" for token in tokens),
+            search_type='raw',
+            config=self.SEARCH_CONFIG
+        )
+
+        # Las categorías son pocas: se resuelven aparte para no unir en el índice
+        normalized_query = normalize(query)
+        category_ids = [
+            category_id
+            for category_id, name in MenuCategory.objects.filter(
+                tenant=tenant, is_active=True
+            ).values_list('id', 'name')
+            if normalized_query in normalize(name)
+        ]
+
+        items = MenuItem.objects.filter(
+            tenant=tenant,
+            is_available=True,
+            category__is_active=True
+        ).annotate(
+            search=vector,
+            rank=SearchRank(vector, search_query)
+        ).filter(
+            Q(search=search_query) | Q(category_id__in=category_ids)
+        ).select_related('category').order_by('-rank', '-is_featured', 'name')[:limit]
+
+        return [
+            {
+                'id': str(item.id),
+                'name': item.name,
+                'slug': item.slug,
+                'category': item.category.name,
+                'price': float(item.current_price),
+                'image': item.image.url if item.image else None,
+                'is_featured': item.is_featured,
+            }
+            for item in items
+        ]
+
+
+BACKENDS = {
+    'memory': MemoryMenuSearchBackend,
+    'postgres': PostgresMenuSearchBackend,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS[getattr(settings, 'MENU_SEARCH_BACKEND', 'memory')]()
+    return _backend
+
+
+def search_menu(tenant, query, limit=10, restaurant=None):
+    """Buscar productos disponibles del menú de un tenant"""
+    return get_search_backend().search(tenant, query, limit=limit, restaurant=restaurant)
@@ -0,0 +1,40 @@
+"""
+Señales de la app menu
+"""
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from restaurants.models import Restaurant
+from .menu_cache import bump_menu_version
+from .models import MenuCategory, MenuItem, MenuVariant, MenuAddon, MenuModifier
+
+
+# ============================================================================
+# INVALIDACIÓN DE DATOS CACHEADOS DEL MENÚ
+# ============================================================================
+
+@receiver(post_save, sender=MenuCategory)
+@receiver(post_delete, sender=MenuCategory)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=MenuVariant)
+@receiver(post_delete, sender=MenuVariant)
+@receiver(post_save, sender=MenuAddon)
+@receiver(post_delete, sender=MenuAddon)
+@receiver(post_save, sender=MenuModifier)
+@receiver(post_delete, sender=MenuModifier)
+def bump_menu_version_on_change(sender, instance, **kwargs):
+    bump_menu_version(instance.tenant_id)
+
+
+@receiver(m2m_changed, sender=MenuAddon.menu_items.through)
+@receiver(m2m_changed, sender=MenuModifier.menu_items.through)
+def bump_menu_version_on_compatibility_change(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_menu_version(instance.tenant_id)
+
+
+@receiver(post_save, sender=Restaurant)
+def bump_menu_version_on_restaurant_change(sender, instance, **kwargs):
+    # El snapshot del menú incluye el nombre del restaurante
+    bump_menu_version(instance.tenant_id)
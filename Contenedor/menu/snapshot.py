@@ -0,0 +1,176 @@
+"""
+Snapshot del menú público por tenant
+
+Un solo documento JSON con categorías activas, productos disponibles (con sus
+variantes, extras y modificadores) y destacados. Se arma una vez por versión del
+menú (menu/menu_cache.py) y se guarda ya serializado en el caché compartido
+junto con su ETag. MenuListView y menu_api renderizan desde aquí.
+
+Cada proceso además guarda el último snapshot parseado de cada tenant, así un
+request con la versión vigente solo cuesta leer la versión del caché.
+"""
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .menu_cache import get_menu_version
+from .models import MenuCategory, MenuItem, MenuVariant, MenuAddon, MenuModifier
+
+
+SNAPSHOT_KEY = "menu_snapshot_{tenant_id}_{version}"
+FEATURED_LIMIT = 6
+
+
+class MenuSnapshot:
+    """
+    Documento del menú ya serializado (payload) y parseado (data)
+    """
+
+    def __init__(self, version, payload, etag, data=None):
+        self.version = version
+        self.payload = payload
+        self.etag = etag
+        self.data = data if data is not None else json.loads(payload)
+
+    @property
+    def categories(self):
+        return self.data['categories']
+
+    @property
+    def featured_items(self):
+        return self.data['featured_items']
+
+
+# Último snapshot parseado por tenant en este proceso: tenant_id -> MenuSnapshot
+_local_snapshots = {}
+_local_lock = threading.Lock()
+
+
+def get_menu_snapshot(tenant, restaurant=None):
+    """
+    Snapshot vigente del menú del tenant (lo arma si la versión cambió)
+    """
+    version = get_menu_version(tenant.id)
+
+    with _local_lock:
+        snapshot = _local_snapshots.get(tenant.id)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    key = SNAPSHOT_KEY.format(tenant_id=tenant.id, version=version)
+    cached = cache.get(key)
+    if cached is not None:
+        snapshot = MenuSnapshot(version, cached['payload'], cached['etag'])
+    else:
+        data = build_menu_snapshot(tenant, restaurant)
+        payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8')
+        etag = '"%s"' % hashlib.sha1(payload).hexdigest()
+        cache.set(
+            key,
+            {'payload': payload, 'etag': etag},
+            timeout=getattr(settings, 'MENU_SNAPSHOT_TTL', 3600)
+        )
+        snapshot = MenuSnapshot(version, payload, etag, data)
+
+    with _local_lock:
+        _local_snapshots[tenant.id] = snapshot
+    return snapshot
+
+
+def build_menu_snapshot(tenant, restaurant=None):
+    """
+    Armar el documento del menú desde la BD (consultas constantes)
+    """
+    if restaurant is None:
+        restaurant = getattr(tenant, 'restaurant', None)
+
+    categories = list(
+        MenuCategory.objects.filter(tenant=tenant, is_active=True).order_by('order', 'name')
+    )
+
+    items = MenuItem.objects.filter(
+        tenant=tenant,
+        is_available=True
+    ).select_related('category').prefetch_related(
+        Prefetch('variants', queryset=MenuVariant.objects.filter(is_available=True).order_by('price_modifier')),
+        Prefetch('available_addons', queryset=MenuAddon.objects.filter(is_available=True).order_by('addon_type', 'price')),
+        Prefetch('available_modifiers', queryset=MenuModifier.objects.filter(is_available=True).order_by('name')),
+    )
+
+    items_by_category = {category.id: [] for category in categories}
+    featured_items = []
+
+    for item in items:
+        item_data = _serialize_item(item)
+        if item.category_id in items_by_category:
+            items_by_category[item.category_id].append(item_data)
+        if item.is_featured and len(featured_items) < FEATURED_LIMIT:
+            featured_items.append(item_data)
+
+    categories_data = []
+    for category in categories:
+        category_items = sorted(items_by_category[category.id], key=lambda data: (data['order'], data['name']))
+        categories_data.append({
+            'id': str(category.id),
+            'name': category.name,
+            'slug': category.slug,
+            'description': category.description,
+            'image': category.image.url if category.image else None,
+            'available_from': category.available_from.strftime('%H:%M') if category.available_from else None,
+            'available_until': category.available_until.strftime('%H:%M') if category.available_until else None,
+            'items': category_items,
+        })
+
+    return {
+        'restaurant': {
+            'name': restaurant.name if restaurant else tenant.name,
+            'slug': tenant.slug,
+        },
+        'categories': categories_data,
+        'featured_items': featured_items,
+        'total_items': sum(len(category['items']) for category in categories_data),
+    }
+
+
+def _serialize_item(item):
+    return {
+        'id': str(item.id),
+        'name': item.name,
+        'slug': item.slug,
+        'category_id': str(item.category_id),
+        'category_name': item.category.name,
+        'description': item.description,
+        'short_description': item.short_description,
+        'base_price': float(item.base_price),
+        'current_price': float(item.current_price),
+        'has_discount': bool(item.has_discount),
+        'discount_percentage': item.discount_percentage,
+        'is_featured': item.is_featured,
+        'preparation_time': item.preparation_time,
+        'calories': item.calories,
+        'is_vegetarian': item.is_vegetarian,
+        'is_vegan': item.is_vegan,
+        'is_gluten_free': item.is_gluten_free,
+        'is_spicy': item.is_spicy,
+        'allergens': item.allergens,
+        'image': item.image.url if item.image else None,
+        'is_in_stock': item.is_in_stock,
+        'order': item.order,
+        'variants': [
+            {'id': str(variant.id), 'name': variant.name, 'price_modifier': float(variant.price_modifier)}
+            for variant in item.variants.all()
+        ],
+        'addons': [
+            {'id': str(addon.id), 'name': addon.name, 'price': float(addon.price)}
+            for addon in item.available_addons.all()
+        ],
+        'modifiers': [
+            {'id': str(modifier.id), 'name': modifier.name, 'price_modifier': float(modifier.price_modifier)}
+            for modifier in item.available_modifiers.all()
+        ],
+    }
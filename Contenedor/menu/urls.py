@@ -19,4 +19,5 @@ urlpatterns = [
     
     # API endpoints
     path('api/', views.menu_api, name='api_menu'),
+    path('api/search/', views.menu_search_api, name='api_search'),
 ] 
\ No newline at end of file
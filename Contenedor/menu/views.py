@@ -1,8 +1,11 @@
+import logging
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import TemplateView, ListView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import JsonResponse, HttpResponseRedirect
-from django.db.models import Q, Prefetch, Count
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, HttpResponseRedirect
+from django.utils.http import parse_etags
+from django.db.models import Q, Count
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
@@ -10,6 +13,10 @@ from restaurants.middleware import get_current_tenant, get_current_restaurant
 from restaurants.views import TenantMixin
 from .models import MenuCategory, MenuItem, MenuVariant, MenuAddon, MenuModifier
 from .cart import Cart
+from .search import search_menu
+from .snapshot import get_menu_snapshot
+
+logger = logging.getLogger(__name__)
 
 
 class MenuListView(TenantMixin, TemplateView):
@@ -17,16 +24,13 @@ class MenuListView(TenantMixin, TemplateView):
     template_name = 'menu/menu_list.html'
     
     def dispatch(self, request, *args, **kwargs):
-        print(f"🔍 MenuListView.dispatch() - URL: {request.path}")
-        print(f"🔍 MenuListView.dispatch() - Tenant: {getattr(request, 'tenant', 'NO_TENANT')}")
+        logger.debug("MenuListView.dispatch() - URL: %s - Tenant: %s",
+                     request.path, getattr(request, 'tenant', None))
         return super().dispatch(request, *args, **kwargs)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Debug: verificar que llegamos a la vista correcta
-        print(f"🔍 MenuListView.get_context_data() ejecutándose para tenant: {getattr(self.request, 'tenant', 'NO_TENANT')}")
-        
         # 🎯 OBTENER INFORMACIÓN DE SESIÓN DE MESA
         from restaurants.table_session_manager import TableSessionManager
         table_session = TableSessionManager.get_active_session(self.request)
@@ -44,39 +48,16 @@ class MenuListView(TenantMixin, TemplateView):
                     'session_expires': table_session.get('expires_at'),
                     'session_active_time': table_session.get('created_at')
                 }
-                print(f"🪑 Mesa activa detectada: {active_table_info}")
+                logger.debug("Mesa activa detectada: %s", active_table_info)
             except Table.DoesNotExist:
-                print("❌ Mesa no encontrada en DB")
-        
-        # Obtener categorías activas con sus productos
-        try:
-            categories = MenuCategory.objects.filter(
-                tenant=self.request.tenant,
-                is_active=True
-            ).prefetch_related(
-                Prefetch(
-                    'menu_items',
-                    queryset=MenuItem.objects.filter(
-                        is_available=True
-                    ).prefetch_related('variants', 'available_addons', 'available_modifiers')
-                )
-            ).order_by('order', 'name')
-            
-            print(f"🔍 Categorías encontradas: {categories.count()}")
-        except Exception as e:
-            print(f"❌ Error al obtener categorías: {e}")
-            categories = MenuCategory.objects.none()
-        
-        # Productos destacados
-        featured_items = MenuItem.objects.filter(
-            tenant=self.request.tenant,
-            is_featured=True,
-            is_available=True
-        ).select_related('category')[:6]
+                logger.warning("Mesa %s de la sesión no encontrada en DB", table_session['table_id'])
+        
+        # Menú desde el snapshot versionado del tenant (sin consultas si está vigente)
+        snapshot = get_menu_snapshot(self.request.tenant, self.request.restaurant)
         
         context.update({
-            'categories': categories,
-            'featured_items': featured_items,
+            'categories': snapshot.categories,
+            'featured_items': snapshot.featured_items,
             'page_title': f'Menú - {self.request.restaurant.name}',
             'show_qr_info': True,  # Para mostrar info de QR
             'active_table_info': active_table_info,  # 🆕 Info de mesa activa
@@ -299,63 +280,20 @@ class MenuItemsManagementView(LoginRequiredMixin, TenantMixin, ListView):
 # === API VIEWS ===
 
 def menu_api(request, tenant_slug=None):
-    """API para obtener el menú completo en formato JSON"""
+    """API para obtener el menú completo en formato JSON (snapshot con ETag)"""
     if not hasattr(request, 'tenant'):
         return JsonResponse({'error': 'Tenant not found'}, status=404)
     
-    categories_data = []
-    categories = MenuCategory.objects.filter(
-        tenant=request.tenant,
-        is_active=True
-    ).prefetch_related('menu_items').order_by('order', 'name')
+    snapshot = get_menu_snapshot(request.tenant, request.restaurant)
     
-    for category in categories:
-        items_data = []
-        items = category.menu_items.filter(is_available=True).order_by('order', 'name')
-        
-        for item in items:
-            items_data.append({
-                'id': str(item.id),
-                'name': item.name,
-                'slug': item.slug,
-                'description': item.description,
-                'short_description': item.short_description,
-                'base_price': float(item.base_price),
-                'current_price': float(item.current_price),
-                'has_discount': item.has_discount,
-                'discount_percentage': item.discount_percentage,
-                'is_featured': item.is_featured,
-                'preparation_time': item.preparation_time,
-                'calories': item.calories,
-                'is_vegetarian': item.is_vegetarian,
-                'is_vegan': item.is_vegan,
-                'is_gluten_free': item.is_gluten_free,
-                'is_spicy': item.is_spicy,
-                'allergens': item.allergens,
-                'image': item.image.url if item.image else None,
-                'is_in_stock': item.is_in_stock,
-            })
-        
-        categories_data.append({
-            'id': str(category.id),
-            'name': category.name,
-            'slug': category.slug,
-            'description': category.description,
-            'image': category.image.url if category.image else None,
-            'items': items_data,
-        })
+    if snapshot.etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(snapshot.payload, content_type='application/json')
     
-    return JsonResponse({
-        'restaurant': {
-            'name': request.restaurant.name,
-            'slug': request.tenant.slug,
-        },
-        'categories': categories_data,
-        'total_items': sum(len(cat['items']) for cat in categories_data),
-    })
-
-
-
+    response['ETag'] = snapshot.etag
+    response['Cache-Control'] = 'public, no-cache'
+    return response
 
 
 def menu_search_api(request, tenant_slug=None):
@@ -367,26 +305,7 @@ def menu_search_api(request, tenant_slug=None):
     if len(query) < 2:
         return JsonResponse({'error': 'Query too short'}, status=400)
     
-    items = MenuItem.objects.filter(
-        tenant=request.tenant,
-        is_available=True
-    ).filter(
-        Q(name__icontains=query) | 
-        Q(description__icontains=query) |
-        Q(category__name__icontains=query)
-    ).select_related('category')[:10]
-    
-    results = []
-    for item in items:
-        results.append({
-            'id': str(item.id),
-            'name': item.name,
-            'slug': item.slug,
-            'category': item.category.name,
-            'price': float(item.current_price),
-            'image': item.image.url if item.image else None,
-            'is_featured': item.is_featured,
-        })
+    results = search_menu(request.tenant, query, limit=10, restaurant=request.restaurant)
     
     return JsonResponse({
         'query': query,
@@ -416,13 +335,12 @@ class CartView(TenantMixin, TemplateView):
 @require_POST
 def cart_add(request, tenant_slug=None):
     """Agregar producto al carrito"""
-    print(f"🛒 cart_add() - Path: {request.path}")
-    print(f"🛒 cart_add() - Method: {request.method}")
-    print(f"🛒 cart_add() - Tenant: {getattr(request, 'tenant', 'NO_TENANT')}")
-    print(f"🛒 cart_add() - POST data: {dict(request.POST)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("cart_add() - Path: %s - Tenant: %s - POST: %s",
+                     request.path, getattr(request, 'tenant', None), dict(request.POST))
     
     if not hasattr(request, 'tenant'):
-        print("❌ No hay tenant en request")
+        logger.warning("cart_add() sin tenant en request: %s", request.path)
         return JsonResponse({'error': 'Tenant not found'}, status=404)
     
     try:
@@ -432,18 +350,13 @@ def cart_add(request, tenant_slug=None):
         addon_ids = request.POST.get('addons', '').split(',') if request.POST.get('addons') else []
         modifier_ids = request.POST.getlist('modifiers')
         
-        print(f"📊 Datos extraídos - Item: {menu_item_id}, Qty: {quantity}, Variant: {variant_id}")
-        print(f"📊 Addons: {addon_ids}, Modifiers: {modifier_ids}")
-        
         # Limpiar IDs vacíos
         addon_ids = [aid for aid in addon_ids if aid.strip()]
         modifier_ids = [mid for mid in modifier_ids if mid.strip()]
         
         menu_item = get_object_or_404(MenuItem, id=menu_item_id, tenant=request.tenant)
-        print(f"✅ Producto encontrado: {menu_item.name}")
         
         cart = Cart(request)
-        print(f"🛒 Cart inicializado: {len(cart)} items")
         
         cart.add(
             menu_item=menu_item,
@@ -452,11 +365,11 @@ def cart_add(request, tenant_slug=None):
             addon_ids=addon_ids,
             modifier_ids=modifier_ids
         )
-        print(f"✅ Producto agregado al carrito")
         
         # Respuesta exitosa
         cart_data = cart.get_cart_data(for_json=True)  # Solo datos básicos para JSON
-        print(f"📊 Cart data: {cart_data}")
+        logger.debug("Producto %s agregado al carrito (qty=%s, variant=%s, addons=%s, modifiers=%s)",
+                     menu_item.id, quantity, variant_id, addon_ids, modifier_ids)
         
         return JsonResponse({
             'success': True,
@@ -466,12 +379,9 @@ def cart_add(request, tenant_slug=None):
         })
         
     except MenuItem.DoesNotExist:
-        print("❌ Producto no encontrado")
         return JsonResponse({'error': 'Producto no encontrado'}, status=404)
     except Exception as e:
-        print(f"❌ Error en cart_add: {e}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        logger.exception("Error en cart_add")
         return JsonResponse({'error': str(e)}, status=400)
 
 
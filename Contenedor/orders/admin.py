@@ -91,6 +91,16 @@ class OrderAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('restaurant__tenant', 'customer_user')
+    
+    def get_object(self, request, object_id, from_field=None):
+        obj = super().get_object(request, object_id, from_field)
+        if obj is not None and request.method == 'POST':
+            # El formulario guarda dentro de la transacción del admin: se relee el pedido
+            # bloqueado para que los rollups partan del estado y total vigentes
+            obj = Order.objects.select_for_update(of=('self',)).select_related(
+                'restaurant__tenant', 'customer_user'
+            ).get(pk=obj.pk)
+        return obj
 
 
 @admin.register(OrderItem)
@@ -0,0 +1,311 @@
+"""
+Agrupación de eventos de pedidos y control de flujo de los WebSockets
+
+Del lado del productor (EventCoalescer), los eventos publicados por
+OrderEventBus no van directo al channel layer. Se juntan por grupo durante una
+ventana corta (ORDER_EVENTS_COALESCE_WINDOW, 100 ms por defecto) y dentro de
+la ventana se deduplican por pedido: varias actualizaciones del mismo pedido
+se funden en un solo evento (merge_events). Al cerrar la ventana se hace un
+group_send por grupo con el lote completo (mensaje 'order.batch').
+
+Del lado del consumer (ConnectionEventQueue), cada conexión tiene una cola
+acotada (ORDER_EVENTS_CONNECTION_QUEUE) que se vacía en un solo envío por
+pasada. Mientras el cliente es lento, los eventos nuevos del mismo pedido se
+funden con el pendiente; si la cola se llena se descarta el pedido más
+antiguo y el próximo lote sale con resync=True para que la pantalla recargue
+su estado (la cola del KDS con su cursor, el dashboard, etc.).
+
+Un lote que falla al enviarse vuelve a la ventana y se reintenta con la
+política de restaurants/background.py. Los contadores del proceso (enviados,
+fundidos, descartados) están en event_metrics.
+"""
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from restaurants.background import BackgroundFlusher, RetryPolicy
+
+from .events import (
+    ORDER_CREATED, ORDER_STATUS_CHANGED, ORDER_ITEMS_ADDED, ORDER_ITEM_STATUS_CHANGED,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Tipo del mensaje de lote en el channel layer -> handler order_batch de los consumers
+BATCH_MESSAGE_TYPE = 'order.batch'
+
+# Al fundir eventos de un pedido gana el tipo más "fuerte"
+EVENT_PRIORITY = {
+    ORDER_CREATED: 3,
+    ORDER_STATUS_CHANGED: 2,
+    ORDER_ITEMS_ADDED: 1,
+    ORDER_ITEM_STATUS_CHANGED: 0,
+}
+
+
+class EventMetrics:
+    """
+    Contadores de eventos del proceso
+    """
+
+    COUNTERS = (
+        'published',            # eventos emitidos por OrderEventBus
+        'coalesced',            # eventos fundidos en la ventana del productor
+        'messages_sent',        # group_send hechos (un lote por grupo)
+        'events_sent',          # eventos incluidos en esos lotes
+        'send_errors',          # lotes que fallaron al enviarse
+        'delivered',            # eventos entregados a los sockets
+        'connection_coalesced', # eventos fundidos en la cola de una conexión
+        'dropped',              # eventos descartados por cola llena
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def bump(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters = dict.fromkeys(self.COUNTERS, 0)
+
+
+event_metrics = EventMetrics()
+
+
+def merge_events(pending, event):
+    """
+    Fundir un evento nuevo del mismo pedido con el pendiente
+
+    Los campos del pedido toman el valor más reciente, los items se combinan por
+    id (gana la versión más nueva), previous_status conserva el primero que se
+    vio (el del pedido en el evento y el de cada item en su entrada, sin
+    mezclarlos) y el tipo es el de mayor prioridad (un pedido creado sigue
+    siendo 'order.created' para quien todavía no lo vio).
+    """
+    merged = dict(pending)
+    merged.update({
+        key: value
+        for key, value in event.items()
+        if key not in ('event', 'items', 'previous_status', 'coalesced')
+    })
+
+    if EVENT_PRIORITY.get(event['event'], 0) > EVENT_PRIORITY.get(pending['event'], 0):
+        merged['event'] = event['event']
+
+    if 'previous_status' not in pending and 'previous_status' in event:
+        merged['previous_status'] = event['previous_status']
+
+    if 'items' in event:
+        items = OrderedDict((item['id'], item) for item in pending.get('items', ()))
+        for item in event['items']:
+            current = items.get(item['id'])
+            if current is not None and 'previous_status' in current:
+                item = dict(item, previous_status=current['previous_status'])
+            items[item['id']] = item
+        merged['items'] = list(items.values())
+
+    merged['coalesced'] = pending.get('coalesced', 1) + event.get('coalesced', 1)
+    return merged
+
+
+def send_batch(group, events):
+    """Un group_send con el lote de eventos del grupo"""
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(group, {'type': BATCH_MESSAGE_TYPE, 'events': events})
+
+
+class EventCoalescer:
+    """
+    Ventana de agrupación por grupo, vaciada por un hilo del proceso
+    """
+
+    def __init__(self, window=None, max_pending=None, sender=send_batch):
+        self.window = window if window is not None else getattr(settings, 'ORDER_EVENTS_COALESCE_WINDOW', 0.1)
+        self.max_pending = max_pending or getattr(settings, 'ORDER_EVENTS_MAX_PENDING', 1000)
+        self.sender = sender
+
+        self._pending = {}  # grupo -> {order_id: evento}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.retries = RetryPolicy('Eventos de pedidos')
+        # La ventana se abre con el primer evento; lo que llegue mientras tanto va en el mismo lote
+        self._flusher = BackgroundFlusher(self.flush, 'order-events-coalescer', window=max(self.window, 0))
+
+    def publish(self, groups, event):
+        """Encolar el evento para cada grupo (se envía al cerrar la ventana)"""
+        event_metrics.bump('published')
+
+        if self.window <= 0:
+            self._send({group: [event] for group in groups})
+            return
+
+        coalesced = 0
+        with self._lock:
+            for group in groups:
+                queue = self._pending.setdefault(group, {})
+                current = queue.get(event['order_id'])
+                if current is None:
+                    queue[event['order_id']] = event
+                    self._size += 1
+                else:
+                    queue[event['order_id']] = merge_events(current, event)
+                    coalesced += 1
+            size = self._size
+
+        if coalesced:
+            event_metrics.bump('coalesced', coalesced)
+
+        if size >= self.max_pending:
+            # Demasiado acumulado: vaciar ya, sin esperar la ventana
+            self.flush()
+            return
+
+        self._flusher.wake()
+
+    def pending(self):
+        with self._lock:
+            return self._size
+
+    def flush(self):
+        """Enviar los lotes pendientes (devuelve cuántos eventos salieron)"""
+        with self._flush_lock:
+            with self._lock:
+                batches = {group: list(queue.values()) for group, queue in self._pending.items()}
+                self._pending = {}
+                self._size = 0
+            return self._send(batches)
+
+    def _send(self, batches):
+        sent = 0
+        for group, events in batches.items():
+            if not events:
+                continue
+            try:
+                self.sender(group, events)
+            except Exception:
+                event_metrics.bump('send_errors')
+                logger.exception("Error enviando %s eventos al grupo %s", len(events), group)
+                if self.window > 0 and self.retries.failed(group):
+                    self._requeue(group, events)
+                continue
+            self.retries.succeeded(group)
+            event_metrics.bump('messages_sent')
+            event_metrics.bump('events_sent', len(events))
+            sent += len(events)
+        return sent
+
+    def _requeue(self, group, events):
+        # Lo publicado mientras tanto es más nuevo: se funde encima del lote que falló
+        with self._lock:
+            queue = self._pending.setdefault(group, {})
+            for event in events:
+                current = queue.pop(event['order_id'], None)
+                if current is None:
+                    self._size += 1
+                    queue[event['order_id']] = event
+                else:
+                    queue[event['order_id']] = merge_events(event, current)
+        self._flusher.wake()
+
+
+class ConnectionEventQueue:
+    """
+    Cola acotada de eventos de una conexión WebSocket
+
+    send_batch(events, resync) es la corrutina del consumer que escribe en el
+    socket; se llama con todo lo acumulado desde el envío anterior.
+    """
+
+    def __init__(self, send_batch, max_size=None):
+        self.max_size = max_size or getattr(settings, 'ORDER_EVENTS_CONNECTION_QUEUE', 100)
+        self._send_batch = send_batch
+        self._events = OrderedDict()  # order_id -> evento
+        self._resync = False
+        self._ready = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def put(self, events):
+        """Agregar eventos: se funden por pedido y, si no caben, se descarta el más antiguo"""
+        coalesced = dropped = 0
+        for event in events:
+            key = event['order_id']
+            current = self._events.get(key)
+            if current is not None:
+                self._events[key] = merge_events(current, event)
+                coalesced += 1
+                continue
+
+            if len(self._events) >= self.max_size:
+                self._events.popitem(last=False)
+                self._resync = True
+                dropped += 1
+            self._events[key] = event
+
+        if coalesced:
+            event_metrics.bump('connection_coalesced', coalesced)
+        if dropped:
+            event_metrics.bump('dropped', dropped)
+            logger.warning("Cola de WebSocket llena: %s eventos descartados", dropped)
+        self._ready.set()
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+
+            events = list(self._events.values())
+            resync = self._resync
+            self._events.clear()
+            self._resync = False
+            if not events:
+                continue
+
+            # Mientras este envío espera al cliente, put() sigue fundiendo en la cola
+            await self._send_batch(events, resync)
+            event_metrics.bump('delivered', len(events))
+
+
+_coalescer = EventCoalescer()
+
+
+def publish_events(groups, event):
+    _coalescer.publish(groups, event)
+
+
+def flush_events():
+    return _coalescer.flush()
+
+
+def get_event_coalescer():
+    return _coalescer
+
@@ -0,0 +1,156 @@
+"""
+Bus de eventos de pedidos sobre el channel layer (Channels)
+
+Todo cambio de pedido o item pasa por OrderEventBus.emit(): arma un evento
+tipado, calcula los grupos destino y lo publica cuando la transacción hace
+commit (transaction.on_commit). Si hay rollback el evento se descarta, así las
+pantallas nunca ven un estado que no quedó en la BD.
+
+Grupos:
+- restaurant_{restaurant_id}: todos los eventos (dashboard administrativo)
+- station_{restaurant_id}_{kitchen|bar}: eventos de items de esa estación y
+  cambios de estado del pedido completo
+- waiter_{restaurant_id}_{waiter_id}: eventos de pedidos de sus mesas
+
+Tipos de evento:
+- order.created, order.status_changed
+- order.items_added, order_item.status_changed
+
+previous_status del evento es el estado anterior del pedido (solo
+order.status_changed); en order_item.status_changed el estado anterior va en
+cada entrada de items, así al fundir eventos no se mezclan.
+
+Los eventos no salen de a uno: orders/event_coalescing.py los agrupa por grupo
+en una ventana corta y los consumers reciben el lote en su handler order_batch.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+ORDER_CREATED = 'order.created'
+ORDER_STATUS_CHANGED = 'order.status_changed'
+ORDER_ITEMS_ADDED = 'order.items_added'
+ORDER_ITEM_STATUS_CHANGED = 'order_item.status_changed'
+
+EVENT_TYPES = (ORDER_CREATED, ORDER_STATUS_CHANGED, ORDER_ITEMS_ADDED, ORDER_ITEM_STATUS_CHANGED)
+
+STATIONS = ('kitchen', 'bar')
+
+
+def restaurant_group(restaurant_id):
+    return f"restaurant_{restaurant_id}"
+
+
+def station_group(restaurant_id, station):
+    return f"station_{restaurant_id}_{station}"
+
+
+def waiter_group(restaurant_id, waiter_id):
+    return f"waiter_{restaurant_id}_{waiter_id}"
+
+
+def stations_for(item_station):
+    """Pantallas que muestran un item ('both' va a cocina y bar)"""
+    if item_station == 'both':
+        return STATIONS
+    return (item_station,) if item_station in STATIONS else ()
+
+
+class OrderEventBus:
+    """
+    Publicación de eventos de pedidos después del commit
+    """
+
+    @classmethod
+    def emit(cls, event_type, order, items=(), previous_status=None):
+        """
+        Registrar un evento del pedido (y opcionalmente de sus items)
+        """
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f"Tipo de evento desconocido: {event_type}")
+
+        event = cls._build_event(event_type, order, items, previous_status)
+        groups = cls._groups_for(event)
+        transaction.on_commit(lambda: cls.dispatch(groups, event))
+        return event
+
+    @classmethod
+    def _build_event(cls, event_type, order, items, previous_status):
+        waiter_id = cls._waiter_id(order)
+        event = {
+            'event': event_type,
+            'order_id': str(order.pk),
+            'order_number': order.order_number,
+            'restaurant_id': order.restaurant_id,
+            'status': order.status,
+            'order_type': order.order_type,
+            'table_id': order.table_id,
+            'table_number': order.table_number,
+            'waiter_id': waiter_id,
+            'timestamp': timezone.now().isoformat(),
+        }
+        item_previous_status = None
+        if previous_status is not None:
+            if event_type == ORDER_ITEM_STATUS_CHANGED:
+                item_previous_status = previous_status
+            else:
+                event['previous_status'] = previous_status
+        if items:
+            event['items'] = [
+                {
+                    'id': item.pk,
+                    'status': item.status,
+                    'station': item.station,
+                    'quantity': item.quantity,
+                    'menu_item_id': str(item.menu_item_id),
+                }
+                for item in items
+            ]
+            if item_previous_status is not None:
+                for entry in event['items']:
+                    entry['previous_status'] = item_previous_status
+        return event
+
+    @staticmethod
+    def _waiter_id(order):
+        """Garzón de la mesa desde el snapshot cacheado de la mesa (sin consulta en caliente)"""
+        if not order.table_id:
+            return None
+        from restaurants.table_session_manager import TableSessionManager
+        return TableSessionManager.get_table_snapshot(order.table_id).get('assigned_waiter_id')
+
+    @staticmethod
+    def _groups_for(event):
+        restaurant_id = event['restaurant_id']
+        groups = [restaurant_group(restaurant_id)]
+
+        if 'items' in event:
+            stations = {
+                station
+                for item in event['items']
+                for station in stations_for(item['station'])
+            }
+        else:
+            stations = set(STATIONS)
+        groups.extend(station_group(restaurant_id, station) for station in sorted(stations))
+
+        if event['waiter_id']:
+            groups.append(waiter_group(restaurant_id, event['waiter_id']))
+        return groups
+
+    @staticmethod
+    def dispatch(groups, event):
+        """Entregar el evento al agrupador (nunca rompe el request si falla el layer)"""
+        from restaurants.table_state import mark_table_dirty
+        from .event_coalescing import publish_events
+
+        try:
+            publish_events(groups, event)
+            # Estado de mesas del garzón (restaurants/table_state.py)
+            mark_table_dirty(event['table_id'])
+        except Exception:
+            logger.exception("Error publicando evento %s del pedido %s", event['event'], event['order_id'])
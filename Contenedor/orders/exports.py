@@ -0,0 +1,169 @@
+"""
+Exportación de pedidos y ventas en CSV/XLSX (streaming)
+
+Datasets:
+- orders: un pedido por fila
+- items: un item por fila, con el número y estado de su pedido
+- daily: rollup diario de ventas por estado (orders/rollups.py)
+
+Filtros: rango de días locales del restaurante, estados y tipos de pedido (el
+rollup diario no tiene tipo, así que para 'daily' ese filtro no aplica).
+
+Las filas se leen con .values() e .iterator(chunk_size=EXPORT_CHUNK_SIZE) y se
+escriben a medida que llegan (restaurants/streaming.py): exportar un año de
+pedidos usa memoria constante. Usado por admin_views.orders_export.
+"""
+from datetime import date, datetime
+from uuid import UUID
+
+from django.conf import settings
+from django.utils import timezone
+
+from restaurants.streaming import stream_csv, stream_xlsx
+from restaurants.time_windows import get_timezone, range_filter
+
+from .models import Order, OrderItem, DailySalesRollup
+
+
+DATASETS = ('orders', 'items', 'daily')
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+SHEET_NAMES = {
+    'orders': 'Pedidos',
+    'items': 'Items',
+    'daily': 'Ventas diarias',
+}
+
+# (encabezado, campo de .values())
+ORDER_COLUMNS = (
+    ('Número', 'order_number'),
+    ('Fecha', 'created_at'),
+    ('Estado', 'status'),
+    ('Tipo', 'order_type'),
+    ('Mesa', 'table_number'),
+    ('Cliente', 'customer_name'),
+    ('Teléfono', 'customer_phone'),
+    ('Método de pago', 'payment_method'),
+    ('Estado de pago', 'payment_status'),
+    ('Subtotal', 'subtotal'),
+    ('Impuestos', 'tax_amount'),
+    ('Envío', 'delivery_fee'),
+    ('Descuento', 'discount_amount'),
+    ('Total', 'total_amount'),
+    ('Entregado', 'delivered_at'),
+    ('ID', 'id'),
+)
+
+ITEM_COLUMNS = (
+    ('Pedido', 'order__order_number'),
+    ('Fecha', 'order__created_at'),
+    ('Estado del pedido', 'order__status'),
+    ('Tipo', 'order__order_type'),
+    ('Producto', 'menu_item__name'),
+    ('Estación', 'station'),
+    ('Cantidad', 'quantity'),
+    ('Precio unitario', 'unit_price'),
+    ('Variante', 'variant_price'),
+    ('Extras', 'addons_price'),
+    ('Modificadores', 'modifiers_price'),
+    ('Total', 'total_price'),
+    ('Estado del item', 'status'),
+    ('ID pedido', 'order_id'),
+)
+
+DAILY_COLUMNS = (
+    ('Día', 'day'),
+    ('Estado', 'status'),
+    ('Pedidos', 'orders_count'),
+    ('Total', 'total_amount'),
+)
+
+
+def _order_rows(restaurant, date_from, date_to, statuses, order_types):
+    orders = Order.objects.filter(
+        restaurant=restaurant,
+        **range_filter(restaurant, date_from, date_to)
+    )
+    if statuses:
+        orders = orders.filter(status__in=statuses)
+    if order_types:
+        orders = orders.filter(order_type__in=order_types)
+    return orders.order_by('created_at').values_list(*(field for _, field in ORDER_COLUMNS))
+
+
+def _item_rows(restaurant, date_from, date_to, statuses, order_types):
+    items = OrderItem.objects.filter(
+        order__restaurant=restaurant,
+        **range_filter(restaurant, date_from, date_to, field='order__created_at')
+    )
+    if statuses:
+        items = items.filter(order__status__in=statuses)
+    if order_types:
+        items = items.filter(order__order_type__in=order_types)
+    return items.order_by('order__created_at', 'id').values_list(*(field for _, field in ITEM_COLUMNS))
+
+
+def _daily_rows(restaurant, date_from, date_to, statuses, order_types):
+    rows = DailySalesRollup.objects.filter(
+        restaurant=restaurant,
+        day__gte=date_from,
+        day__lte=date_to
+    )
+    if statuses:
+        rows = rows.filter(status__in=statuses)
+    return rows.order_by('day', 'status').values_list(*(field for _, field in DAILY_COLUMNS))
+
+
+DATASET_COLUMNS = {
+    'orders': ORDER_COLUMNS,
+    'items': ITEM_COLUMNS,
+    'daily': DAILY_COLUMNS,
+}
+
+DATASET_ROWS = {
+    'orders': _order_rows,
+    'items': _item_rows,
+    'daily': _daily_rows,
+}
+
+
+def export_rows(restaurant, dataset, date_from, date_to, statuses=(), order_types=()):
+    """
+    Filas del dataset como tuplas (fechas en hora local del restaurante)
+
+    Se leen de a EXPORT_CHUNK_SIZE filas; nunca se materializa el resultado.
+    """
+    chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    tzinfo = get_timezone(restaurant)
+    queryset = DATASET_ROWS[dataset](restaurant, date_from, date_to, statuses, order_types)
+
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield tuple(_format_value(value, tzinfo) for value in row)
+
+
+def _format_value(value, tzinfo):
+    if isinstance(value, datetime):
+        return timezone.localtime(value, tzinfo).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def stream_export(restaurant, dataset, export_format, date_from, date_to, statuses=(), order_types=()):
+    """Generador de bytes del archivo exportado"""
+    headers = [header for header, _ in DATASET_COLUMNS[dataset]]
+    rows = export_rows(restaurant, dataset, date_from, date_to, statuses, order_types)
+    if export_format == 'xlsx':
+        return stream_xlsx(SHEET_NAMES[dataset], headers, rows)
+    return stream_csv(headers, rows)
+
+
+def export_filename(restaurant, dataset, export_format, date_from, date_to):
+    return f"{dataset}_{restaurant.tenant.slug}_{date_from:%Y%m%d}_{date_to:%Y%m%d}.{export_format}"
@@ -0,0 +1 @@
+# Management commands for orders app 
\ No newline at end of file
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+
+from restaurants.models import Restaurant
+from restaurants.time_windows import local_date, local_today
+from orders.models import Order
+from orders.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalcular los resúmenes diarios de ventas (DailySalesRollup y DailyProductSalesRollup) desde los pedidos'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('tenant_slug', nargs='?', help='Slug del tenant (default: todos los restaurantes)')
+        parser.add_argument('--from', dest='date_from', help='Primer día (YYYY-MM-DD, default: primer pedido)')
+        parser.add_argument('--to', dest='date_to', help='Último día (YYYY-MM-DD, default: hoy)')
+        parser.add_argument('--days', type=int, help='Solo los últimos N días (en vez de --from)')
+    
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.select_related('tenant')
+        if options['tenant_slug']:
+            restaurants = restaurants.filter(tenant__slug=options['tenant_slug'])
+            if not restaurants.exists():
+                raise CommandError(f"No existe restaurante para el tenant '{options['tenant_slug']}'")
+        
+        for restaurant in restaurants:
+            today = local_today(restaurant)
+            date_to = self._parse_date(options['date_to']) if options['date_to'] else today
+            
+            if options['days']:
+                date_from = today - timedelta(days=options['days'])
+            elif options['date_from']:
+                date_from = self._parse_date(options['date_from'])
+            else:
+                first_order = Order.objects.filter(restaurant=restaurant).aggregate(first=Min('created_at'))['first']
+                if first_order is None:
+                    self.stdout.write(f'⏭️  {restaurant.name}: sin pedidos')
+                    continue
+                date_from = local_date(restaurant, first_order)
+            
+            if date_from > date_to:
+                raise CommandError('--from no puede ser posterior a --to')
+            
+            sales, products = rebuild_rollups(restaurant, date_from, date_to)
+            self.stdout.write(
+                f'📊 {restaurant.name}: {date_from} → {date_to} '
+                f'({sales} filas de ventas, {products} filas de productos)'
+            )
+        
+        self.stdout.write(self.style.SUCCESS('✅ Resúmenes de ventas reconstruidos'))
+    
+    def _parse_date(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Fecha inválida '{value}' (formato YYYY-MM-DD)")
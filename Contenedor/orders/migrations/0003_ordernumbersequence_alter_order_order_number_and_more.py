@@ -0,0 +1,38 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_table_alter_order_table_number'),
+        ('restaurants', '0006_barstaff_certifications_barstaff_years_experience_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='order_number',
+            field=models.CharField(blank=True, help_text='Único por restaurante', max_length=20),
+        ),
+        migrations.AlterUniqueTogether(
+            name='order',
+            unique_together={('restaurant', 'order_number')},
+        ),
+        migrations.CreateModel(
+            name='OrderNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('last_value', models.PositiveIntegerField(default=0, help_text='Último número reservado del día')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_number_sequences', to='restaurants.restaurant')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de números de pedido',
+                'verbose_name_plural': 'Secuencias de números de pedido',
+                'unique_together': {('restaurant', 'date')},
+            },
+        ),
+    ]
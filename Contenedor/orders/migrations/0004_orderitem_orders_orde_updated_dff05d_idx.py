@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_ordernumbersequence_alter_order_order_number_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['updated_at', 'id'], name='orders_orde_updated_dff05d_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.2 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def route_existing_items(apps, schema_editor):
+    """Asignar restaurante y estación a los items ya creados"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Order = apps.get_model('orders', 'Order')
+    MenuItem = apps.get_model('menu', 'MenuItem')
+
+    OrderItem.objects.filter(restaurant__isnull=True).update(
+        restaurant_id=Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('restaurant_id')[:1])
+    )
+
+    stations = {'food': 'kitchen', 'drink': 'bar', 'both': 'both'}
+    for item_type, station in stations.items():
+        OrderItem.objects.filter(
+            menu_item__in=MenuItem.objects.filter(item_type=item_type)
+        ).update(station=station)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0003_menuitem_search_gin_index'),
+        ('orders', '0004_orderitem_orders_orde_updated_dff05d_idx'),
+        ('restaurants', '0007_tablescanlog_scan_id_alter_tablescanlog_scanned_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='restaurant',
+            field=models.ForeignKey(blank=True, help_text='Copiado del pedido para filtrar colas sin joins', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='restaurants.restaurant'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='station',
+            field=models.CharField(choices=[('kitchen', 'Cocina'), ('bar', 'Bar'), ('both', 'Cocina y bar')], default='kitchen', help_text='Estación que prepara el item (según item_type al crear el pedido)', max_length=10),
+        ),
+        migrations.RunPython(route_existing_items, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['restaurant', 'station', 'status', 'created_at'], name='orders_orde_restaur_1b600d_idx'),
+        ),
+    ]
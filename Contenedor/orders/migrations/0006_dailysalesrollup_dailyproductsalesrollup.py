@@ -0,0 +1,51 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0003_menuitem_search_gin_index'),
+        ('orders', '0005_orderitem_restaurant_orderitem_station_and_more'),
+        ('restaurants', '0007_tablescanlog_scan_id_alter_tablescanlog_scanned_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pendiente de confirmación'), ('confirmed', 'Confirmado'), ('preparing', 'En preparación'), ('ready', 'Listo para entregar'), ('delivered', 'Entregado'), ('cancelled', 'Cancelado')], max_length=20)),
+                ('orders_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales_rollups', to='restaurants.restaurant')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de ventas',
+                'verbose_name_plural': 'Resúmenes diarios de ventas',
+                'unique_together': {('restaurant', 'day', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pendiente de confirmación'), ('confirmed', 'Confirmado'), ('preparing', 'En preparación'), ('ready', 'Listo para entregar'), ('delivered', 'Entregado'), ('cancelled', 'Cancelado')], max_length=20)),
+                ('quantity', models.IntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales_rollups', to='menu.menuitem')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_product_rollups', to='restaurants.restaurant')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de producto',
+                'verbose_name_plural': 'Resúmenes diarios de productos',
+                'unique_together': {('restaurant', 'day', 'status', 'menu_item')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.2 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_dailysalesrollup_dailyproductsalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'created_at', 'id'], name='orders_orde_restaur_5a4f6d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['restaurant', 'station', 'created_at', 'id'], name='orders_orde_restaur_e9cdf0_idx'),
+        ),
+    ]
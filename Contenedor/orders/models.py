@@ -5,6 +5,7 @@ from decimal import Decimal
 import uuid
 from restaurants.models import Restaurant
 from menu.models import MenuItem, MenuVariant, MenuAddon, MenuModifier
+from .routing import route_order_item
 
 
 class Order(models.Model):
@@ -39,7 +40,7 @@ class Order(models.Model):
     
     # Identificación
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    order_number = models.CharField(max_length=20, unique=True, blank=True)
+    order_number = models.CharField(max_length=20, blank=True, help_text="Único por restaurante")
     
     # Relaciones
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='orders')
@@ -109,25 +110,15 @@ class Order(models.Model):
             models.Index(fields=['restaurant', 'status']),
             models.Index(fields=['order_number']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['restaurant', 'created_at', 'id']),  # Paginación por cursor
         ]
+        unique_together = ['restaurant', 'order_number']
     
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # Generar número de orden único
-            import datetime
-            date_str = datetime.datetime.now().strftime('%Y%m%d')
-            last_order = Order.objects.filter(
-                restaurant=self.restaurant,
-                order_number__startswith=f"ORD-{date_str}"
-            ).order_by('-order_number').first()
-            
-            if last_order:
-                last_num = int(last_order.order_number.split('-')[-1])
-                new_num = last_num + 1
-            else:
-                new_num = 1
-            
-            self.order_number = f"ORD-{date_str}-{new_num:04d}"
+            # Generar número de orden único (contador diario por restaurante)
+            from .numbering import next_order_number
+            self.order_number = next_order_number(self.restaurant_id)
         
         super().save(*args, **kwargs)
     
@@ -166,6 +157,25 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     
+    # Ruteo a estación (se fija al crear el item, ver orders/routing.py)
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        null=True, blank=True,
+        related_name='order_items',
+        help_text="Copiado del pedido para filtrar colas sin joins"
+    )
+    station = models.CharField(
+        max_length=10,
+        choices=[
+            ('kitchen', 'Cocina'),
+            ('bar', 'Bar'),
+            ('both', 'Cocina y bar'),
+        ],
+        default='kitchen',
+        help_text="Estación que prepara el item (según item_type al crear el pedido)"
+    )
+    
     # Configuración del item
     quantity = models.PositiveIntegerField(default=1)
     
@@ -220,8 +230,17 @@ class OrderItem(models.Model):
         verbose_name_plural = 'Items del Pedido'
         indexes = [
             models.Index(fields=['order', 'status']),
+            models.Index(fields=['updated_at', 'id']),  # Cursor del KDS
+            models.Index(fields=['restaurant', 'station', 'status', 'created_at']),  # Colas de estación
+            models.Index(fields=['restaurant', 'station', 'created_at', 'id']),  # Paginación por cursor
         ]
     
+    def save(self, *args, **kwargs):
+        # Items creados fuera del checkout (admin, scripts) también se rutean
+        if self._state.adding and self.restaurant_id is None:
+            route_order_item(self)
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         variant_str = f" ({self.selected_variant.name})" if self.selected_variant else ""
         return f"{self.quantity}x {self.menu_item.name}{variant_str}"
@@ -265,4 +284,61 @@ class OrderStatusHistory(models.Model):
         verbose_name_plural = 'Historial de Estados'
     
     def __str__(self):
-        return f"{self.order.order_number} - {self.previous_status} → {self.new_status}" 
\ No newline at end of file
+        return f"{self.order.order_number} - {self.previous_status} → {self.new_status}" 
+
+class OrderNumberSequence(models.Model):
+    """
+    Contador diario de números de pedido por restaurante (ver orders/numbering.py)
+    """
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='order_number_sequences')
+    date = models.DateField()
+    last_value = models.PositiveIntegerField(default=0, help_text="Último número reservado del día")
+    
+    class Meta:
+        verbose_name = 'Secuencia de números de pedido'
+        verbose_name_plural = 'Secuencias de números de pedido'
+        unique_together = ['restaurant', 'date']
+    
+    def __str__(self):
+        return f"{self.restaurant.name} - {self.date} ({self.last_value})"
+
+
+class DailySalesRollup(models.Model):
+    """
+    Pedidos y ventas de un día por restaurante y estado (ver orders/rollups.py)
+    """
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='daily_sales_rollups')
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Resumen diario de ventas'
+        verbose_name_plural = 'Resúmenes diarios de ventas'
+        unique_together = ['restaurant', 'day', 'status']
+    
+    def __str__(self):
+        return f"{self.restaurant.name} - {self.day} {self.status}: {self.orders_count} pedidos"
+
+
+class DailyProductSalesRollup(models.Model):
+    """
+    Unidades e ingresos de un producto en un día, por estado del pedido (ver orders/rollups.py)
+    """
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='daily_product_rollups')
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='daily_sales_rollups')
+    quantity = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Resumen diario de producto'
+        verbose_name_plural = 'Resúmenes diarios de productos'
+        unique_together = ['restaurant', 'day', 'status', 'menu_item']
+    
+    def __str__(self):
+        return f"{self.menu_item.name} - {self.day} {self.status}: {self.quantity}"
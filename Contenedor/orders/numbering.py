@@ -0,0 +1,119 @@
+"""
+Asignación de números de pedido por restaurante y día
+
+Cada restaurante tiene un contador diario (OrderNumberSequence). En vez de leer
+el último pedido y sumarle uno (carrera entre checkouts concurrentes), cada
+proceso reserva un bloque de números con el row lock del contador y los
+entrega desde memoria. Solo 1 de cada ORDER_NUMBER_BLOCK_SIZE pedidos toca la fila.
+
+Los números sobrantes de un bloque se publican en memoria recién cuando la
+transacción que los reservó hace commit (transaction.on_commit). Si hace rollback,
+el contador en la BD también vuelve atrás y el bloque se descarta.
+
+Con bloques > 1 la numeración es única pero puede tener huecos y no ser
+estrictamente cronológica entre procesos.
+"""
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from restaurants.time_windows import local_today
+
+
+ORDER_NUMBER_PREFIX = 'ORD'
+
+
+def format_order_number(date, value):
+    """ORD-YYYYMMDD-NNNN"""
+    return f"{ORDER_NUMBER_PREFIX}-{date.strftime('%Y%m%d')}-{value:04d}"
+
+
+class OrderNumberAllocator:
+    """
+    Reparte números de pedido desde bloques reservados en OrderNumberSequence
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = max(1, block_size or getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', 10))
+        self._blocks = {}  # (restaurant_id, date) -> [siguiente, último]
+        self._lock = threading.Lock()
+
+    def next_number(self, restaurant_id, date=None):
+        """Siguiente número de pedido formateado para el restaurante"""
+        date = date or local_today(restaurant_id)
+        key = (restaurant_id, date)
+
+        with self._lock:
+            block = self._blocks.get(key)
+            if block and block[0] <= block[1]:
+                value = block[0]
+                block[0] += 1
+                return format_order_number(date, value)
+
+        value = self._reserve_block(restaurant_id, date)
+        return format_order_number(date, value)
+
+    def _reserve_block(self, restaurant_id, date):
+        """
+        Reservar un bloque nuevo en la BD. Retorna el primer número del bloque
+        (para el pedido actual) y deja el resto pendiente del commit.
+        """
+        from .models import OrderNumberSequence
+
+        with transaction.atomic():
+            sequence, created = OrderNumberSequence.objects.select_for_update().get_or_create(
+                restaurant_id=restaurant_id,
+                date=date,
+                defaults={'last_value': self._seed_value(restaurant_id, date)},
+            )
+            first = sequence.last_value + 1
+            last = sequence.last_value + self.block_size
+            sequence.last_value = last
+            sequence.save(update_fields=['last_value'])
+
+        if last > first:
+            transaction.on_commit(lambda: self._publish_block(restaurant_id, date, first + 1, last))
+
+        return first
+
+    def _publish_block(self, restaurant_id, date, first, last):
+        # Fuera del lock: con el caché frío puede consultar la zona horaria en la BD
+        today = local_today(restaurant_id)
+        with self._lock:
+            # Los bloques de días anteriores del restaurante ya no se usarán
+            for stale_key in [k for k in self._blocks if k[0] == restaurant_id and k[1] < today]:
+                del self._blocks[stale_key]
+            self._blocks[(restaurant_id, date)] = [first, last]
+
+    @staticmethod
+    def _seed_value(restaurant_id, date):
+        """
+        Último número ya usado ese día (pedidos creados antes de existir el contador)
+
+        Se compara el sufijo como número: ordenar el texto pondría "...-999"
+        sobre "...-10000". Se ejecuta una vez por restaurante y día.
+        """
+        from .models import Order
+
+        prefix = format_order_number(date, 0).rsplit('-', 1)[0]
+        numbers = Order.objects.filter(
+            restaurant_id=restaurant_id,
+            order_number__startswith=f"{prefix}-"
+        ).values_list('order_number', flat=True)
+
+        suffixes = (number.rsplit('-', 1)[-1] for number in numbers.iterator())
+        return max((int(suffix) for suffix in suffixes if suffix.isdigit()), default=0)
+
+    def reset(self):
+        """Descartar los bloques en memoria (útil en tests)"""
+        with self._lock:
+            self._blocks.clear()
+
+
+order_number_allocator = OrderNumberAllocator()
+
+
+def next_order_number(restaurant_id, date=None):
+    """Atajo para Order.save"""
+    return order_number_allocator.next_number(restaurant_id, date)
@@ -0,0 +1,272 @@
+"""
+Resúmenes diarios de ventas (rollups)
+
+DailySalesRollup guarda por (restaurante, día, estado) la cantidad de pedidos y
+el total vendido; DailyProductSalesRollup guarda por (restaurante, día, estado,
+producto) las unidades y el ingreso. El día es la fecha de creación del pedido
+en la zona horaria del restaurante (restaurants/time_windows.py) y el estado es
+el estado actual del pedido, así un reporte de "ventas" suma solo las filas de
+SALES_STATUSES.
+
+Se mantienen de forma incremental en la misma transacción que el pedido
+(orders/signals.py y el checkout):
+- pedido creado: +1 pedido en su estado
+- items agregados: + unidades/ingreso de cada producto en el estado del pedido
+- cambio de estado: las cifras del pedido y sus productos pasan de la fila del
+  estado anterior a la del nuevo
+- cambio de total sin cambio de estado: se suma la diferencia
+- pedido eliminado: se restan sus cifras
+
+Cada ajuste es un UPDATE con F() (se crea la fila si no existe), seguro con
+varios procesos. rebuild_rollups() (comando rebuild_sales_rollups) recalcula un
+rango desde los pedidos, para cargar el histórico o corregir diferencias
+(p. ej. items eliminados sueltos, que no se descuentan).
+
+El dashboard y los reportes leen estas tablas: decenas de filas en vez de
+recorrer meses de pedidos.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+
+from restaurants.time_windows import date_range, get_timezone, local_date
+
+from .models import Order, OrderItem, DailySalesRollup, DailyProductSalesRollup
+
+
+# Estados que cuentan como venta
+SALES_STATUSES = ('delivered', 'ready')
+
+
+def rollup_day(order):
+    """Día del rollup: fecha de creación del pedido en la zona del restaurante"""
+    restaurant = order.restaurant if Order.restaurant.is_cached(order) else order.restaurant_id
+    return local_date(restaurant, order.created_at)
+
+
+def _bump(model, key, deltas):
+    """Sumar deltas a la fila del rollup (la crea si no existe)"""
+    if not any(deltas.values()):
+        return
+    expressions = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**key).update(**expressions):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Otro proceso creó la fila entre el UPDATE y el INSERT
+        model.objects.filter(**key).update(**expressions)
+
+
+def _sales_key(order, status):
+    return {
+        'restaurant_id': order.restaurant_id,
+        'day': rollup_day(order),
+        'status': status,
+    }
+
+
+def _order_products(order):
+    """{menu_item_id: (unidades, ingreso)} de los items del pedido (una consulta)"""
+    rows = OrderItem.objects.filter(order=order).values('menu_item_id').annotate(
+        quantity=Sum('quantity'),
+        revenue=Sum('total_price')
+    ).order_by()
+    return {row['menu_item_id']: (row['quantity'], row['revenue']) for row in rows}
+
+
+def _bump_products(order, status, products, sign=1):
+    key = _sales_key(order, status)
+    for menu_item_id, (quantity, revenue) in products.items():
+        _bump(
+            DailyProductSalesRollup,
+            dict(key, menu_item_id=menu_item_id),
+            {'quantity': sign * quantity, 'total_revenue': sign * revenue}
+        )
+
+
+# ============================================================================
+# MANTENIMIENTO INCREMENTAL
+# ============================================================================
+
+def record_order_created(order):
+    _bump(DailySalesRollup, _sales_key(order, order.status), {
+        'orders_count': 1,
+        'total_amount': order.total_amount,
+    })
+
+
+def record_order_changed(order, previous_status, previous_total):
+    """Mover las cifras del pedido si cambió su estado o su total"""
+    if previous_status != order.status:
+        _bump(DailySalesRollup, _sales_key(order, previous_status), {
+            'orders_count': -1,
+            'total_amount': -previous_total,
+        })
+        record_order_created(order)
+
+        products = _order_products(order)
+        _bump_products(order, previous_status, products, sign=-1)
+        _bump_products(order, order.status, products)
+
+    elif previous_total != order.total_amount:
+        _bump(DailySalesRollup, _sales_key(order, order.status), {
+            'total_amount': order.total_amount - previous_total,
+        })
+
+
+def record_items_added(order, items):
+    """Sumar items nuevos (creados con bulk_create, sin post_save)"""
+    products = defaultdict(lambda: (0, Decimal('0')))
+    for item in items:
+        quantity, revenue = products[item.menu_item_id]
+        products[item.menu_item_id] = (quantity + item.quantity, revenue + Decimal(item.total_price))
+    _bump_products(order, order.status, products)
+
+
+def record_order_deleted(order, status=None):
+    status = status or order.status
+    _bump(DailySalesRollup, _sales_key(order, status), {
+        'orders_count': -1,
+        'total_amount': -order.total_amount,
+    })
+    _bump_products(order, status, _order_products(order), sign=-1)
+
+
+# ============================================================================
+# RECONSTRUCCIÓN
+# ============================================================================
+
+def rebuild_rollups(restaurant, date_from, date_to):
+    """
+    Recalcular los rollups de un restaurante en [date_from, date_to] desde los pedidos
+
+    Devuelve (filas de ventas, filas de productos) escritas.
+    """
+    start, end = date_range(restaurant, date_from, date_to)
+    tzinfo = get_timezone(restaurant)
+
+    sales_rows = Order.objects.filter(
+        restaurant=restaurant,
+        created_at__gte=start,
+        created_at__lt=end
+    ).annotate(
+        day=TruncDate('created_at', tzinfo=tzinfo)
+    ).values('day', 'status').annotate(
+        orders_count=Count('id'),
+        total_amount=Sum('total_amount')
+    ).order_by()
+
+    product_rows = OrderItem.objects.filter(
+        order__restaurant=restaurant,
+        order__created_at__gte=start,
+        order__created_at__lt=end
+    ).annotate(
+        day=TruncDate('order__created_at', tzinfo=tzinfo)
+    ).values('day', 'order__status', 'menu_item_id').annotate(
+        quantity=Sum('quantity'),
+        total_revenue=Sum('total_price')
+    ).order_by()
+
+    with transaction.atomic():
+        days = {'restaurant': restaurant, 'day__gte': date_from, 'day__lte': date_to}
+        DailySalesRollup.objects.filter(**days).delete()
+        DailyProductSalesRollup.objects.filter(**days).delete()
+
+        sales = DailySalesRollup.objects.bulk_create([
+            DailySalesRollup(
+                restaurant=restaurant,
+                day=row['day'],
+                status=row['status'],
+                orders_count=row['orders_count'],
+                total_amount=row['total_amount'] or 0,
+            )
+            for row in sales_rows
+        ], batch_size=500)
+
+        products = DailyProductSalesRollup.objects.bulk_create([
+            DailyProductSalesRollup(
+                restaurant=restaurant,
+                day=row['day'],
+                status=row['order__status'],
+                menu_item_id=row['menu_item_id'],
+                quantity=row['quantity'],
+                total_revenue=row['total_revenue'] or 0,
+            )
+            for row in product_rows
+        ], batch_size=500)
+
+    return len(sales), len(products)
+
+
+# ============================================================================
+# LECTURAS
+# ============================================================================
+
+def sales_summary(restaurant, today):
+    """
+    Pedidos y ventas de hoy, últimos 7 y 30 días (una consulta sobre el rollup)
+    """
+    week_ago = today - timedelta(days=7)
+    month_ago = today - timedelta(days=30)
+    is_sale = Q(status__in=SALES_STATUSES)
+
+    totals = DailySalesRollup.objects.filter(
+        restaurant=restaurant,
+        day__gte=month_ago
+    ).aggregate(
+        orders_today=Sum('orders_count', filter=Q(day=today)),
+        orders_week=Sum('orders_count', filter=Q(day__gte=week_ago)),
+        orders_month=Sum('orders_count'),
+        sales_today=Sum('total_amount', filter=Q(day=today) & is_sale),
+        sales_week=Sum('total_amount', filter=Q(day__gte=week_ago) & is_sale),
+        sales_month=Sum('total_amount', filter=is_sale),
+    )
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def daily_sales(restaurant, date_from, date_to, statuses=SALES_STATUSES):
+    """Pedidos y ventas por día del rango"""
+    rows = DailySalesRollup.objects.filter(
+        restaurant=restaurant,
+        day__gte=date_from,
+        day__lte=date_to,
+        status__in=statuses
+    ).values('day').annotate(
+        total_orders=Sum('orders_count'),
+        total_revenue=Sum('total_amount')
+    ).order_by('day')
+
+    return [
+        {
+            'date': row['day'],
+            'total_orders': row['total_orders'],
+            'total_revenue': row['total_revenue'],
+            'total': row['total_revenue'],
+        }
+        for row in rows
+    ]
+
+
+def top_products(restaurant, date_from, date_to=None, statuses=None, order_by='-total_quantity', limit=10):
+    """Productos más vendidos del rango según el rollup de productos"""
+    rows = DailyProductSalesRollup.objects.filter(restaurant=restaurant, day__gte=date_from)
+    if date_to is not None:
+        rows = rows.filter(day__lte=date_to)
+    if statuses is not None:
+        rows = rows.filter(status__in=statuses)
+
+    rows = rows.values('menu_item__name').annotate(
+        total_quantity=Sum('quantity'),
+        total_revenue=Sum('total_revenue')
+    ).filter(total_quantity__gt=0).order_by(order_by)[:limit]
+
+    products = list(rows)
+    for product in products:
+        product['avg_price'] = product['total_revenue'] / product['total_quantity']
+    return products
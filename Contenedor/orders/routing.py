@@ -0,0 +1,37 @@
+"""
+Ruteo de items de pedido a estaciones (cocina / bar)
+
+Al crear un OrderItem se le asigna la estación según el item_type del producto
+y se copia el restaurante del pedido. Así las colas de cocina y bar filtran
+una sola tabla con el índice (restaurant, station, status, created_at), sin
+unir pedido, mesa y producto, e incluyen pedidos para llevar y delivery (que no
+tienen mesa).
+"""
+
+# item_type del producto -> estación del item
+ITEM_TYPE_STATIONS = {
+    'food': 'kitchen',
+    'drink': 'bar',
+    'both': 'both',
+}
+
+DEFAULT_STATION = 'kitchen'
+
+# Estaciones que ve cada pantalla ('both' va a cocina y a bar)
+STATION_QUEUES = {
+    'kitchen': ('kitchen', 'both'),
+    'bar': ('bar', 'both'),
+}
+
+
+def station_for_item_type(item_type):
+    return ITEM_TYPE_STATIONS.get(item_type, DEFAULT_STATION)
+
+
+def route_order_item(order_item, order=None, menu_item=None):
+    """Asignar restaurante y estación a un item (sin consultas si ya vienen cargados)"""
+    order = order or order_item.order
+    menu_item = menu_item or order_item.menu_item
+    order_item.restaurant_id = order.restaurant_id
+    order_item.station = station_for_item_type(menu_item.item_type)
+    return order_item
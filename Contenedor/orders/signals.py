@@ -0,0 +1,74 @@
+"""
+Señales de la app orders: publican eventos de pedidos (orders/events.py),
+mantienen los rollups diarios de ventas (orders/rollups.py) e invalidan las
+estadísticas del día (orders/stats.py)
+"""
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .events import OrderEventBus, ORDER_CREATED, ORDER_STATUS_CHANGED, ORDER_ITEM_STATUS_CHANGED
+from .models import Order, OrderItem
+from .rollups import record_order_created, record_order_changed, record_order_deleted, rollup_day
+from .stats import invalidate_order_stats
+
+
+def _invalidate_stats_on_commit(order):
+    restaurant_id, day = order.restaurant_id, rollup_day(order)
+    transaction.on_commit(lambda: invalidate_order_stats(restaurant_id, day))
+
+
+@receiver(post_init, sender=Order)
+@receiver(post_init, sender=OrderItem)
+def remember_loaded_status(sender, instance, **kwargs):
+    """Estado con el que se cargó la instancia (para detectar cambios sin consultar)"""
+    instance._loaded_status = instance.status
+
+
+@receiver(post_init, sender=Order)
+def remember_loaded_total(sender, instance, **kwargs):
+    instance._loaded_total = instance.total_amount
+
+
+@receiver(post_save, sender=Order)
+def publish_order_event(sender, instance, created, **kwargs):
+    previous_status = instance._loaded_status
+    previous_total = instance._loaded_total
+    instance._loaded_status = instance.status
+    instance._loaded_total = instance.total_amount
+
+    # Rollups en la misma transacción que el pedido
+    if created:
+        record_order_created(instance)
+    else:
+        record_order_changed(instance, previous_status, previous_total)
+
+    if created or previous_status != instance.status or previous_total != instance.total_amount:
+        _invalidate_stats_on_commit(instance)
+
+    if created:
+        OrderEventBus.emit(ORDER_CREATED, instance)
+    elif previous_status != instance.status:
+        OrderEventBus.emit(ORDER_STATUS_CHANGED, instance, previous_status=previous_status)
+
+
+@receiver(post_save, sender=OrderItem)
+def publish_order_item_event(sender, instance, created, **kwargs):
+    previous_status = instance._loaded_status
+    instance._loaded_status = instance.status
+
+    # Los items nuevos se publican en bloque desde el checkout (order.items_added)
+    if not created and previous_status != instance.status:
+        OrderEventBus.emit(
+            ORDER_ITEM_STATUS_CHANGED,
+            instance.order,
+            items=[instance],
+            previous_status=previous_status
+        )
+
+
+@receiver(pre_delete, sender=Order)
+def discount_deleted_order(sender, instance, **kwargs):
+    """Restar el pedido de los rollups (antes de que se borren sus items)"""
+    record_order_deleted(instance, status=instance._loaded_status)
+    _invalidate_stats_on_commit(instance)
@@ -0,0 +1,66 @@
+"""
+Estadísticas de pedidos de un día
+
+Los conteos por estado y la venta del día salen de una sola consulta de
+agregación condicional sobre Order, filtrando por el día local del restaurante
+como rango UTC (time_windows.day_range). El resultado se cachea por restaurante
+y día (ORDER_STATS_TTL); orders/signals.py lo invalida después del commit cuando
+se crea, cambia de estado o total, o se elimina un pedido.
+
+Lo usan el listado de pedidos del restaurante (RestaurantOrdersListView) y el
+dashboard administrativo.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from restaurants.time_windows import day_range, local_today
+
+from .models import Order
+from .rollups import SALES_STATUSES
+
+
+ORDER_STATS_KEY = "order_stats_{restaurant_id}_{date}"
+
+ORDER_STATUSES = tuple(status for status, _ in Order.STATUS_CHOICES)
+ACTIVE_STATUSES = ('pending', 'confirmed', 'preparing')
+
+
+def compute_order_stats(restaurant, date):
+    """
+    Pedidos por estado y venta del día (una consulta)
+
+    Claves: total_orders, <estado>_orders, active_orders y total_revenue
+    """
+    start, end = day_range(restaurant, date)
+    aggregations = {
+        f"{status}_orders": Count('id', filter=Q(status=status))
+        for status in ORDER_STATUSES
+    }
+    stats = Order.objects.filter(
+        restaurant=restaurant,
+        created_at__gte=start,
+        created_at__lt=end
+    ).aggregate(
+        total_orders=Count('id'),
+        total_revenue=Sum('total_amount', filter=Q(status__in=SALES_STATUSES)),
+        **aggregations
+    )
+    stats['total_revenue'] = stats['total_revenue'] or 0
+    stats['active_orders'] = sum(stats[f"{status}_orders"] for status in ACTIVE_STATUSES)
+    return stats
+
+
+def get_order_stats(restaurant, date=None):
+    """Estadísticas del día (hoy por defecto) con caché de TTL corto"""
+    date = date or local_today(restaurant)
+    key = ORDER_STATS_KEY.format(restaurant_id=restaurant.pk, date=date.isoformat())
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_order_stats(restaurant, date)
+        cache.set(key, stats, timeout=getattr(settings, 'ORDER_STATS_TTL', 30))
+    return stats
+
+
+def invalidate_order_stats(restaurant_id, date):
+    cache.delete(ORDER_STATS_KEY.format(restaurant_id=restaurant_id, date=date.isoformat()))
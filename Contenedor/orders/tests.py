@@ -0,0 +1,565 @@
+import json
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from menu.models import MenuCategory, MenuItem, MenuVariant, MenuAddon, MenuModifier
+from restaurants.models import Tenant, Restaurant
+from restaurants.time_windows import local_today
+from .event_coalescing import merge_events
+from .events import (
+    ORDER_CREATED, ORDER_STATUS_CHANGED, ORDER_ITEM_STATUS_CHANGED, restaurant_group, station_group,
+)
+from .models import (
+    Order, OrderItem, OrderNumberSequence, OrderStatusHistory, DailySalesRollup, DailyProductSalesRollup,
+)
+from .exports import export_rows, stream_export
+from .numbering import OrderNumberAllocator
+from .rollups import rebuild_rollups, record_items_added
+from .stats import get_order_stats
+from .views import RestaurantOrdersListView, _create_order_items, update_order_status
+
+
+def create_restaurant(slug='test'):
+    owner = User.objects.create_user(f'owner-{slug}', password='x')
+    tenant = Tenant.objects.create(name='Test', slug=slug, status='ACTIVE')
+    return Restaurant.objects.create(
+        tenant=tenant, name='Test', address='-', phone='-',
+        email='test@example.com', owner=owner
+    )
+
+
+class CreateOrderItemsQueryCountTests(TestCase):
+    """
+    La materialización de items del checkout usa un número constante de consultas
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = create_restaurant()
+        cls.tenant = cls.restaurant.tenant
+        category = MenuCategory.objects.create(tenant=cls.tenant, name='Platos')
+
+        cls.menu_items = []
+        for index in range(10):
+            menu_item = MenuItem.objects.create(
+                tenant=cls.tenant, category=category, name=f'Plato {index}',
+                description='-', base_price=Decimal('1000')
+            )
+            cls.menu_items.append(menu_item)
+
+        cls.variants = [
+            MenuVariant.objects.create(tenant=cls.tenant, menu_item=menu_item, name='Grande', price_modifier=Decimal('500'))
+            for menu_item in cls.menu_items
+        ]
+        cls.addon = MenuAddon.objects.create(tenant=cls.tenant, name='Queso', price=Decimal('300'))
+        cls.modifier = MenuModifier.objects.create(tenant=cls.tenant, name='Sin cebolla')
+
+    def _order(self):
+        return Order.objects.create(
+            restaurant=self.restaurant, customer_name='Cliente',
+            subtotal=Decimal('0'), total_amount=Decimal('0')
+        )
+
+    def _cart_items(self, count):
+        items = []
+        for menu_item, variant in list(zip(self.menu_items, self.variants))[:count]:
+            items.append({
+                'menu_item_id': str(menu_item.id),
+                'menu_item': menu_item,
+                'quantity': 2,
+                'unit_price': '1800',
+                'variant_id': str(variant.id),
+                'variant_price': '500',
+                'addon_ids': [str(self.addon.id)],
+                'addon_price': '300',
+                'modifier_ids': [str(self.modifier.id)],
+                'modifier_price': '0',
+                'total_price': '3600',
+            })
+        return items
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        # variantes, addons, modificadores, OrderItem y las dos tablas M2M
+        for count in (1, 10):
+            order = self._order()
+            cart_items = self._cart_items(count)
+            with self.assertNumQueries(6):
+                _create_order_items(order, cart_items)
+
+            self.assertEqual(order.items.count(), count)
+            self.assertEqual(
+                OrderItem.selected_addons.through.objects.filter(orderitem__order=order).count(), count
+            )
+            self.assertEqual(
+                OrderItem.selected_modifiers.through.objects.filter(orderitem__order=order).count(), count
+            )
+
+
+class OrderNumberAllocatorTests(TestCase):
+    """
+    Números de pedido por restaurante y día reservados en bloques
+    """
+
+    DAY = date(2024, 9, 8)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = create_restaurant()
+
+    def setUp(self):
+        self.allocator = OrderNumberAllocator(block_size=3)
+
+    def _next(self):
+        # Cada pedido en su transacción: el resto del bloque se publica al hacer commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.allocator.next_number(self.restaurant.id, self.DAY)
+
+    def test_numbers_come_from_reserved_blocks(self):
+        numbers = [self._next() for _ in range(7)]
+
+        self.assertEqual(numbers, [f'ORD-20240908-{value:04d}' for value in range(1, 8)])
+        sequence = OrderNumberSequence.objects.get(restaurant=self.restaurant, date=self.DAY)
+        self.assertEqual(sequence.last_value, 9)
+
+    def test_rolled_back_block_is_not_reused_from_memory(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.assertEqual(self.allocator.next_number(self.restaurant.id, self.DAY), 'ORD-20240908-0001')
+                raise RuntimeError
+
+        # El contador volvió atrás junto con el pedido
+        self.assertEqual(self._next(), 'ORD-20240908-0001')
+        self.assertEqual(self._next(), 'ORD-20240908-0002')
+
+    def test_seed_compares_existing_numbers_numerically(self):
+        for number in ('ORD-20240908-0999', 'ORD-20240908-10000', 'ORD-20240907-20000'):
+            Order.objects.create(
+                restaurant=self.restaurant, customer_name='Cliente', order_number=number,
+                subtotal=Decimal('0'), total_amount=Decimal('0')
+            )
+
+        self.assertEqual(self._next(), 'ORD-20240908-10001')
+
+
+@mock.patch('restaurants.table_state.mark_table_dirty')
+@mock.patch('orders.event_coalescing.publish_events')
+class OrderEventBusTests(TestCase):
+    """
+    Los eventos de pedidos salen después del commit y solo a sus grupos
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = create_restaurant()
+        category = MenuCategory.objects.create(tenant=cls.restaurant.tenant, name='Bebidas')
+        cls.drink = MenuItem.objects.create(
+            tenant=cls.restaurant.tenant, category=category, name='Jugo',
+            description='-', base_price=Decimal('1000'), item_type='drink'
+        )
+
+    def _order(self):
+        return Order.objects.create(
+            restaurant=self.restaurant, customer_name='Cliente',
+            subtotal=Decimal('0'), total_amount=Decimal('0')
+        )
+
+    def test_event_is_published_only_after_commit(self, publish_events, mark_table_dirty):
+        with self.captureOnCommitCallbacks() as callbacks:
+            order = self._order()
+        publish_events.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+
+        groups, event = publish_events.call_args.args
+        self.assertEqual(event['event'], ORDER_CREATED)
+        self.assertEqual(event['order_id'], str(order.pk))
+        self.assertEqual(groups, [
+            restaurant_group(self.restaurant.id),
+            station_group(self.restaurant.id, 'bar'),
+            station_group(self.restaurant.id, 'kitchen'),
+        ])
+
+    def test_rolled_back_changes_publish_nothing(self, publish_events, mark_table_dirty):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self._order()
+                    raise RuntimeError
+
+        publish_events.assert_not_called()
+
+    def test_item_event_goes_to_its_station_only(self, publish_events, mark_table_dirty):
+        order = self._order()
+        item = OrderItem.objects.create(
+            order=order, menu_item=self.drink, unit_price=Decimal('1000'), total_price=Decimal('1000')
+        )
+        self.assertEqual(item.station, 'bar')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.status = 'ready'
+            item.save()
+
+        groups, event = publish_events.call_args.args
+        self.assertEqual(event['event'], ORDER_ITEM_STATUS_CHANGED)
+        self.assertEqual(groups, [restaurant_group(self.restaurant.id), station_group(self.restaurant.id, 'bar')])
+        self.assertEqual([entry['id'] for entry in event['items']], [item.id])
+        # El estado anterior es del item, no del pedido
+        self.assertNotIn('previous_status', event)
+        self.assertEqual(event['items'][0]['previous_status'], 'pending')
+
+
+class MergeEventsTests(SimpleTestCase):
+    """
+    Fundir eventos del mismo pedido en la ventana de agrupación
+    """
+
+    def _event(self, event_type, status, items=(), **extra):
+        event = {'event': event_type, 'order_id': 'o1', 'status': status, 'timestamp': status}
+        if items:
+            event['items'] = [dict(id=item_id, **fields) for item_id, fields in items]
+        event.update(extra)
+        return event
+
+    def test_latest_fields_win_and_strongest_type_is_kept(self):
+        created = self._event(ORDER_CREATED, 'pending', items=[(1, {'status': 'pending'}), (2, {'status': 'pending'})])
+        changed = self._event(
+            ORDER_STATUS_CHANGED, 'confirmed', items=[(2, {'status': 'preparing'}), (3, {'status': 'pending'})],
+            previous_status='pending'
+        )
+
+        merged = merge_events(created, changed)
+
+        self.assertEqual(merged['event'], ORDER_CREATED)
+        self.assertEqual(merged['status'], 'confirmed')
+        self.assertEqual(merged['timestamp'], 'confirmed')
+        self.assertEqual(merged['previous_status'], 'pending')
+        self.assertEqual(
+            merged['items'],
+            [{'id': 1, 'status': 'pending'}, {'id': 2, 'status': 'preparing'}, {'id': 3, 'status': 'pending'}]
+        )
+        self.assertEqual(merged['coalesced'], 2)
+        # El pendiente no se modifica
+        self.assertEqual(len(created['items']), 2)
+
+    def test_first_order_previous_status_is_kept(self):
+        first = self._event(ORDER_STATUS_CHANGED, 'confirmed', previous_status='pending')
+        second = self._event(ORDER_STATUS_CHANGED, 'preparing', previous_status='confirmed')
+        third = self._event(ORDER_STATUS_CHANGED, 'ready', previous_status='preparing')
+
+        merged = merge_events(merge_events(first, second), third)
+
+        self.assertEqual(merged['event'], ORDER_STATUS_CHANGED)
+        self.assertEqual(merged['status'], 'ready')
+        self.assertEqual(merged['previous_status'], 'pending')
+        self.assertEqual(merged['coalesced'], 3)
+        self.assertNotIn('items', merged)
+
+    def test_item_and_order_previous_statuses_do_not_mix(self):
+        item_changed = self._event(
+            ORDER_ITEM_STATUS_CHANGED, 'preparing',
+            items=[(1, {'status': 'ready', 'previous_status': 'preparing'})]
+        )
+        item_served = self._event(
+            ORDER_ITEM_STATUS_CHANGED, 'preparing',
+            items=[(1, {'status': 'served', 'previous_status': 'ready'})]
+        )
+        order_changed = self._event(ORDER_STATUS_CHANGED, 'ready', previous_status='preparing')
+
+        merged = merge_events(merge_events(item_changed, item_served), order_changed)
+
+        self.assertEqual(merged['event'], ORDER_STATUS_CHANGED)
+        self.assertEqual(merged['previous_status'], 'preparing')
+        self.assertEqual(merged['items'], [{'id': 1, 'status': 'served', 'previous_status': 'preparing'}])
+
+
+class SalesRollupTests(TestCase):
+    """
+    El mantenimiento incremental de los rollups coincide con rebuild_rollups
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = create_restaurant()
+        category = MenuCategory.objects.create(tenant=cls.restaurant.tenant, name='Platos')
+        cls.menu_items = [
+            MenuItem.objects.create(
+                tenant=cls.restaurant.tenant, category=category, name=f'Plato {index}',
+                description='-', base_price=Decimal('1000')
+            )
+            for index in range(2)
+        ]
+
+    def _order(self, quantities):
+        """Pedido con un item por producto, creado como en el checkout"""
+        total = sum(quantities) * Decimal('1000')
+        order = Order.objects.create(
+            restaurant=self.restaurant, customer_name='Cliente',
+            subtotal=total, total_amount=total
+        )
+        cart_items = [
+            {
+                'menu_item_id': str(menu_item.id),
+                'menu_item': menu_item,
+                'quantity': quantity,
+                'unit_price': '1000',
+                'total_price': str(quantity * 1000),
+            }
+            for menu_item, quantity in zip(self.menu_items, quantities)
+            if quantity
+        ]
+        record_items_added(order, _create_order_items(order, cart_items))
+        return order
+
+    def _snapshot(self):
+        """Filas de ventas y productos con cifras (las filas en cero no cuentan)"""
+        sales = DailySalesRollup.objects.filter(restaurant=self.restaurant).exclude(
+            orders_count=0, total_amount=0
+        ).values_list('day', 'status', 'orders_count', 'total_amount')
+        products = DailyProductSalesRollup.objects.filter(restaurant=self.restaurant).exclude(
+            Q(quantity=0) & Q(total_revenue=0)
+        ).values_list('day', 'status', 'menu_item_id', 'quantity', 'total_revenue')
+        return sorted(sales), sorted(products)
+
+    def assertMatchesRebuild(self):
+        incremental = self._snapshot()
+        today = local_today(self.restaurant)
+        rebuild_rollups(self.restaurant, today, today)
+        self.assertEqual(incremental, self._snapshot())
+
+    def test_status_and_total_changes_match_rebuild(self):
+        delivered = self._order([1, 2])
+        self._order([3, 1])
+
+        delivered.status = 'preparing'
+        delivered.save()
+        delivered.status = 'delivered'
+        delivered.save()
+
+        discounted = self._order([2, 0])
+        discounted.total_amount = Decimal('1500')
+        discounted.save()
+
+        self.assertMatchesRebuild()
+
+    def test_deleted_order_matches_rebuild(self):
+        kept = self._order([1, 1])
+        kept.status = 'ready'
+        kept.save()
+
+        cancelled = self._order([2, 3])
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        cancelled.delete()
+
+        self._order([4, 0]).delete()
+
+        self.assertMatchesRebuild()
+
+    def test_status_update_locks_the_order(self):
+        order = self._order([1, 1])
+        # Otra request confirmó el pedido; la instancia order quedó con el estado anterior
+        confirmed = Order.objects.get(pk=order.pk)
+        confirmed.status = 'confirmed'
+        confirmed.save()
+
+        request = RequestFactory().post('/', {'status': 'ready'})
+        request.user = self.restaurant.owner
+        request.restaurant = self.restaurant
+        with CaptureQueriesContext(connection) as queries:
+            response = update_order_status(request, self.restaurant.tenant.slug, order.pk)
+
+        self.assertTrue(json.loads(response.content)['success'])
+        self.assertTrue(any('FOR UPDATE' in query['sql'] for query in queries.captured_queries))
+        history = OrderStatusHistory.objects.get(order=order)
+        self.assertEqual((history.previous_status, history.new_status), ('confirmed', 'ready'))
+        self.assertMatchesRebuild()
+
+
+class ExportRowsTests(TestCase):
+    """
+    Filtros de la exportación: días locales del restaurante, estados y tipos de pedido
+    """
+
+    DAY = date(2024, 6, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = create_restaurant()
+        category = MenuCategory.objects.create(tenant=cls.restaurant.tenant, name='Platos')
+        menu_item = MenuItem.objects.create(
+            tenant=cls.restaurant.tenant, category=category, name='Plato',
+            description='-', base_price=Decimal('1000')
+        )
+        # (número, estado, tipo, creado en UTC); Santiago está en UTC-4 en junio
+        orders = [
+            ('A1', 'pending', 'dine_in', datetime(2024, 6, 1, 15, tzinfo=dt_timezone.utc)),
+            ('A2', 'pending', 'takeaway', datetime(2024, 6, 1, 16, tzinfo=dt_timezone.utc)),
+            ('A3', 'delivered', 'dine_in', datetime(2024, 6, 1, 17, tzinfo=dt_timezone.utc)),
+            ('A4', 'pending', 'dine_in', datetime(2024, 6, 2, 3, 30, tzinfo=dt_timezone.utc)),
+            ('A5', 'pending', 'dine_in', datetime(2024, 6, 2, 4, 30, tzinfo=dt_timezone.utc)),
+        ]
+        for order_number, status, order_type, created_at in orders:
+            order = Order.objects.create(
+                restaurant=cls.restaurant, order_number=order_number, status=status,
+                order_type=order_type, customer_name='Cliente',
+                subtotal=Decimal('1000'), total_amount=Decimal('1000')
+            )
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+            OrderItem.objects.create(
+                order=order, menu_item=menu_item, restaurant=cls.restaurant,
+                unit_price=Decimal('1000'), total_price=Decimal('1000')
+            )
+
+    def _numbers(self, dataset='orders', **filters):
+        # La primera columna de ambos datasets es el número del pedido
+        return [row[0] for row in export_rows(self.restaurant, dataset, self.DAY, self.DAY, **filters)]
+
+    def test_date_range_uses_the_local_day(self):
+        rows = list(export_rows(self.restaurant, 'orders', self.DAY, self.DAY))
+
+        self.assertEqual([row[0] for row in rows], ['A1', 'A2', 'A3', 'A4'])
+        # Fechas en hora local: A4 se creó el 2 de junio en UTC
+        self.assertEqual(rows[-1][1], '2024-06-01 23:30:00')
+
+    def test_status_and_order_type_filters(self):
+        self.assertEqual(self._numbers(statuses=['pending'], order_types=['dine_in']), ['A1', 'A4'])
+        self.assertEqual(self._numbers(statuses=['delivered', 'cancelled']), ['A3'])
+        self.assertEqual(self._numbers(order_types=['takeaway', 'delivery']), ['A2'])
+
+    def test_item_rows_are_filtered_by_their_order(self):
+        self.assertEqual(self._numbers('items', statuses=['pending'], order_types=['dine_in']), ['A1', 'A4'])
+
+    def test_csv_neutralizes_formulas(self):
+        Order.objects.filter(order_number='A1').update(customer_name='=HYPERLINK("http://x")')
+
+        content = b''.join(stream_export(self.restaurant, 'orders', 'csv', self.DAY, self.DAY)).decode('utf-8-sig')
+
+        self.assertIn("'=HYPERLINK", content)
+        self.assertEqual(len(content.splitlines()), 5)
+
+
+@mock.patch('restaurants.table_state.mark_table_dirty')
+@mock.patch('orders.event_coalescing.publish_events')
+class OrderStatsTests(TestCase):
+    """
+    Las estadísticas del día se cachean y se invalidan al confirmar cambios de pedidos
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = create_restaurant()
+
+    def setUp(self):
+        cache.clear()
+
+    def _stats(self):
+        return get_order_stats(self.restaurant)
+
+    def _create_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Order.objects.create(
+                restaurant=self.restaurant, customer_name='Cliente',
+                subtotal=Decimal('1000'), total_amount=Decimal('1000')
+            )
+
+    def test_stats_are_cached(self, publish_events, mark_table_dirty):
+        self._create_order()
+        self._stats()
+
+        with self.assertNumQueries(0):
+            stats = self._stats()
+
+        self.assertEqual(stats['total_orders'], 1)
+        self.assertEqual(stats['active_orders'], 1)
+
+    def test_order_changes_invalidate_after_commit(self, publish_events, mark_table_dirty):
+        self.assertEqual(self._stats()['total_orders'], 0)
+
+        order = self._create_order()
+        self.assertEqual(self._stats()['pending_orders'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'delivered'
+            order.save()
+        stats = self._stats()
+        self.assertEqual((stats['pending_orders'], stats['delivered_orders']), (0, 1))
+        self.assertEqual(stats['total_revenue'], Decimal('1000'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(self._stats()['total_orders'], 0)
+
+    def test_uncommitted_and_unrelated_changes_keep_the_cache(self, publish_events, mark_table_dirty):
+        order = self._create_order()
+        self._stats()
+
+        # Sin commit el caché sigue vigente
+        with self.captureOnCommitCallbacks(execute=False):
+            Order.objects.create(
+                restaurant=self.restaurant, customer_name='Cliente',
+                subtotal=Decimal('0'), total_amount=Decimal('0')
+            )
+        # Cambios que no afectan las cifras no invalidan
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            order.customer_name = 'Otro'
+            order.save()
+
+        self.assertEqual(len(callbacks), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._stats()['total_orders'], 1)
+
+
+class RestaurantOrdersListViewTests(TestCase):
+    """
+    Cursor inválido: el HTML vuelve a la primera página y el JSON responde 400
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = create_restaurant()
+        for _ in range(3):
+            Order.objects.create(
+                restaurant=cls.restaurant, customer_name='Cliente',
+                subtotal=Decimal('0'), total_amount=Decimal('0')
+            )
+
+    def _request(self, **params):
+        request = RequestFactory().get('/', params)
+        request.user = self.restaurant.owner
+        request.restaurant = self.restaurant
+        return request
+
+    def test_invalid_cursor_falls_back_to_first_page_in_html(self):
+        view = RestaurantOrdersListView()
+        view.setup(self._request(cursor='no-es-un-cursor'))
+
+        _, page, orders, _ = view.paginate_queryset(view.get_queryset(), 2)
+
+        self.assertEqual(len(orders), 2)
+        self.assertIsNone(page.cursor)
+
+    def test_invalid_cursor_is_rejected_in_json(self):
+        response = RestaurantOrdersListView.as_view()(self._request(format='json', cursor='no-es-un-cursor'))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {'success': False, 'error': 'Cursor inválido'})
+
+    def test_json_pages_follow_the_cursor(self):
+        view = RestaurantOrdersListView.as_view(paginate_by=2)
+        first = json.loads(view(self._request(format='json')).content)
+        second = json.loads(view(self._request(format='json', cursor=first['next_cursor'])).content)
+
+        ids = [order['id'] for order in first['results'] + second['results']]
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(len(set(ids)), 3)
+        self.assertTrue(first['has_next'])
+        self.assertFalse(second['has_next'])
@@ -11,9 +11,17 @@ from decimal import Decimal
 import logging
 
 from restaurants.models import Restaurant, Table
+from restaurants.time_windows import today_filter
+from restaurants import pagination
+from restaurants.scan_buffer import mark_scan_converted
 from restaurants.waiter_notifications import WaiterNotificationService
 from menu.cart import Cart
+from menu.pricing import CartPricingError
 from .models import Order, OrderItem, OrderStatusHistory
+from .routing import route_order_item
+from .events import OrderEventBus, ORDER_ITEMS_ADDED
+from .rollups import record_items_added
+from .stats import get_order_stats
 from .forms import CheckoutForm, OrderStatusUpdateForm, CustomerReviewForm
 
 logger = logging.getLogger(__name__)
@@ -134,8 +142,11 @@ class CheckoutView(object):
         """
         Crear orden y items a partir del carrito
         """
-        # Calcular precios
-        subtotal = cart.get_total_price()
+        # Recalcular precios en el servidor (no confiar en los de la sesión)
+        pricing = cart.reprice()
+        if not pricing.is_valid:
+            raise CartPricingError(pricing.error_message())
+        subtotal = pricing.total
         tax_rate = Decimal('0.19')  # 19% IVA (configurable)
         tax_amount = subtotal * tax_rate
         
@@ -160,9 +171,9 @@ class CheckoutView(object):
         
         order.save()
         
-        # Crear items de la orden usando el iterador que incluye total_price
-        for item_data in cart:
-            self._create_order_item(order, item_data)
+        # Crear items de la orden en bloque
+        order_items = _create_order_items(order, list(cart))
+        record_items_added(order, order_items)
         
         # Crear historial de estado
         OrderStatusHistory.objects.create(
@@ -172,43 +183,6 @@ class CheckoutView(object):
         )
         
         return order
-    
-    def _create_order_item(self, order, item_data):
-        """
-        Crear un item de orden a partir de datos del carrito
-        """
-        from menu.models import MenuItem, MenuVariant, MenuAddon, MenuModifier
-        
-        menu_item = MenuItem.objects.get(id=item_data['menu_item_id'])
-        
-        # Crear el item de orden
-        order_item = OrderItem.objects.create(
-            order=order,
-            menu_item=menu_item,
-            quantity=item_data['quantity'],
-            unit_price=item_data['unit_price'],
-            variant_price=item_data.get('variant_price', 0),
-            addons_price=item_data.get('addons_price', 0),
-            modifiers_price=item_data.get('modifiers_price', 0),
-            total_price=item_data['total_price'],
-            special_instructions=item_data.get('special_instructions', '')
-        )
-        
-        # Agregar variante si existe
-        if item_data.get('variant_id'):
-            variant = MenuVariant.objects.get(id=item_data['variant_id'])
-            order_item.selected_variant = variant
-            order_item.save()
-        
-        # Agregar addons
-        if item_data.get('addon_ids'):
-            addons = MenuAddon.objects.filter(id__in=item_data['addon_ids'])
-            order_item.selected_addons.add(*addons)
-        
-        # Agregar modificadores
-        if item_data.get('modifier_ids'):
-            modifiers = MenuModifier.objects.filter(id__in=item_data['modifier_ids'])
-            order_item.selected_modifiers.add(*modifiers)
 
 
 def checkout(request, tenant_slug):
@@ -221,9 +195,6 @@ def checkout(request, tenant_slug):
     restaurant = request.restaurant
     cart = Cart(request)
     
-    print(f"🔍 Restaurant: {restaurant.name}")
-    print(f"🔍 Cart items: {len(cart)}")
-    
     # 🎯 DETECTAR SESIÓN DE MESA ACTIVA
     from restaurants.table_session_manager import TableSessionManager
     table_session = TableSessionManager.get_active_session(request)
@@ -234,71 +205,41 @@ def checkout(request, tenant_slug):
         # Redirigir al menú usando URL absoluta
         return redirect(f'/{tenant_slug}/menu/')
     
+    table_info = None
+    
     if request.method == 'POST':
-        print("🔍 POST request received!")
-        print(f"🔍 POST data: {request.POST}")
-        
         form = CheckoutForm(request.POST)
-        print(f"🔍 Form valid: {form.is_valid()}")
         
-        # Si el pedido viene de QR y se crea exitosamente, actualizar estadísticas de la mesa
         if form.is_valid():
-            selected_table_info = request.session.get('selected_table')
-            if selected_table_info:
-                try:
-                    from restaurants.models import Table, TableScanLog
-                    table = Table.objects.get(id=selected_table_info['table_id'])
-                    table.increment_order_count()
-                    
-                    # Marcar el escaneo como que resultó en pedido
-                    scan_log_id = selected_table_info.get('scan_log_id')
-                    if scan_log_id:
-                        scan_log = TableScanLog.objects.get(id=scan_log_id)
-                        scan_log.resulted_in_order = True
-                        scan_log.save()
-                        
-                    print(f"🔍 Mesa {table.number} actualizada - pedido desde QR")
-                except Exception as e:
-                    print(f"🔍 Error actualizando mesa QR: {e}")
-        
-        if form.is_valid():
-            print("🔍 Form is valid, creating order...")
             try:
                 # Crear la orden con transacción
                 with transaction.atomic():
                     order = _create_order_from_cart(form, restaurant, cart, request)
-                    print(f"🔍 Order created: #{order.order_number}")
+                    logger.info("Pedido %s creado en %s", order.order_number, restaurant.tenant.slug)
+                    
+                    # Pedido desde QR: marcar el escaneo de la sesión de mesa como convertido
+                    # (el contador de pedidos de la mesa lo sube _create_order_from_cart)
+                    if table_session and table_session.get('scan_id'):
+                        scan_id = table_session['scan_id']
+                        transaction.on_commit(lambda: mark_scan_converted(scan_id))
                     
                     # Limpiar el carrito
                     cart.clear()
-                    print("🔍 Cart cleared")
                     
                     messages.success(request, f'¡Pedido realizado exitosamente! Número de orden: {order.order_number}')
                     return redirect('orders:order_detail', tenant_slug=tenant_slug, order_id=order.id)
                     
             except Exception as e:
-                print(f"❌ Error en checkout POST: {e}")
-                logger.error(f"Error en checkout POST: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error en checkout POST")
                 messages.error(request, f'Error al procesar el pedido: {str(e)}')
         else:
-            print("🚨 ❌ FORMULARIO INVÁLIDO - ESTA ES LA CAUSA DEL REFRESH!")
-            print(f"❌ Form errors completos: {form.errors}")
-            print(f"❌ Form non-field errors: {form.non_field_errors()}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Formulario de checkout inválido: %s", form.errors.as_json())
             
-            # Debug detallado de cada campo
-            print("🔍 ANÁLISIS DETALLADO DE ERRORES:")
             for field, errors in form.errors.items():
-                print(f"    Campo '{field}': {list(errors)}")
                 for error in errors:
-                    print(f"      - {error}")
                     messages.error(request, f'{field}: {error}')
-            
-            print("🚨 RENDERIZANDO PÁGINA CON ERRORES (esto causa el 'refresh')")
     else:
-        print("🔍 GET request, showing form")
-        
         # 🎯 CREAR FORMULARIO CON DATOS PRE-LLENOS SI HAY SESIÓN DE MESA
         form_initial = {}
         table_info = None
@@ -317,9 +258,9 @@ def checkout(request, tenant_slug):
                     'order_type': 'dine_in',  # Forzar tipo "en restaurante"
                     'table_number': table.display_name,  # Pre-llenar mesa
                 }
-                print(f"🪑 Mesa detectada en sesión: {table.display_name}")
+                logger.debug("Mesa detectada en sesión: %s", table.display_name)
             except Table.DoesNotExist:
-                print("❌ Mesa no encontrada en DB")
+                logger.warning("Mesa %s de la sesión no encontrada en DB", table_session['table_id'])
         
         form = CheckoutForm(initial=form_initial)
     
@@ -337,7 +278,6 @@ def checkout(request, tenant_slug):
         'is_table_session': table_session is not None,  # 🆕 Flag
     }
     
-    print(f"🔍 Rendering template with context")
     return render(request, 'orders/checkout.html', context)
 
 
@@ -348,8 +288,11 @@ def _create_order_from_cart(form, restaurant, cart, request):
     """
     Crear orden y items a partir del carrito
     """
-    # Calcular precios
-    subtotal = cart.get_total_price()
+    # Recalcular precios en el servidor (no confiar en los de la sesión)
+    pricing = cart.reprice()
+    if not pricing.is_valid:
+        raise CartPricingError(pricing.error_message())
+    subtotal = pricing.total
     tax_rate = Decimal('0.19')  # 19% IVA (configurable)
     tax_amount = subtotal * tax_rate
     
@@ -385,9 +328,9 @@ def _create_order_from_cart(form, restaurant, cart, request):
                 # Incrementar contador de pedidos de la mesa
                 table.increment_order_count()
                 
-                logger.info(f"Mesa {table.number} asignada al pedido {order.order_number}")
+                logger.info("Mesa %s asignada al pedido", table.number)
             except Table.DoesNotExist:
-                logger.warning(f"Mesa con UUID {table_uuid} no encontrada")
+                logger.warning("Mesa con UUID %s no encontrada", table_uuid)
         
         # Si no hay mesa de QR pero sí número de mesa manual
         elif form.cleaned_data.get('table_number'):
@@ -397,15 +340,15 @@ def _create_order_from_cart(form, restaurant, cart, request):
                     restaurant=restaurant
                 )
                 order.table = table
-                logger.info(f"Mesa {table.number} asignada manualmente al pedido {order.order_number}")
+                logger.info("Mesa %s asignada manualmente al pedido", table.number)
             except Table.DoesNotExist:
-                logger.warning(f"Mesa número {form.cleaned_data['table_number']} no existe")
+                logger.warning("Mesa número %s no existe", form.cleaned_data['table_number'])
     
     order.save()
     
-    # Crear items de la orden usando el iterador que incluye total_price
-    for item_data in cart:
-        _create_order_item(order, item_data)
+    # Crear items de la orden en bloque (el iterador del carrito incluye total_price)
+    order_items = _create_order_items(order, list(cart))
+    record_items_added(order, order_items)
     
     # Crear historial de estado
     OrderStatusHistory.objects.create(
@@ -418,51 +361,105 @@ def _create_order_from_cart(form, restaurant, cart, request):
     try:
         notification = WaiterNotificationService.notify_new_order(order)
         if notification:
-            logger.info(f"Notificación enviada a garzón {notification.waiter.full_name} para pedido {order.order_number}")
+            logger.info("Notificación enviada a garzón %s para pedido %s", notification.waiter_id, order.order_number)
         else:
-            logger.warning(f"No se pudo enviar notificación para pedido {order.order_number}")
-    except Exception as e:
-        logger.error(f"Error enviando notificación para pedido {order.order_number}: {e}")
+            logger.warning("No se pudo enviar notificación para pedido %s", order.order_number)
+    except Exception:
+        logger.exception("Error enviando notificación para pedido %s", order.order_number)
     
     return order
 
 
-def _create_order_item(order, item_data):
+def _create_order_items(order, cart_items):
     """
-    Crear un item de orden a partir de datos del carrito
+    Crear todos los items de una orden a partir del carrito
+    
+    Número constante de consultas sin importar el tamaño del carrito:
+    una por modelo referenciado, un bulk_create de OrderItem y uno por tabla M2M
     """
     from menu.models import MenuItem, MenuVariant, MenuAddon, MenuModifier
     
-    menu_item = MenuItem.objects.get(id=item_data['menu_item_id'])
+    if not cart_items:
+        return []
     
-    # Crear el item de orden
-    order_item = OrderItem.objects.create(
-        order=order,
-        menu_item=menu_item,
-        quantity=item_data['quantity'],
-        unit_price=item_data['unit_price'],  # Cambio de base_price a unit_price
-        variant_price=item_data.get('variant_price', '0'),
-        addons_price=item_data.get('addon_price', '0'),  # Era addons_price, pero en cart es addon_price
-        modifiers_price=item_data.get('modifier_price', '0'),  # Era modifiers_price, pero en cart es modifier_price
-        total_price=item_data['total_price'],
-        special_instructions=item_data.get('special_instructions', '')
-    )
+    # Resolver todo lo referenciado (una consulta por modelo)
+    menu_items = {item['menu_item_id']: item['menu_item'] for item in cart_items if item.get('menu_item')}
+    missing_item_ids = {item['menu_item_id'] for item in cart_items} - set(menu_items)
+    if missing_item_ids:
+        menu_items.update(
+            (str(menu_item.id), menu_item)
+            for menu_item in MenuItem.objects.filter(id__in=missing_item_ids)
+        )
+    
+    variant_ids = {str(item['variant_id']) for item in cart_items if item.get('variant_id')}
+    addon_ids = {str(addon_id) for item in cart_items for addon_id in item.get('addon_ids') or []}
+    modifier_ids = {str(modifier_id) for item in cart_items for modifier_id in item.get('modifier_ids') or []}
+    
+    variants = {
+        str(variant.id): variant
+        for variant in MenuVariant.objects.filter(id__in=variant_ids)
+    } if variant_ids else {}
+    existing_addons = {
+        str(addon_id) for addon_id in MenuAddon.objects.filter(id__in=addon_ids).values_list('id', flat=True)
+    } if addon_ids else set()
+    existing_modifiers = {
+        str(modifier_id) for modifier_id in MenuModifier.objects.filter(id__in=modifier_ids).values_list('id', flat=True)
+    } if modifier_ids else set()
+    
+    # Construir los items en memoria
+    order_items = []
+    for item_data in cart_items:
+        menu_item = menu_items.get(item_data['menu_item_id'])
+        if menu_item is None:
+            raise MenuItem.DoesNotExist(f"Producto {item_data['menu_item_id']} no existe")
+        
+        variant = None
+        if item_data.get('variant_id'):
+            variant = variants.get(str(item_data['variant_id']))
+            if variant is None:
+                raise MenuVariant.DoesNotExist(f"Variante {item_data['variant_id']} no existe")
+        
+        order_item = OrderItem(
+            order=order,
+            menu_item=menu_item,
+            selected_variant=variant,
+            quantity=item_data['quantity'],
+            unit_price=item_data['unit_price'],
+            variant_price=item_data.get('variant_price', '0'),
+            addons_price=item_data.get('addon_price', '0'),  # En el carrito es addon_price
+            modifiers_price=item_data.get('modifier_price', '0'),  # En el carrito es modifier_price
+            total_price=item_data['total_price'],
+            special_instructions=item_data.get('special_instructions', '')
+        )
+        
+        # Ruteo a estación: restaurante y cocina/bar quedan fijos en el item
+        order_items.append(route_order_item(order_item, order=order, menu_item=menu_item))
+    
+    OrderItem.objects.bulk_create(order_items)
     
-    # Agregar variante si existe
-    if item_data.get('variant_id'):
-        variant = MenuVariant.objects.get(id=item_data['variant_id'])
-        order_item.selected_variant = variant
-        order_item.save()
-    
-    # Agregar addons
-    if item_data.get('addon_ids'):
-        addons = MenuAddon.objects.filter(id__in=item_data['addon_ids'])
-        order_item.selected_addons.add(*addons)
-    
-    # Agregar modificadores
-    if item_data.get('modifier_ids'):
-        modifiers = MenuModifier.objects.filter(id__in=item_data['modifier_ids'])
-        order_item.selected_modifiers.add(*modifiers)
+    # bulk_create no dispara post_save: un solo evento con todos los items nuevos
+    OrderEventBus.emit(ORDER_ITEMS_ADDED, order, items=order_items)
+    
+    # Filas de las tablas intermedias M2M en bloque
+    AddonThrough = OrderItem.selected_addons.through
+    ModifierThrough = OrderItem.selected_modifiers.through
+    addon_rows = []
+    modifier_rows = []
+    
+    for order_item, item_data in zip(order_items, cart_items):
+        for addon_id in dict.fromkeys(str(a) for a in item_data.get('addon_ids') or []):
+            if addon_id in existing_addons:
+                addon_rows.append(AddonThrough(orderitem_id=order_item.pk, menuaddon_id=addon_id))
+        for modifier_id in dict.fromkeys(str(m) for m in item_data.get('modifier_ids') or []):
+            if modifier_id in existing_modifiers:
+                modifier_rows.append(ModifierThrough(orderitem_id=order_item.pk, menumodifier_id=modifier_id))
+    
+    if addon_rows:
+        AddonThrough.objects.bulk_create(addon_rows)
+    if modifier_rows:
+        ModifierThrough.objects.bulk_create(modifier_rows)
+    
+    return order_items
 
 
 checkout_view = CheckoutView()
@@ -553,6 +550,38 @@ class RestaurantOrdersListView(LoginRequiredMixin, ListView):
         
         return queryset.order_by('-created_at')
     
+    def get(self, request, *args, **kwargs):
+        try:
+            return super().get(request, *args, **kwargs)
+        except pagination.InvalidCursor:
+            return JsonResponse({'success': False, 'error': 'Cursor inválido'}, status=400)
+    
+    def paginate_queryset(self, queryset, page_size):
+        """Paginación por cursor sobre (created_at, id) en vez de OFFSET + COUNT"""
+        # HTML: un cursor inválido vuelve a la primera página; JSON: 400 (ver get)
+        page = pagination.paginate_request(
+            self.request, queryset, page_size, strict=pagination.wants_json(self.request)
+        )
+        return None, page, page.object_list, page.has_other_pages()
+    
+    def render_to_response(self, context, **response_kwargs):
+        # ?format=json: misma página y cursor para clientes AJAX
+        if pagination.wants_json(self.request):
+            return JsonResponse(pagination.page_payload(context['page_obj'], [
+                {
+                    'id': order.id,
+                    'order_number': order.order_number,
+                    'status': order.status,
+                    'order_type': order.order_type,
+                    'table_number': order.table_number,
+                    'customer_name': order.customer_name,
+                    'total_amount': order.total_amount,
+                    'created_at': order.created_at,
+                }
+                for order in context['page_obj']
+            ]))
+        return super().render_to_response(context, **response_kwargs)
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         # El middleware ya inyecta restaurant en el request
@@ -564,21 +593,10 @@ class RestaurantOrdersListView(LoginRequiredMixin, ListView):
         context['current_status'] = self.request.GET.get('status', 'all')
         context['current_order_type'] = self.request.GET.get('order_type', 'all')
         
-        # Estadísticas del día
-        today = timezone.now().date()
-        today_orders = Order.objects.filter(
-            restaurant=restaurant,
-            created_at__date=today
-        )
+        # Estadísticas del día local del restaurante (una consulta, cacheada; orders/stats.py)
+        today_stats = get_order_stats(restaurant)
         
-        context['today_stats'] = {
-            'total_orders': today_orders.count(),
-            'pending_orders': today_orders.filter(status='pending').count(),
-            'confirmed_orders': today_orders.filter(status='confirmed').count(),
-            'preparing_orders': today_orders.filter(status='preparing').count(),
-            'ready_orders': today_orders.filter(status='ready').count(),
-            'total_revenue': sum(order.total_amount for order in today_orders.filter(status__in=['delivered', 'ready']))
-        }
+        context['today_stats'] = today_stats
         
         return context
 
@@ -592,7 +610,6 @@ def update_order_status(request, tenant_slug, order_id):
     try:
         # El middleware ya inyecta restaurant en el request
         restaurant = request.restaurant
-        order = get_object_or_404(Order, id=order_id, restaurant=restaurant)
         
         # Verificar permisos
         if not (request.user.is_superuser or 
@@ -605,30 +622,35 @@ def update_order_status(request, tenant_slug, order_id):
         if new_status not in dict(Order.STATUS_CHOICES):
             return JsonResponse({'success': False, 'error': 'Estado inválido'})
         
-        # Guardar estado anterior para el historial
-        previous_status = order.status
-        
-        # Actualizar timestamps según el estado
-        now = timezone.now()
-        if new_status == 'confirmed' and not order.confirmed_at:
-            order.confirmed_at = now
-        elif new_status == 'ready' and not order.ready_at:
-            order.ready_at = now
-        elif new_status == 'delivered' and not order.delivered_at:
-            order.delivered_at = now
-        
-        # Actualizar orden
-        order.status = new_status
-        order.save()
-        
-        # Crear registro en el historial
-        OrderStatusHistory.objects.create(
-            order=order,
-            previous_status=previous_status,
-            new_status=new_status,
-            changed_by=request.user,
-            notes=notes
-        )
+        with transaction.atomic():
+            # Pedido bloqueado hasta el commit: dos cambios concurrentes se serializan y
+            # los rollups restan del estado vigente, no de uno leído antes (orders/rollups.py)
+            order = get_object_or_404(Order.objects.select_for_update(), id=order_id, restaurant=restaurant)
+            
+            # Guardar estado anterior para el historial
+            previous_status = order.status
+            
+            # Actualizar timestamps según el estado
+            now = timezone.now()
+            if new_status == 'confirmed' and not order.confirmed_at:
+                order.confirmed_at = now
+            elif new_status == 'ready' and not order.ready_at:
+                order.ready_at = now
+            elif new_status == 'delivered' and not order.delivered_at:
+                order.delivered_at = now
+            
+            # Actualizar orden
+            order.status = new_status
+            order.save()
+            
+            # Crear registro en el historial
+            OrderStatusHistory.objects.create(
+                order=order,
+                previous_status=previous_status,
+                new_status=new_status,
+                changed_by=request.user,
+                notes=notes
+            )
         
         # 🆕 NOTIFICAR AL GARZÓN CUANDO EL PEDIDO ESTÉ LISTO
         if new_status == 'ready':
@@ -704,14 +726,11 @@ def my_orders(request, tenant_slug):
         from restaurants.models import Table
         table = Table.objects.get(id=table_session['table_id'])
         
-        # Obtener pedidos de esta sesión/mesa del día actual
-        from django.utils import timezone
-        today = timezone.now().date()
-        
+        # Obtener pedidos de esta sesión/mesa del día actual (día local del restaurante)
         orders = Order.objects.filter(
             restaurant=restaurant,
             table=table,
-            created_at__date=today
+            **today_filter(restaurant)
         ).select_related('table').prefetch_related(
             'items__menu_item',
             'items__selected_variant',
@@ -99,7 +99,7 @@ class RestaurantAdmin(admin.ModelAdmin):
             'fields': ('address', 'phone', 'email')
         }),
         ('Horarios de atención', {
-            'fields': ('opening_time', 'closing_time'),
+            'fields': ('opening_time', 'closing_time', 'timezone'),
             'classes': ('collapse',)
         }),
         ('Fechas', {
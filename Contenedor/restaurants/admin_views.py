@@ -3,21 +3,27 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST, require_http_methods
 from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DeleteView
-from django.utils import timezone
 from django.core.paginator import Paginator
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, Q
 from django.urls import reverse_lazy, reverse
 from datetime import timedelta, datetime
-import qrcode
-from io import BytesIO
-import base64
-
 from .models import Restaurant, Table, Waiter, WaiterNotification, KitchenStaff, BarStaff, WaiterStaff
 from menu.models import MenuItem, MenuCategory, MenuVariant, MenuAddon
-from orders.models import Order, OrderItem
+from orders.models import Order
+from .qr_service import QRCodeService, qr_format, qr_image_response
+from . import qr_export
+from .counters import table_counter_totals
+from .station_stats import get_station_stats
+from .table_session_manager import TableSessionManager
+from .table_state import invalidate_waiter_table_state, mark_table_dirty
+from .time_windows import local_today
+from orders.event_coalescing import event_metrics, get_event_coalescer
+from orders import exports as order_exports
+from orders.stats import get_order_stats
+from orders.rollups import SALES_STATUSES, daily_sales, sales_summary, top_products as rollup_top_products
 from django.contrib.auth.models import User
 
 
@@ -77,6 +83,15 @@ def restaurant_admin_required(view_func):
 # DASHBOARD PRINCIPAL
 # ============================================================================
 
+def _staff_counts(model, restaurant):
+    """Empleados activos, inactivos y sin turno de un modelo (una consulta)"""
+    return model.objects.filter(restaurant=restaurant).aggregate(
+        active=Count('id', filter=Q(status='active')),
+        inactive=Count('id', filter=Q(status='inactive')),
+        without_shift=Count('id', filter=Q(shift_start__isnull=True)),
+    )
+
+
 class RestaurantAdminDashboard(RestaurantAdminMixin, TemplateView):
     """Dashboard principal para administradores del restaurante"""
     template_name = 'restaurants/admin/dashboard.html'
@@ -94,28 +109,16 @@ class RestaurantAdminDashboard(RestaurantAdminMixin, TemplateView):
             'detection_method': self._get_qr_detection_method(sample_table)
         }
         
-        # Estadísticas generales
-        today = timezone.now().date()
-        week_ago = today - timedelta(days=7)
+        # Estadísticas generales (rollups diarios por día local del restaurante, orders/rollups.py)
+        today = local_today(restaurant)
         month_ago = today - timedelta(days=30)
         
-        # Pedidos
-        orders_today = Order.objects.filter(restaurant=restaurant, created_at__date=today)
-        orders_week = Order.objects.filter(restaurant=restaurant, created_at__date__gte=week_ago)
-        orders_month = Order.objects.filter(restaurant=restaurant, created_at__date__gte=month_ago)
-        
-        # Ventas
-        sales_today = orders_today.filter(status__in=['delivered', 'ready']).aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        
-        sales_week = orders_week.filter(status__in=['delivered', 'ready']).aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        
-        sales_month = orders_month.filter(status__in=['delivered', 'ready']).aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
+        summary = sales_summary(restaurant, today)
+        # Hoy: conteos por estado y venta en vivo (orders/stats.py, compartido con el listado de pedidos)
+        today_stats = get_order_stats(restaurant, today)
+        sales_today = today_stats['total_revenue']
+        sales_week = summary['sales_week']
+        sales_month = summary['sales_month']
         
         # Pedidos pendientes
         pending_orders = Order.objects.filter(
@@ -124,39 +127,24 @@ class RestaurantAdminDashboard(RestaurantAdminMixin, TemplateView):
         ).order_by('-created_at')[:10]
         
         # Productos más vendidos
-        top_products = OrderItem.objects.filter(
-            order__restaurant=restaurant,
-            order__created_at__date__gte=month_ago
-        ).values(
-            'menu_item__name'
-        ).annotate(
-            total_quantity=Sum('quantity'),
-            total_revenue=Sum('total_price')
-        ).order_by('-total_quantity')[:10]
-        
-        # Personal activo usando los nombres correctos de relacionados Django
-        
-        # KitchenStaff, BarStaff y WaiterStaff heredan de RestaurantEmployee que tiene restaurant = ForeignKey(Restaurant)
-        active_kitchen_staff = KitchenStaff.objects.filter(restaurant=restaurant, status='active')
-        active_bar_staff = BarStaff.objects.filter(restaurant=restaurant, status='active')
-        active_waiter_staff = WaiterStaff.objects.filter(restaurant=restaurant, status='active')
-        
-        # Mantener compatibilidad con el modelo original Waiter que tiene related_name='waiters'
-        try:
-            active_waiters = restaurant.waiters.filter(status='active')
-            active_waiters_count = active_waiters.count()
-        except:
-            active_waiters = []
-            active_waiters_count = 0
+        top_products = rollup_top_products(restaurant, month_ago)
         
-        total_active_staff = active_waiters_count + active_kitchen_staff.count() + active_bar_staff.count() + active_waiter_staff.count()
+        # Personal: activos, inactivos y sin turno en una consulta por modelo
+        staff_counts = {
+            'kitchen': _staff_counts(KitchenStaff, restaurant),
+            'bar': _staff_counts(BarStaff, restaurant),
+            'waiter_staff': _staff_counts(WaiterStaff, restaurant),
+            'waiters': _staff_counts(Waiter, restaurant),
+        }
+        active_waiters_count = staff_counts['waiters']['active']
+        total_active_staff = sum(counts['active'] for counts in staff_counts.values())
         
         # Mesas con problemas
         tables_without_waiter = restaurant.tables.filter(assigned_waiter=None, is_active=True)
         
         # Calcular promedios
-        orders_today_count = orders_today.count()
-        orders_month_count = orders_month.count()
+        orders_today_count = today_stats['total_orders']
+        orders_month_count = summary['orders_month']
         
         avg_order_today = sales_today / orders_today_count if orders_today_count > 0 else 0
         avg_order_month = sales_month / orders_month_count if orders_month_count > 0 else 0
@@ -166,7 +154,8 @@ class RestaurantAdminDashboard(RestaurantAdminMixin, TemplateView):
             
             # Estadísticas de órdenes
             'orders_today_count': orders_today_count,
-            'orders_week_count': orders_week.count(),
+            'today_stats': today_stats,
+            'orders_week_count': summary['orders_week'],
             'orders_month_count': orders_month_count,
             
             # Estadísticas de ventas
@@ -185,23 +174,25 @@ class RestaurantAdminDashboard(RestaurantAdminMixin, TemplateView):
             'total_active_staff': total_active_staff,
             'staff_breakdown': {
                 'waiters': active_waiters_count,
-                'kitchen_staff': active_kitchen_staff.count(),
-                'bar_staff': active_bar_staff.count(),
-                'waiter_staff': active_waiter_staff.count(),
+                'kitchen_staff': staff_counts['kitchen']['active'],
+                'bar_staff': staff_counts['bar']['active'],
+                'waiter_staff': staff_counts['waiter_staff']['active'],
             },
             'total_tables': restaurant.tables.count(),
+            'table_counters': table_counter_totals(restaurant),
+            'station_stats': get_station_stats(restaurant, today),
             'tables_without_waiter': tables_without_waiter,
             
             # Alertas
             'alerts': {
                 'tables_without_waiter': tables_without_waiter.count(),
-                'inactive_waiters': restaurant.waiters.filter(status='inactive').count() if hasattr(restaurant, 'waiters') else 0,
-                'inactive_kitchen_staff': KitchenStaff.objects.filter(restaurant=restaurant, status='inactive').count(),
-                'inactive_bar_staff': BarStaff.objects.filter(restaurant=restaurant, status='inactive').count(),
+                'inactive_waiters': staff_counts['waiters']['inactive'],
+                'inactive_kitchen_staff': staff_counts['kitchen']['inactive'],
+                'inactive_bar_staff': staff_counts['bar']['inactive'],
                 'staff_without_shifts': (
-                    KitchenStaff.objects.filter(restaurant=restaurant, shift_start__isnull=True).count() +
-                    BarStaff.objects.filter(restaurant=restaurant, shift_start__isnull=True).count() +
-                    WaiterStaff.objects.filter(restaurant=restaurant, shift_start__isnull=True).count()
+                    staff_counts['kitchen']['without_shift'] +
+                    staff_counts['bar']['without_shift'] +
+                    staff_counts['waiter_staff']['without_shift']
                 ),
             },
             
@@ -514,8 +505,14 @@ def delete_waiter(request, tenant_slug, waiter_id):
         restaurant = request.restaurant
         waiter = get_object_or_404(Waiter, id=waiter_id, restaurant=restaurant)
         
-        # Desasignar mesas antes de eliminar
+        # Desasignar mesas antes de eliminar (update() no dispara post_save:
+        # se descartan a mano los snapshots que usan los eventos de pedidos)
+        table_ids = list(waiter.assigned_tables.values_list('id', flat=True))
         waiter.assigned_tables.update(assigned_waiter=None)
+        for table_id in table_ids:
+            TableSessionManager.invalidate_table_snapshot(table_id)
+            mark_table_dirty(table_id)
+        invalidate_waiter_table_state(restaurant.id, waiter.id)
         
         waiter_name = waiter.full_name
         
@@ -565,6 +562,7 @@ class TablesManagementView(RestaurantAdminMixin, ListView):
         
         context.update({
             'page_title': 'Gestión de Mesas',
+            'table_counters': table_counter_totals(restaurant),
             'waiters': original_waiters,  # Por compatibilidad con las mesas existentes
             'waiter_staff': new_waiters,
         })
@@ -685,27 +683,13 @@ def table_qr_preview(request, tenant_slug, table_id):
     restaurant = request.restaurant
     table = get_object_or_404(Table, id=table_id, restaurant=restaurant)
     
-    # Generar QR con URL dinámica
-    qr = qrcode.QRCode(version=1, box_size=8, border=4)
+    # La imagen se sirve desde table_qr_image (cacheada, con ETag)
     qr_url = table.get_full_qr_url(request)
-    qr.add_data(qr_url)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convertir a base64 para mostrar en template
-    import io
-    import base64
-    
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    img_base64 = base64.b64encode(buffer.getvalue()).decode()
     
     context = {
         'restaurant': restaurant,
         'table': table,
         'qr_url': qr_url,
-        'qr_image_base64': img_base64,
         'page_title': f'QR Mesa {table.number}',
         'is_admin_dashboard': True,
     }
@@ -713,25 +697,53 @@ def table_qr_preview(request, tenant_slug, table_id):
     return render(request, 'restaurants/admin/tables/qr_preview.html', context)
 
 
+@restaurant_admin_required
+def table_qr_image(request, tenant_slug, table_id):
+    """Imagen del QR de la mesa (vista previa)"""
+    restaurant = request.restaurant
+    table = get_object_or_404(Table, id=table_id, restaurant=restaurant)
+    
+    # Corrección M: los QR del panel se imprimen y deben tolerar desgaste
+    rendered = QRCodeService.render_table(
+        table, request, fmt=qr_format(request), box_size=8, border=4, error_correction='M'
+    )
+    return qr_image_response(request, rendered)
+
+
 @restaurant_admin_required
 def table_qr_download(request, tenant_slug, table_id):
     """Descargar QR de la mesa"""
     restaurant = request.restaurant
     table = get_object_or_404(Table, id=table_id, restaurant=restaurant)
     
-    # Generar QR con URL dinámica
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr_url = table.get_full_qr_url(request)
-    qr.add_data(qr_url)
-    qr.make(fit=True)
+    fmt = qr_format(request)
+    rendered = QRCodeService.render_table(table, request, fmt=fmt, box_size=10, border=5, error_correction='M')
+    return qr_image_response(request, rendered, filename=f"mesa_{table.number}_qr.{fmt}")
+
+
+@restaurant_admin_required
+def tables_qr_export(request, tenant_slug):
+    """
+    Exportar los QR de todas las mesas activas (PDF imprimible o ZIP de imágenes)
+    
+    Parámetros GET: format=pdf|zip, image=png|svg, location=<ubicación>
+    """
+    restaurant = request.restaurant
+    export_format = request.GET.get('format', 'pdf')
+    image_format = request.GET.get('image', 'png')
+    location = request.GET.get('location', '').strip() or None
     
-    img = qr.make_image(fill_color="black", back_color="white")
+    if export_format not in qr_export.EXPORT_FORMATS or image_format not in qr_export.IMAGE_FORMATS:
+        return HttpResponse('Formato no soportado', status=400)
     
-    # Crear response
-    response = HttpResponse(content_type="image/png")
-    response['Content-Disposition'] = f'attachment; filename="mesa_{table.number}_qr.png"'
-    img.save(response, "PNG")
+    tables = qr_export.get_export_tables(restaurant, location)
     
+    response = StreamingHttpResponse(
+        qr_export.stream_qr_export(tables, export_format, image_format, request=request),
+        content_type=qr_export.CONTENT_TYPES[export_format]
+    )
+    filename = qr_export.export_filename(restaurant, export_format, location)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
@@ -752,60 +764,93 @@ class SalesReportView(RestaurantAdminMixin, TemplateView):
         date_to = self.request.GET.get('date_to')
         
         if not date_from:
-            date_from = (timezone.now() - timedelta(days=30)).date()
+            date_from = local_today(restaurant) - timedelta(days=30)
         else:
             date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
         
         if not date_to:
-            date_to = timezone.now().date()
+            date_to = local_today(restaurant)
         else:
             date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
         
-        # Filtrar órdenes
-        orders = Order.objects.filter(
-            restaurant=restaurant,
-            created_at__date__gte=date_from,
-            created_at__date__lte=date_to,
-            status__in=['delivered', 'ready']
-        )
+        # Ventas por día desde el rollup diario (orders/rollups.py)
+        daily = daily_sales(restaurant, date_from, date_to)
         
         # Estadísticas generales
-        total_orders = orders.count()
-        total_revenue = orders.aggregate(total=Sum('total_amount'))['total'] or 0
+        total_orders = sum(day['total_orders'] for day in daily)
+        total_revenue = sum(day['total_revenue'] for day in daily)
         average_order = total_revenue / total_orders if total_orders > 0 else 0
         
-        # Ventas por día
-        daily_sales = orders.extra(
-            select={'date': 'DATE(created_at)'}
-        ).values('date').annotate(
-            total_orders=Count('id'),
-            total_revenue=Sum('total_amount')
-        ).order_by('date')
-        
         # Productos más vendidos
-        top_products = OrderItem.objects.filter(
-            order__in=orders
-        ).values(
-            'menu_item__name'
-        ).annotate(
-            total_quantity=Sum('quantity'),
-            total_revenue=Sum('total_price')
-        ).order_by('-total_revenue')[:10]
+        top_products = rollup_top_products(
+            restaurant,
+            date_from,
+            date_to,
+            statuses=SALES_STATUSES,
+            order_by='-total_revenue'
+        )
         
         context.update({
             'page_title': 'Reportes de Ventas',
             'date_from': date_from,
             'date_to': date_to,
+            'date_from_param': date_from.isoformat(),
+            'date_to_param': date_to.isoformat(),
             'total_orders': total_orders,
             'total_revenue': total_revenue,
             'average_order': average_order,
-            'daily_sales': daily_sales,
+            'daily_sales': daily,
             'top_products': top_products,
         })
         
         return context 
 
 
+@restaurant_admin_required
+def orders_export(request, tenant_slug):
+    """
+    Exportar pedidos, items o ventas diarias (CSV o XLSX en streaming)
+    
+    Parámetros GET: dataset=orders|items|daily, format=csv|xlsx,
+    date_from/date_to=AAAA-MM-DD (últimos 30 días por defecto),
+    status=<estado> y order_type=<tipo> (se pueden repetir)
+    """
+    restaurant = request.restaurant
+    dataset = request.GET.get('dataset', 'orders')
+    export_format = request.GET.get('format', 'csv')
+    statuses = request.GET.getlist('status')
+    order_types = request.GET.getlist('order_type')
+    
+    if dataset not in order_exports.DATASETS or export_format not in order_exports.EXPORT_FORMATS:
+        return HttpResponse('Formato no soportado', status=400)
+    
+    valid_statuses = {value for value, _ in Order.STATUS_CHOICES}
+    valid_types = {value for value, _ in Order.ORDER_TYPE_CHOICES}
+    if not set(statuses) <= valid_statuses or not set(order_types) <= valid_types:
+        return HttpResponse('Filtro no soportado', status=400)
+    
+    try:
+        today = local_today(restaurant)
+        date_to = datetime.strptime(request.GET['date_to'], '%Y-%m-%d').date() if request.GET.get('date_to') else today
+        date_from = datetime.strptime(request.GET['date_from'], '%Y-%m-%d').date() if request.GET.get('date_from') else date_to - timedelta(days=30)
+    except ValueError:
+        return HttpResponse('Fecha inválida', status=400)
+    
+    if date_from > date_to:
+        return HttpResponse('Rango de fechas inválido', status=400)
+    
+    response = StreamingHttpResponse(
+        order_exports.stream_export(
+            restaurant, dataset, export_format, date_from, date_to,
+            statuses=statuses, order_types=order_types
+        ),
+        content_type=order_exports.CONTENT_TYPES[export_format]
+    )
+    filename = order_exports.export_filename(restaurant, dataset, export_format, date_from, date_to)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 # ============================================================================
 # GESTIÓN DE PERSONAL DE COCINA
 # ============================================================================
@@ -1287,4 +1332,21 @@ def delete_waiter_staff(request, tenant_slug, staff_id):
         return JsonResponse({
             'success': False,
             'error': str(e)
-        }) 
\ No newline at end of file
+        })
+
+
+# ============================================================================
+# TIEMPO REAL
+# ============================================================================
+
+@restaurant_admin_required
+def realtime_metrics(request, tenant_slug):
+    """Contadores de eventos WebSocket de este proceso (solo superusuarios)"""
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'error': 'Sin permisos'}, status=403)
+    
+    return JsonResponse({
+        'success': True,
+        'metrics': event_metrics.stats(),
+        'pending_events': get_event_coalescer().pending(),
+    })
@@ -0,0 +1,135 @@
+"""
+Hilo de vaciado en segundo plano para los buffers del proceso
+
+Lo usan ScanLogBuffer (escaneos QR), CounterBuffer (contadores agrupados),
+EventCoalescer (eventos de pedidos) y TableStateRefresher (estado de mesas):
+cada uno acumula trabajo en memoria y un BackgroundFlusher llama a su flush()
+desde un hilo daemon.
+
+Modos:
+- interval: una pasada cada N segundos, o antes si se llama wake()
+- window: el primer wake() abre una ventana de N segundos y lo que llegue
+  mientras tanto sale en la misma pasada; sin wake() el hilo no hace nada
+
+El hilo se crea con el primer uso y se vuelve a crear si el proceso cambió
+(después de un fork el hilo del padre no existe en el hijo). Al terminar el
+proceso se hace una última pasada de todos los flushers (atexit).
+
+Política de fallos (la misma para todos los buffers):
+- una pasada nunca mata el hilo: cualquier excepción se registra y el hilo
+  sigue con la siguiente
+- el trabajo que no se pudo escribir vuelve al buffer y se reintenta en las
+  próximas pasadas; RetryPolicy lleva los intentos por unidad de trabajo y,
+  al llegar a BACKGROUND_FLUSH_MAX_ATTEMPTS, la descarta con un log de error
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+import weakref
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """
+    Intentos de las unidades de trabajo que fallaron (escaneo, contador, grupo, mesa)
+    """
+
+    def __init__(self, name, max_attempts=None):
+        self.name = name
+        self.max_attempts = max_attempts or getattr(settings, 'BACKGROUND_FLUSH_MAX_ATTEMPTS', 5)
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def failed(self, key):
+        """Registrar un fallo de la unidad; True si se debe reintentar"""
+        with self._lock:
+            attempts = self._attempts.get(key, 0) + 1
+            if attempts < self.max_attempts:
+                self._attempts[key] = attempts
+                return True
+            self._attempts.pop(key, None)
+        logger.error("%s: %s descartado tras %s intentos", self.name, key, attempts)
+        return False
+
+    def succeeded(self, key):
+        if self._attempts:
+            with self._lock:
+                self._attempts.pop(key, None)
+
+    def pending(self):
+        with self._lock:
+            return len(self._attempts)
+
+
+class BackgroundFlusher:
+    """
+    Hilo daemon que llama a flush() por intervalo o por ventana
+    """
+
+    def __init__(self, flush, name, interval=None, window=None):
+        if (interval is None) == (window is None):
+            raise ValueError("Indicar interval o window")
+        self.flush = flush
+        self.name = name
+        self.interval = interval
+        self.window = window
+
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        _flushers.add(self)
+
+    def wake(self):
+        """Pedir una pasada (inicia el hilo si hace falta)"""
+        self.ensure_started()
+        self._wakeup.set()
+
+    def ensure_started(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread.is_alive() and self._pid == pid:
+            return
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == pid:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def run_once(self):
+        """Una pasada protegida: registra el error en vez de propagarlo"""
+        from django.db import close_old_connections
+
+        try:
+            return self.flush()
+        except Exception:
+            logger.exception("Error en la pasada de %s", self.name)
+            return 0
+        finally:
+            close_old_connections()
+
+    def _run(self):
+        while True:
+            if self.window is not None:
+                self._wakeup.wait()
+                time.sleep(self.window)
+            else:
+                self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.run_once()
+
+
+# Flushers vivos del proceso (los de buffers descartados desaparecen solos)
+_flushers = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_at_exit():
+    for flusher in _flushers:
+        flusher.run_once()
@@ -9,10 +9,15 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-from django.core.paginator import Paginator
 from django.db.models import Q, Count
 
 from .models import BarStaff
+from .counters import increment_instance
+from .kds import serialize_tickets
+from . import pagination
+from .station_stats import get_station_stats
+from .time_windows import local_today, range_filter, today_filter
+from orders.routing import STATION_QUEUES
 from .staff_middleware import staff_required_by_role
 from orders.models import Order, OrderItem
 
@@ -35,7 +40,7 @@ def bar_dashboard(request, tenant_slug):
         bar_orders = get_bar_orders(restaurant)
         
         # Estadísticas del día
-        today = timezone.now().date()
+        today = local_today(restaurant)
         today_stats = get_bar_stats(restaurant, today)
         
         # Items pendientes de preparar
@@ -103,9 +108,11 @@ def bar_orders_list(request, tenant_slug):
         
         # Base query: solo items de bebida
         drink_items = OrderItem.objects.filter(
-            order__table__restaurant=restaurant,
-            menu_item__item_type__in=['drink', 'both']
-        ).select_related('order', 'menu_item', 'order__table')
+            restaurant=restaurant,
+            station__in=STATION_QUEUES['bar']
+        ).select_related(
+            'order', 'menu_item', 'order__table', 'selected_variant'
+        ).prefetch_related('selected_addons', 'selected_modifiers')
         
         # Aplicar filtros
         if status_filter != 'all':
@@ -126,23 +133,22 @@ def bar_orders_list(request, tenant_slug):
                 menu_item__category__name__icontains='cocktail'
             )
         
-        # Filtro de fecha
+        # Filtro de fecha (días locales del restaurante, rango sobre created_at del item)
         if date_filter == 'today':
-            today = timezone.now().date()
-            drink_items = drink_items.filter(order__created_at__date=today)
+            drink_items = drink_items.filter(**today_filter(restaurant))
         elif date_filter == 'week':
-            week_start = timezone.now().date() - timezone.timedelta(days=7)
-            drink_items = drink_items.filter(order__created_at__date__gte=week_start)
+            week_start = local_today(restaurant) - timezone.timedelta(days=7)
+            drink_items = drink_items.filter(**range_filter(restaurant, week_start))
         
-        # Ordenar por prioridad: pending primero, luego por hora
-        drink_items = drink_items.order_by(
-            'status',  # pending viene antes
-            'order__created_at'
-        )
+        # Paginación por cursor sobre (created_at, id): los más antiguos primero, sin COUNT ni OFFSET
+        as_json = pagination.wants_json(request)
+        try:
+            page_obj = pagination.paginate_request(request, drink_items, 25, strict=as_json, descending=False)
+        except pagination.InvalidCursor:
+            return JsonResponse({'success': False, 'error': 'Cursor inválido'}, status=400)
         
-        # Paginación
-        paginator = Paginator(drink_items, 25)
-        page_obj = paginator.get_page(request.GET.get('page'))
+        if as_json:
+            return JsonResponse(pagination.page_payload(page_obj, serialize_tickets(page_obj)))
         
         context = {
             'restaurant': restaurant,
@@ -176,10 +182,10 @@ def update_drink_status(request, tenant_slug, item_id):
         
         # Obtener item y verificar que sea de bebida
         item = get_object_or_404(
-            OrderItem, 
+            OrderItem.objects.select_related('order'),
             id=item_id,
-            order__table__restaurant=restaurant,
-            menu_item__item_type__in=['drink', 'both']
+            restaurant=restaurant,
+            station__in=STATION_QUEUES['bar']
         )
         
         new_status = request.POST.get('status')
@@ -209,9 +215,8 @@ def update_drink_status(request, tenant_slug, item_id):
             item.prepared_by = staff_member.user  # Si tienes este campo
         elif new_status == 'ready':
             item.completed_at = timezone.now()
-            # Actualizar estadísticas del barman
-            staff_member.total_drinks_prepared += 1
-            staff_member.save()
+            # Actualizar estadísticas del barman (incremento atómico, agrupado)
+            increment_instance(staff_member, 'total_drinks_prepared', coalesce=True)
         
         item.save()
         
@@ -317,8 +322,8 @@ def get_bar_orders(restaurant):
     Obtener pedidos que contienen items de bebida
     """
     return Order.objects.filter(
-        table__restaurant=restaurant,
-        order_items__menu_item__item_type__in=['drink', 'both']
+        restaurant=restaurant,
+        items__station__in=STATION_QUEUES['bar']
     ).distinct().select_related('table').order_by('-created_at')
 
 
@@ -327,8 +332,8 @@ def get_pending_drink_items(restaurant):
     Obtener items de bebida pendientes de preparar
     """
     return OrderItem.objects.filter(
-        order__table__restaurant=restaurant,
-        menu_item__item_type__in=['drink', 'both'],
+        restaurant=restaurant,
+        station__in=STATION_QUEUES['bar'],
         status='pending'
     ).select_related('order', 'menu_item', 'order__table').order_by('order__created_at')
 
@@ -338,8 +343,8 @@ def get_preparing_drink_items(restaurant, staff_member):
     Obtener bebidas en preparación
     """
     items = OrderItem.objects.filter(
-        order__table__restaurant=restaurant,
-        menu_item__item_type__in=['drink', 'both'],
+        restaurant=restaurant,
+        station__in=STATION_QUEUES['bar'],
         status='preparing'
     ).select_related('order', 'menu_item', 'order__table')
     
@@ -353,12 +358,10 @@ def get_popular_drinks_today(restaurant):
     """
     Obtener bebidas más pedidas del día
     """
-    today = timezone.now().date()
-    
     popular = OrderItem.objects.filter(
-        order__table__restaurant=restaurant,
-        menu_item__item_type__in=['drink', 'both'],
-        order__created_at__date=today
+        restaurant=restaurant,
+        station__in=STATION_QUEUES['bar'],
+        **today_filter(restaurant)
     ).values(
         'menu_item__name'
     ).annotate(
@@ -370,23 +373,15 @@ def get_popular_drinks_today(restaurant):
 
 def get_bar_stats(restaurant, date):
     """
-    Obtener estadísticas de bar para una fecha
+    Obtener estadísticas de bar para una fecha (agregación compartida con cocina)
     """
-    drink_items = OrderItem.objects.filter(
-        order__table__restaurant=restaurant,
-        menu_item__item_type__in=['drink', 'both'],
-        order__created_at__date=date
-    )
+    stats = get_station_stats(restaurant, date)['bar']
     
     return {
-        'orders_count': Order.objects.filter(
-            table__restaurant=restaurant,
-            created_at__date=date,
-            order_items__menu_item__item_type__in=['drink', 'both']
-        ).distinct().count(),
-        'drinks_prepared': drink_items.filter(status='ready').count(),
-        'drinks_pending': drink_items.filter(status='pending').count(),
-        'drinks_preparing': drink_items.filter(status='preparing').count(),
+        'orders_count': stats['orders_count'],
+        'drinks_prepared': stats['ready'],
+        'drinks_pending': stats['pending'],
+        'drinks_preparing': stats['preparing'],
     }
 
 
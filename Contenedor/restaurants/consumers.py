@@ -1,29 +1,83 @@
 import json
 import asyncio
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
-from .models import Restaurant, Waiter
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q, Sum
+from .models import Restaurant, Waiter, WaiterNotification
+from orders.events import restaurant_group, station_group, waiter_group
+from orders.event_coalescing import ConnectionEventQueue
+from .time_windows import local_today, today_filter
 
-class WaiterDashboardConsumer(AsyncWebsocketConsumer):
+logger = logging.getLogger(__name__)
+
+
+ACTIVE_ORDER_STATUSES = ['pending', 'confirmed', 'preparing', 'ready']
+
+
+def _load_restaurant(tenant_slug):
+    return Restaurant.objects.select_related('tenant').filter(tenant__slug=tenant_slug).first()
+
+
+class OrderEventQueueMixin:
+    """
+    Lotes de eventos de pedidos (order.batch) a través de una cola acotada por conexión
+
+    El handler solo encola; un task propio de la conexión escribe en el socket,
+    así un cliente lento no frena al channel layer (ver orders/event_coalescing.py).
+    """
+    
+    event_queue = None
+    
+    def open_event_queue(self):
+        """Crear la cola antes de unirse a los grupos (acumula hasta start_event_queue)"""
+        self.event_queue = ConnectionEventQueue(self.send_order_batch)
+    
+    def start_event_queue(self):
+        self.event_queue.start()
+    
+    async def stop_event_queue(self):
+        if self.event_queue is not None:
+            await self.event_queue.stop()
+    
+    async def order_batch(self, event):
+        if self.event_queue is not None:
+            self.event_queue.put(event['events'])
+    
+    async def send_order_batch(self, events, resync):
+        await self.send(text_data=json.dumps({
+            'type': 'order_batch',
+            'orders': events,
+            'resync': resync,
+        }))
+
+
+class WaiterDashboardConsumer(OrderEventQueueMixin, AsyncWebsocketConsumer):
     async def connect(self):
         # Extraer parámetros de la URL
         self.tenant_slug = self.scope['url_route']['kwargs']['tenant_slug']
         self.waiter_id = self.scope['url_route']['kwargs']['waiter_id']
         
-        # Crear nombre del grupo para este garzón
-        self.waiter_group_name = f'waiter_{self.tenant_slug}_{self.waiter_id}'
-        
-        print(f"🔌 WebSocket conectando: {self.waiter_group_name}")
+        self.waiter_group_name = None
         
-        # Verificar que el garzón existe
+        # Verificar que el garzón existe y corresponde al usuario conectado
         waiter = await self.get_waiter()
         if not waiter:
-            print(f"❌ Garzón {self.waiter_id} no encontrado en {self.tenant_slug}")
+            logger.warning("Garzón %s no encontrado en %s", self.waiter_id, self.tenant_slug)
             await self.close()
             return
         
+        self.waiter = waiter
+        
+        # Grupo del garzón en el bus de eventos de pedidos
+        self.waiter_group_name = waiter_group(waiter.restaurant_id, waiter.id)
+        
+        logger.debug("WebSocket conectando: %s", self.waiter_group_name)
+        
         # Unirse al grupo del garzón
+        self.open_event_queue()
         await self.channel_layer.group_add(
             self.waiter_group_name,
             self.channel_name
@@ -32,13 +86,19 @@ class WaiterDashboardConsumer(AsyncWebsocketConsumer):
         # Aceptar la conexión WebSocket
         await self.accept()
         
-        print(f"✅ WebSocket conectado: {self.waiter_group_name}")
+        logger.info("WebSocket conectado: %s", self.waiter_group_name)
         
-        # Enviar datos iniciales
+        # Enviar datos iniciales (los eventos que lleguen mientras tanto esperan en la cola)
         await self.send_initial_data()
+        self.start_event_queue()
 
     async def disconnect(self, close_code):
-        print(f"🔌 WebSocket desconectando: {self.waiter_group_name} (código: {close_code})")
+        if not self.waiter_group_name:
+            return
+        
+        logger.info("WebSocket desconectando: %s (código: %s)", self.waiter_group_name, close_code)
+        
+        await self.stop_event_queue()
         
         # Salir del grupo del garzón
         await self.channel_layer.group_discard(
@@ -52,7 +112,7 @@ class WaiterDashboardConsumer(AsyncWebsocketConsumer):
             text_data_json = json.loads(text_data)
             message_type = text_data_json.get('type')
             
-            print(f"📨 Mensaje recibido: {message_type}")
+            logger.debug("Mensaje recibido en %s: %s", self.waiter_group_name, message_type)
             
             if message_type == 'ping':
                 await self.send(text_data=json.dumps({
@@ -67,7 +127,7 @@ class WaiterDashboardConsumer(AsyncWebsocketConsumer):
                 await self.update_waiter_status(status)
                 
         except json.JSONDecodeError:
-            print(f"❌ Error decodificando JSON: {text_data}")
+            logger.warning("Error decodificando JSON en %s", self.waiter_group_name)
 
     # Enviar notificación nueva
     async def new_notification(self, event):
@@ -76,11 +136,11 @@ class WaiterDashboardConsumer(AsyncWebsocketConsumer):
             'notification': event['notification']
         }))
 
-    # Enviar actualización de pedido
-    async def order_update(self, event):
+    # Enviar mesas actualizadas (proyección del garzón, restaurants/table_state.py)
+    async def table_state(self, event):
         await self.send(text_data=json.dumps({
-            'type': 'order_update',
-            'order': event['order']
+            'type': 'table_state',
+            'tables': event['tables']
         }))
 
     # Enviar actualización de estadísticas
@@ -93,68 +153,242 @@ class WaiterDashboardConsumer(AsyncWebsocketConsumer):
     # Métodos de base de datos (síncronos convertidos a asíncronos)
     @database_sync_to_async
     def get_waiter(self):
-        try:
-            from django.apps import apps
-            Restaurant = apps.get_model('restaurants', 'Restaurant')
-            Waiter = apps.get_model('restaurants', 'Waiter')
-            
-            restaurant = Restaurant.objects.get(slug=self.tenant_slug)
-            waiter = Waiter.objects.get(id=self.waiter_id, restaurant=restaurant)
-            return waiter
-        except Exception as e:
-            print(f"❌ Error obteniendo garzón: {e}")
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            return None
+        
+        restaurant = _load_restaurant(self.tenant_slug)
+        if restaurant is None:
             return None
+        
+        return Waiter.objects.select_related('user').filter(
+            id=self.waiter_id,
+            restaurant=restaurant,
+            user=user
+        ).first()
 
     @database_sync_to_async
     def mark_notification_read(self, notification_id):
         try:
             # TODO: Implementar cuando tengamos modelo de notificaciones
-            print(f"✅ Notificación {notification_id} marcada como leída")
+            logger.debug("Notificación %s marcada como leída", notification_id)
             return True
-        except Exception as e:
-            print(f"❌ Error marcando notificación: {e}")
+        except Exception:
+            logger.exception("Error marcando notificación %s", notification_id)
             return False
 
     @database_sync_to_async
     def update_waiter_status(self, status):
         try:
             # TODO: Implementar actualización de estado del garzón
-            print(f"✅ Estado del garzón actualizado a: {status}")
+            logger.debug("Estado del garzón %s actualizado a: %s", self.waiter_id, status)
             return True
-        except Exception as e:
-            print(f"❌ Error actualizando estado: {e}")
+        except Exception:
+            logger.exception("Error actualizando estado del garzón %s", self.waiter_id)
             return False
 
     async def send_initial_data(self):
         """Enviar datos iniciales del dashboard"""
-        # Datos de ejemplo por ahora
-        initial_data = {
+        initial_data = await self.get_initial_data()
+        await self.send(text_data=json.dumps(initial_data, cls=DjangoJSONEncoder))
+
+    @database_sync_to_async
+    def get_initial_data(self):
+        """Estado real del garzón: mesas, pedidos del día y notificaciones pendientes"""
+        from orders.models import Order
+        from .table_state import get_waiter_table_state, render_waiter_tables
+        
+        waiter = self.waiter
+        
+        table_ids = list(waiter.assigned_tables.filter(is_active=True).values_list('id', flat=True))
+        
+        order_stats = Order.objects.filter(
+            table_id__in=table_ids,
+            **today_filter(waiter.restaurant_id)
+        ).aggregate(
+            todays_orders_count=Count('id'),
+            pending_orders_count=Count('id', filter=Q(status__in=ACTIVE_ORDER_STATUSES)),
+            total_revenue_today=Sum('total_amount', filter=Q(status__in=['ready', 'delivered'])),
+        )
+        
+        active_orders = list(
+            Order.objects.filter(
+                table_id__in=table_ids,
+                status__in=ACTIVE_ORDER_STATUSES
+            ).order_by('-created_at').values(
+                'id', 'order_number', 'status', 'table_id', 'table_number', 'created_at', 'total_amount'
+            )[:20]
+        )
+        
+        pending_notifications = WaiterNotification.objects.filter(waiter=waiter, status='pending')
+        notifications = list(
+            pending_notifications.order_by('-created_at').values(
+                'id', 'notification_type', 'title', 'message', 'created_at', 'priority'
+            )[:10]
+        )
+        
+        projection = get_waiter_table_state(waiter.restaurant_id, waiter.id)
+        tables = render_waiter_tables(projection) if projection else []
+        active_sessions_count = sum(1 for table in tables if table['has_active_session'])
+        
+        return {
             'type': 'initial_data',
             'waiter': {
-                'id': int(self.waiter_id),
-                'full_name': 'Juan Pérez',
-                'employee_id': 'GAR001',
-                'status': 'active',
-                'is_available': True
+                'id': waiter.id,
+                'full_name': waiter.full_name,
+                'employee_id': waiter.employee_id,
+                'status': waiter.status,
+                'is_available': waiter.is_available,
             },
             'stats': {
-                'pending_orders_count': 2,
-                'unread_notifications_count': 1,
-                'assigned_tables_count': 4,
-                'todays_orders_count': 8,
-                'active_sessions_count': 2,
-                'total_revenue_today': 25000
+                'pending_orders_count': order_stats['pending_orders_count'],
+                'unread_notifications_count': pending_notifications.count(),
+                'assigned_tables_count': len(table_ids),
+                'todays_orders_count': order_stats['todays_orders_count'],
+                'active_sessions_count': active_sessions_count,
+                'total_revenue_today': order_stats['total_revenue_today'] or 0,
             },
+            'active_orders': active_orders,
+            'tables': tables,
             'notifications': [
                 {
-                    'id': 1,
-                    'type': 'new_order',
-                    'title': 'Nuevo Pedido',
-                    'message': 'Mesa 3 - Pedido recibido',
-                    'timestamp': '2024-01-20T15:30:00Z',
-                    'priority': 2
+                    'id': notification['id'],
+                    'type': notification['notification_type'],
+                    'title': notification['title'],
+                    'message': notification['message'],
+                    'timestamp': notification['created_at'],
+                    'priority': notification['priority'],
                 }
-            ]
+                for notification in notifications
+            ],
+        }
+
+
+class OrderEventsConsumer(OrderEventQueueMixin, AsyncWebsocketConsumer):
+    """
+    Base para las pantallas que siguen el bus de eventos de pedidos
+
+    Las subclases definen qué usuarios pueden conectarse (is_authorized), a qué
+    grupos se unen (get_groups) y el estado inicial (get_initial_data).
+    """
+    
+    async def connect(self):
+        self.tenant_slug = self.scope['url_route']['kwargs']['tenant_slug']
+        self.groups_joined = []
+        
+        self.restaurant = await self.get_restaurant()
+        if self.restaurant is None:
+            await self.close()
+            return
+        
+        self.open_event_queue()
+        self.groups_joined = self.get_groups()
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        
+        await self.accept()
+        logger.info("WebSocket conectado: %s", ', '.join(self.groups_joined))
+        
+        initial_data = await database_sync_to_async(self.get_initial_data)()
+        await self.send(text_data=json.dumps(initial_data, cls=DjangoJSONEncoder))
+        self.start_event_queue()
+    
+    async def disconnect(self, close_code):
+        await self.stop_event_queue()
+        for group in self.groups_joined:
+            await self.channel_layer.group_discard(group, self.channel_name)
+    
+    async def receive(self, text_data):
+        try:
+            message = json.loads(text_data)
+        except json.JSONDecodeError:
+            return
+        
+        if message.get('type') == 'ping':
+            await self.send(text_data=json.dumps({
+                'type': 'pong',
+                'timestamp': message.get('timestamp')
+            }))
+    
+    @database_sync_to_async
+    def get_restaurant(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            return None
+        
+        restaurant = _load_restaurant(self.tenant_slug)
+        if restaurant is None or not self.is_authorized(user, restaurant):
+            return None
+        return restaurant
+    
+    def is_authorized(self, user, restaurant):
+        return user.is_superuser or restaurant.owner_id == user.id
+    
+    def get_groups(self):
+        raise NotImplementedError
+    
+    def get_initial_data(self):
+        raise NotImplementedError
+
+
+class StationConsumer(OrderEventsConsumer):
+    """
+    Pantalla de cocina o bar: eventos de su estación + cola inicial del KDS
+    """
+    
+    station = None
+    
+    def is_authorized(self, user, restaurant):
+        from .staff_roles import resolve_staff_role
+        
+        if super().is_authorized(user, restaurant):
+            return True
+        staff_role, staff_pk = resolve_staff_role(user.pk, restaurant.pk)
+        return staff_role == self.station
+    
+    def get_groups(self):
+        return [station_group(self.restaurant.pk, self.station)]
+    
+    def get_initial_data(self):
+        from .kds import build_queue_payload
+        
+        payload, etag = build_queue_payload(self.restaurant, self.station)
+        return {
+            'type': 'initial_data',
+            'etag': etag,
+            'queue': json.loads(payload),
         }
+
+
+class KitchenConsumer(StationConsumer):
+    station = 'kitchen'
+
+
+class BarConsumer(StationConsumer):
+    station = 'bar'
+
+
+class AdminOrdersConsumer(OrderEventsConsumer):
+    """
+    Dashboard administrativo: todos los eventos del restaurante
+    """
+    
+    def get_groups(self):
+        return [restaurant_group(self.restaurant.pk)]
+    
+    def get_initial_data(self):
+        from orders.models import Order
+        from .station_stats import get_station_stats
         
-        await self.send(text_data=json.dumps(initial_data)) 
\ No newline at end of file
+        orders_by_status = dict(
+            Order.objects.filter(
+                restaurant=self.restaurant,
+                status__in=ACTIVE_ORDER_STATUSES
+            ).values_list('status').annotate(count=Count('id'))
+        )
+        
+        return {
+            'type': 'initial_data',
+            'active_orders_by_status': orders_by_status,
+            'station_stats': get_station_stats(self.restaurant, local_today(self.restaurant)),
+        }
@@ -0,0 +1,119 @@
+"""
+Contadores atómicos de modelos (escaneos, pedidos, platos/bebidas preparados)
+
+increment() aplica UPDATE ... SET campo = campo + n con F(), sin cargar ni
+reescribir la fila, así dos requests concurrentes nunca pierden incrementos.
+
+Con coalesce=True el incremento se acumula en memoria del proceso y un hilo
+(restaurants/background.py) lo escribe cada COUNTER_FLUSH_INTERVAL segundos
+sumando todo lo pendiente por (modelo, pk, campo) en un solo UPDATE. Sirve para
+contadores de estadísticas que toleran unos segundos de retraso (p. ej. platos
+preparados por cocinero).
+
+Los paneles leen los totales con table_counter_totals() (un solo aggregate).
+"""
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F, Sum
+
+from .background import BackgroundFlusher, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+def increment(model, pk, field, amount=1, **updates):
+    """
+    Sumar 'amount' al campo en la BD de forma atómica
+
+    'updates' se aplican en el mismo UPDATE (p. ej. last_scan=timezone.now()).
+    Devuelve la cantidad de filas actualizadas.
+    """
+    return model.objects.filter(pk=pk).update(**{field: F(field) + amount}, **updates)
+
+
+def increment_instance(instance, field, amount=1, coalesce=False, **updates):
+    """
+    Incrementar el contador de una instancia
+
+    Sin coalesce, el valor en memoria se ajusta para que el objeto siga siendo
+    usable en el mismo request (puede quedar atrasado respecto de la BD).
+    Acepta instancias diferidas (SimpleLazyObject), por eso usa _meta.model.
+    """
+    model = instance._meta.model
+    if coalesce and not updates:
+        _buffer.add(model, instance.pk, field, amount)
+        return
+
+    increment(model, instance.pk, field, amount, **updates)
+    setattr(instance, field, (getattr(instance, field) or 0) + amount)
+    for name, value in updates.items():
+        setattr(instance, name, value)
+
+
+class CounterBuffer:
+    """
+    Incrementos pendientes del proceso, agrupados por (modelo, pk, campo)
+    """
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval or getattr(settings, 'COUNTER_FLUSH_INTERVAL', 5)
+        self._pending = defaultdict(int)
+        self._lock = threading.Lock()
+        self.retries = RetryPolicy('Contadores agrupados')
+        self._flusher = BackgroundFlusher(self.flush, 'counter-flusher', interval=self.flush_interval)
+
+    def add(self, model, pk, field, amount=1):
+        with self._lock:
+            self._pending[(model, pk, field)] += amount
+        self._flusher.ensure_started()
+
+    def flush(self):
+        """Escribir los incrementos acumulados (un UPDATE por fila y campo)"""
+        with self._lock:
+            pending = self._pending
+            self._pending = defaultdict(int)
+
+        for key, amount in pending.items():
+            if not amount:
+                continue
+            model, pk, field = key
+            try:
+                increment(model, pk, field, amount)
+            except Exception:
+                logger.exception("Error escribiendo contador %s.%s (pk=%s)", model.__name__, field, pk)
+                if self.retries.failed(key):
+                    with self._lock:
+                        self._pending[key] += amount
+                continue
+            self.retries.succeeded(key)
+        return len(pending)
+
+
+_buffer = CounterBuffer()
+
+
+def flush_counters():
+    return _buffer.flush()
+
+
+# ============================================================================
+# LECTURA PARA PANELES
+# ============================================================================
+
+def table_counter_totals(restaurant):
+    """
+    Totales de escaneos y pedidos QR de las mesas del restaurante (una consulta)
+    """
+    from .models import Table
+
+    totals = Table.objects.filter(restaurant=restaurant).aggregate(
+        total_scans=Sum('total_scans'),
+        total_orders=Sum('total_orders'),
+    )
+    return {
+        'total_scans': totals['total_scans'] or 0,
+        'total_orders': totals['total_orders'] or 0,
+    }
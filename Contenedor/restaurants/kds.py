@@ -0,0 +1,148 @@
+"""
+Cola del KDS (pantallas de cocina/bar) con sincronización incremental
+
+Las pantallas piden GET .../queue/?since=<cursor>:
+- sin cursor: los items activos (pendientes, en preparación y listos) del día
+- con cursor: solo los items modificados después del cursor, en cualquier
+  estado (así la pantalla puede retirar los servidos)
+
+El cursor es (updated_at, id) del último item entregado, codificado con el
+mismo formato que la paginación (restaurants/pagination.py); la consulta
+recorre el índice (updated_at, id) de OrderItem.
+
+updated_at se fija al guardar, no al hacer commit: una transacción que termina
+tarde puede dejar visible un item con updated_at anterior al cursor que ya se
+entregó. Por eso, con cursor, también se vuelven a leer los items de los
+últimos KDS_CURSOR_OVERLAP segundos antes del cursor y se deduplican por id con
+los nuevos; la pantalla reemplaza los items que ya tenía por id. La respuesta agrupa los items por
+pedido (ticket) con un payload compacto y lleva un ETag sobre su contenido, de
+modo que un poll sin cambios responde 304.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from orders.models import OrderItem
+from orders.routing import STATION_QUEUES
+
+from .pagination import decode_cursor, encode_cursor
+from .time_windows import today_range
+
+ACTIVE_STATUSES = ('pending', 'preparing', 'ready')
+
+# Máximo de items por respuesta (el resto se pide con el nuevo cursor)
+DEFAULT_LIMIT = 200
+
+
+def cursor_overlap():
+    return timedelta(seconds=getattr(settings, 'KDS_CURSOR_OVERLAP', 5))
+
+
+def _with_relations(items):
+    return items.select_related(
+        'order', 'order__table', 'menu_item', 'selected_variant'
+    ).prefetch_related(
+        'selected_addons', 'selected_modifiers'
+    ).order_by('updated_at', 'id')
+
+
+def get_station_changes(restaurant, station, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    Items de la estación modificados después del cursor
+
+    Con cursor incluye además la ventana de solape anterior al cursor (ver el
+    docstring del módulo). Devuelve (items, next_cursor, has_more). Lanza
+    pagination.InvalidCursor si el cursor no se puede leer.
+    """
+    items = OrderItem.objects.filter(
+        restaurant=restaurant,
+        station__in=STATION_QUEUES[station]
+    )
+
+    overlap = []
+    if cursor:
+        updated_at, item_id = decode_cursor(cursor, OrderItem)
+        # Los más cercanos al cursor, en orden ascendente
+        overlap = list(_with_relations(items.filter(
+            Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lte=item_id),
+            updated_at__gte=updated_at - cursor_overlap()
+        )).reverse()[:limit])[::-1]
+        items = items.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=item_id)
+        )
+    else:
+        start_of_day = today_range(restaurant)[0]
+        items = items.filter(status__in=ACTIVE_STATUSES, created_at__gte=start_of_day)
+
+    items = list(_with_relations(items)[:limit + 1])
+
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    # El cursor avanza solo con los items nuevos; el solape nunca lo retrocede
+    if items:
+        last = items[-1]
+        next_cursor = encode_cursor(last.updated_at, last.id)
+    else:
+        next_cursor = cursor or ''
+
+    if overlap:
+        # Un item pudo cambiar entre las dos lecturas: gana la versión nueva
+        new_ids = {item.id for item in items}
+        items = [item for item in overlap if item.id not in new_ids] + items
+
+    return items, next_cursor, has_more
+
+
+def serialize_tickets(items):
+    """Items agrupados por pedido, en el orden en que aparecen"""
+    tickets = {}
+    for item in items:
+        order = item.order
+        ticket = tickets.get(order.pk)
+        if ticket is None:
+            ticket = tickets[order.pk] = {
+                'order_id': str(order.pk),
+                'number': order.order_number,
+                'type': order.order_type,
+                'table': order.table.number if order.table_id else order.table_number,
+                'customer': order.customer_name,
+                'created_at': order.created_at,
+                'items': [],
+            }
+
+        ticket['items'].append({
+            'id': item.id,
+            'name': item.menu_item.name,
+            'qty': item.quantity,
+            'variant': item.selected_variant.name if item.selected_variant_id else None,
+            'addons': [addon.name for addon in item.selected_addons.all()],
+            'modifiers': [modifier.name for modifier in item.selected_modifiers.all()],
+            'notes': item.special_instructions,
+            'status': item.status,
+            'updated_at': item.updated_at,
+        })
+    return list(tickets.values())
+
+
+def build_queue_payload(restaurant, station, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    (payload JSON en bytes, ETag) de la cola de la estación
+    """
+    items, next_cursor, has_more = get_station_changes(restaurant, station, cursor, limit)
+
+    payload = json.dumps({
+        'success': True,
+        'station': station,
+        'full': not cursor,
+        'cursor': next_cursor,
+        'has_more': has_more,
+        'tickets': serialize_tickets(items),
+    }, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8')
+
+    etag = '"%s"' % hashlib.sha1(payload).hexdigest()
+    return payload, etag
@@ -6,13 +6,19 @@ Gestiona solo items de tipo 'food' en los pedidos
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-from django.core.paginator import Paginator
+from django.utils.http import parse_etags
 from django.db.models import Q, Count
 
 from .models import KitchenStaff
+from .counters import increment_instance
+from .kds import build_queue_payload, serialize_tickets
+from . import pagination
+from .station_stats import get_station_stats
+from .time_windows import local_today, range_filter, today_filter
+from orders.routing import STATION_QUEUES
 from .staff_middleware import staff_required_by_role
 from orders.models import Order, OrderItem
 
@@ -35,7 +41,7 @@ def kitchen_dashboard(request, tenant_slug):
         kitchen_orders = get_kitchen_orders(restaurant)
         
         # Estadísticas del día
-        today = timezone.now().date()
+        today = local_today(restaurant)
         today_stats = get_kitchen_stats(restaurant, today)
         
         # Items pendientes de preparar
@@ -96,9 +102,11 @@ def kitchen_orders_list(request, tenant_slug):
         
         # Base query: solo items de comida
         food_items = OrderItem.objects.filter(
-            order__table__restaurant=restaurant,
-            menu_item__item_type__in=['food', 'both']
-        ).select_related('order', 'menu_item', 'order__table')
+            restaurant=restaurant,
+            station__in=STATION_QUEUES['kitchen']
+        ).select_related(
+            'order', 'menu_item', 'order__table', 'selected_variant'
+        ).prefetch_related('selected_addons', 'selected_modifiers')
         
         # Aplicar filtros
         if status_filter != 'all':
@@ -107,23 +115,22 @@ def kitchen_orders_list(request, tenant_slug):
         if order_type != 'all':
             food_items = food_items.filter(order__order_type=order_type)
         
-        # Filtro de fecha
+        # Filtro de fecha (días locales del restaurante, rango sobre created_at del item)
         if date_filter == 'today':
-            today = timezone.now().date()
-            food_items = food_items.filter(order__created_at__date=today)
+            food_items = food_items.filter(**today_filter(restaurant))
         elif date_filter == 'week':
-            week_start = timezone.now().date() - timezone.timedelta(days=7)
-            food_items = food_items.filter(order__created_at__date__gte=week_start)
+            week_start = local_today(restaurant) - timezone.timedelta(days=7)
+            food_items = food_items.filter(**range_filter(restaurant, week_start))
         
-        # Ordenar por prioridad: pending primero, luego por hora
-        food_items = food_items.order_by(
-            'status',  # pending viene antes
-            'order__created_at'
-        )
+        # Paginación por cursor sobre (created_at, id): los más antiguos primero, sin COUNT ni OFFSET
+        as_json = pagination.wants_json(request)
+        try:
+            page_obj = pagination.paginate_request(request, food_items, 20, strict=as_json, descending=False)
+        except pagination.InvalidCursor:
+            return JsonResponse({'success': False, 'error': 'Cursor inválido'}, status=400)
         
-        # Paginación
-        paginator = Paginator(food_items, 20)
-        page_obj = paginator.get_page(request.GET.get('page'))
+        if as_json:
+            return JsonResponse(pagination.page_payload(page_obj, serialize_tickets(page_obj)))
         
         context = {
             'restaurant': restaurant,
@@ -156,10 +163,10 @@ def update_item_status(request, tenant_slug, item_id):
         
         # Obtener item y verificar que sea de comida
         item = get_object_or_404(
-            OrderItem, 
+            OrderItem.objects.select_related('order'),
             id=item_id,
-            order__table__restaurant=restaurant,
-            menu_item__item_type__in=['food', 'both']
+            restaurant=restaurant,
+            station__in=STATION_QUEUES['kitchen']
         )
         
         new_status = request.POST.get('status')
@@ -180,9 +187,8 @@ def update_item_status(request, tenant_slug, item_id):
             item.prepared_by = staff_member.user  # Si tienes este campo
         elif new_status == 'ready':
             item.completed_at = timezone.now()
-            # Actualizar estadísticas del cocinero
-            staff_member.total_dishes_prepared += 1
-            staff_member.save()
+            # Actualizar estadísticas del cocinero (incremento atómico, agrupado)
+            increment_instance(staff_member, 'total_dishes_prepared', coalesce=True)
         
         item.save()
         
@@ -225,8 +231,8 @@ def update_prep_time(request, tenant_slug, item_id):
         item = get_object_or_404(
             OrderItem, 
             id=item_id,
-            order__table__restaurant=restaurant,
-            menu_item__item_type__in=['food', 'both']
+            restaurant=restaurant,
+            station__in=STATION_QUEUES['kitchen']
         )
         
         new_prep_time = request.POST.get('prep_time')
@@ -297,6 +303,34 @@ def update_kitchen_status(request, tenant_slug):
         })
 
 
+@login_required
+@staff_required_by_role('kitchen')
+def kitchen_queue_api(request, tenant_slug):
+    """
+    Cola de cocina para pantallas KDS (solo cambios desde ?since=<cursor>, con ETag)
+    """
+    try:
+        payload, etag = build_queue_payload(
+            request.restaurant,
+            'kitchen',
+            cursor=request.GET.get('since') or None
+        )
+    except pagination.InvalidCursor:
+        return JsonResponse({
+            'success': False,
+            'error': 'Cursor inválido'
+        }, status=400)
+    
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(payload, content_type='application/json')
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 # ============================================================================
 # FUNCIONES AUXILIARES
 # ============================================================================
@@ -306,8 +340,8 @@ def get_kitchen_orders(restaurant):
     Obtener pedidos que contienen items de comida
     """
     return Order.objects.filter(
-        table__restaurant=restaurant,
-        order_items__menu_item__item_type__in=['food', 'both']
+        restaurant=restaurant,
+        items__station__in=STATION_QUEUES['kitchen']
     ).distinct().select_related('table').order_by('-created_at')
 
 
@@ -316,8 +350,8 @@ def get_pending_food_items(restaurant):
     Obtener items de comida pendientes de preparar
     """
     return OrderItem.objects.filter(
-        order__table__restaurant=restaurant,
-        menu_item__item_type__in=['food', 'both'],
+        restaurant=restaurant,
+        station__in=STATION_QUEUES['kitchen'],
         status='pending'
     ).select_related('order', 'menu_item', 'order__table').order_by('order__created_at')
 
@@ -327,8 +361,8 @@ def get_preparing_food_items(restaurant, staff_member):
     Obtener items en preparación (opcionalmente filtrados por cocinero)
     """
     items = OrderItem.objects.filter(
-        order__table__restaurant=restaurant,
-        menu_item__item_type__in=['food', 'both'],
+        restaurant=restaurant,
+        station__in=STATION_QUEUES['kitchen'],
         status='preparing'
     ).select_related('order', 'menu_item', 'order__table')
     
@@ -340,21 +374,13 @@ def get_preparing_food_items(restaurant, staff_member):
 
 def get_kitchen_stats(restaurant, date):
     """
-    Obtener estadísticas de cocina para una fecha
+    Obtener estadísticas de cocina para una fecha (agregación compartida con bar)
     """
-    food_items = OrderItem.objects.filter(
-        order__table__restaurant=restaurant,
-        menu_item__item_type__in=['food', 'both'],
-        order__created_at__date=date
-    )
+    stats = get_station_stats(restaurant, date)['kitchen']
     
     return {
-        'orders_count': Order.objects.filter(
-            table__restaurant=restaurant,
-            created_at__date=date,
-            order_items__menu_item__item_type__in=['food', 'both']
-        ).distinct().count(),
-        'items_prepared': food_items.filter(status='ready').count(),
-        'items_pending': food_items.filter(status='pending').count(),
-        'items_preparing': food_items.filter(status='preparing').count(),
+        'orders_count': stats['orders_count'],
+        'items_prepared': stats['ready'],
+        'items_pending': stats['pending'],
+        'items_preparing': stats['preparing'],
     } 
\ No newline at end of file
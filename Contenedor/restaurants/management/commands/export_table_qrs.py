@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from restaurants.models import Restaurant
+from restaurants import qr_export
+
+
+class Command(BaseCommand):
+    help = 'Exportar los códigos QR de las mesas de un restaurante (PDF imprimible o ZIP)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('tenant_slug', help='Slug del tenant')
+        parser.add_argument(
+            '--format',
+            choices=qr_export.EXPORT_FORMATS,
+            default='pdf',
+            help='pdf (una mesa por página) o zip (una imagen por mesa)'
+        )
+        parser.add_argument(
+            '--image-format',
+            choices=qr_export.IMAGE_FORMATS,
+            default='png',
+            help='Formato de las imágenes dentro del ZIP (default: png)'
+        )
+        parser.add_argument('--location', help='Exportar solo las mesas de esta ubicación')
+        parser.add_argument('--output', help='Archivo de salida (default: qr_<tenant>.<formato>)')
+        parser.add_argument('--workers', type=int, help='Procesos para renderizar (default: QR_EXPORT_WORKERS)')
+    
+    def handle(self, *args, **options):
+        try:
+            restaurant = Restaurant.objects.select_related('tenant').get(tenant__slug=options['tenant_slug'])
+        except Restaurant.DoesNotExist:
+            raise CommandError(f"No existe restaurante para el tenant '{options['tenant_slug']}'")
+        
+        tables = qr_export.get_export_tables(restaurant, options['location'])
+        total = tables.count()
+        if not total:
+            raise CommandError('No hay mesas activas para exportar')
+        
+        output = options['output'] or qr_export.export_filename(restaurant, options['format'], options['location'])
+        self.stdout.write(f'🖨️  Exportando {total} mesas de {restaurant.name} a {output}...')
+        
+        with open(output, 'wb') as fh:
+            for chunk in qr_export.stream_qr_export(
+                tables,
+                export_format=options['format'],
+                image_format=options['image_format'],
+                workers=options['workers'] or qr_export.export_workers(),
+            ):
+                fh.write(chunk)
+        
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} códigos QR exportados en {output}'))
@@ -1,8 +1,15 @@
+import logging
+
 from django.http import Http404
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 from .models import Tenant, Restaurant
+from .tenant_cache import resolve_tenant
+from .time_windows import get_timezone
+
+logger = logging.getLogger(__name__)
 
 
 class TenantMiddleware(MiddlewareMixin):
@@ -29,57 +36,55 @@ class TenantMiddleware(MiddlewareMixin):
         
         # Verificar si la URL está excluida
         if any(request.path.startswith(path) for path in excluded_paths):
-            print(f"⭕ Path excluido: {request.path}")
+            logger.debug("Path excluido: %s", request.path)
             return None
         
         # Extraer el tenant_slug del path
         path_parts = request.path.strip('/').split('/')
-        print(f"🔍 Path parts: {path_parts}")
         
         # Si es la raíz del dominio (tuapp.com/)
         if not path_parts or path_parts[0] == '':
-            print(f"⭕ Raíz del dominio, sin tenant")
+            logger.debug("Raíz del dominio, sin tenant")
             return None
         
         tenant_slug = path_parts[0]
-        print(f"🎯 Tenant slug detectado: '{tenant_slug}'")
         
         try:
-            # Buscar el tenant por slug
-            tenant = Tenant.objects.select_related('restaurant').get(
-                slug=tenant_slug,
-                status__in=['ACTIVE', 'TRIAL']
-            )
+            # Buscar el tenant por slug (caché LRU local + caché compartido)
+            tenant, restaurant = resolve_tenant(tenant_slug)
             
             # Inyectar tenant en el request
             request.tenant = tenant
-            print(f"✅ Tenant encontrado: {tenant.name}")
             
-            # Verificar si el tenant tiene restaurant asociado
-            try:
-                request.restaurant = tenant.restaurant
-                print(f"✅ Restaurant encontrado: {request.restaurant.name}")
-            except Restaurant.DoesNotExist:
-                # Tenant existe pero no tiene restaurant asociado
-                print(f"❌ Tenant sin restaurant: {tenant_slug}")
-                raise Http404(f"Restaurante '{tenant_slug}' no está completamente configurado")
+            # Inyectar restaurant asociado
+            request.restaurant = restaurant
+            
+            # Fechas y horas del request en la zona horaria del restaurante
+            timezone.activate(get_timezone(restaurant))
             
             # Verificar si es una URL de API - NO reescribir
             remaining_path_parts = path_parts[1:]
             if remaining_path_parts and any(remaining_path_parts[0].startswith(api.strip('/')) for api in api_paths):
-                print(f"🔗 API URL detectada, NO reescribiendo: {request.path}")
+                logger.debug("API URL detectada, NO reescribiendo: %s", request.path)
                 return None
             
             # NO reescribir URLs - dejar que Django maneje el routing naturalmente
             # Solo inyectar tenant en el request para que las vistas lo puedan usar
-            print(f"✅ Tenant configurado exitosamente - NO reescribiendo URLs")
-            print(f"🎯 Path original mantenido: {request.path_info}")
+            logger.debug("Tenant '%s' configurado para %s", tenant_slug, request.path_info)
             
+        except Restaurant.DoesNotExist:
+            # Tenant existe pero no tiene restaurant asociado
+            logger.warning("Tenant sin restaurant: %s", tenant_slug)
+            raise Http404(f"Restaurante '{tenant_slug}' no está completamente configurado")
         except Tenant.DoesNotExist:
             # Tenant no existe o está inactivo
             raise Http404(f"Restaurante '{tenant_slug}' no encontrado o no disponible")
         
         return None
+    
+    def process_response(self, request, response):
+        timezone.deactivate()
+        return response
 
 
 class TenantContextMiddleware(MiddlewareMixin):
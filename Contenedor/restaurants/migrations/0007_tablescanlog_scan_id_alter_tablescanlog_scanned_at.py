@@ -0,0 +1,24 @@
+# Generated by Django 5.2.2 on 2026-10-18 10:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0006_barstaff_certifications_barstaff_years_experience_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tablescanlog',
+            name='scan_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='ID de escaneo'),
+        ),
+        migrations.AlterField(
+            model_name='tablescanlog',
+            name='scanned_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
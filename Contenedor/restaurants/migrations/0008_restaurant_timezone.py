@@ -0,0 +1,19 @@
+# Generated by Django 5.2.2 on 2026-10-18 16:00
+
+import restaurants.time_windows
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0007_tablescanlog_scan_id_alter_tablescanlog_scanned_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='timezone',
+            field=models.CharField(default='America/Santiago', help_text='Nombre IANA, ej. America/Santiago', max_length=64, validators=[restaurants.time_windows.validate_timezone], verbose_name='Zona horaria'),
+        ),
+    ]
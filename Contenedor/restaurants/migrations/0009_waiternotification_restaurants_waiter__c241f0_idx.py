@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0008_restaurant_timezone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='waiternotification',
+            index=models.Index(fields=['waiter', 'created_at', 'id'], name='restaurants_waiter__c241f0_idx'),
+        ),
+    ]
@@ -3,6 +3,8 @@ import uuid
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.text import slugify
+from django.utils import timezone
+from .time_windows import DEFAULT_TIMEZONE, validate_timezone
 
 class Tenant(models.Model):
     """Modelo core del sistema multi-tenant"""
@@ -78,6 +80,15 @@ class Restaurant(models.Model):
     opening_time = models.TimeField(null=True, blank=True)
     closing_time = models.TimeField(null=True, blank=True)
     
+    # Zona horaria del local: define "hoy" en reportes y filtros (ver time_windows.py)
+    timezone = models.CharField(
+        max_length=64,
+        default=DEFAULT_TIMEZONE,
+        validators=[validate_timezone],
+        verbose_name="Zona horaria",
+        help_text="Nombre IANA, ej. America/Santiago"
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -393,17 +404,10 @@ class Table(models.Model):
         default_base = getattr(settings, 'DEBUG', False) and "http://localhost:8000" or "https://midominio.com"
         return f"{default_base}{self.qr_url}"
     
-    def increment_scan_count(self):
-        """Incrementar contador de escaneos"""
-        from django.utils import timezone
-        self.total_scans += 1
-        self.last_scan = timezone.now()
-        self.save(update_fields=['total_scans', 'last_scan'])
-    
     def increment_order_count(self):
-        """Incrementar contador de pedidos"""
-        self.total_orders += 1
-        self.save(update_fields=['total_orders'])
+        """Incrementar contador de pedidos (UPDATE atómico con F())"""
+        from .counters import increment_instance
+        increment_instance(self, 'total_orders')
 
 class WaiterNotification(models.Model):
     """
@@ -455,6 +459,7 @@ class WaiterNotification(models.Model):
             models.Index(fields=['waiter', 'status']),
             models.Index(fields=['created_at']),
             models.Index(fields=['notification_type']),
+            models.Index(fields=['waiter', 'created_at', 'id']),  # Paginación por cursor
         ]
     
     def __str__(self):
@@ -480,7 +485,8 @@ class TableScanLog(models.Model):
     Registro de escaneos de códigos QR de mesas
     """
     table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='scan_logs')
-    scanned_at = models.DateTimeField(auto_now_add=True)
+    scan_id = models.UUIDField(null=True, blank=True, unique=True, editable=False, verbose_name="ID de escaneo")
+    scanned_at = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
     
@@ -0,0 +1,146 @@
+"""
+Paginación por cursor (keyset) sobre (created_at, id)
+
+En vez de OFFSET + COUNT(*), cada página pide las filas que siguen a la última
+entregada: WHERE (created_at, id) < cursor ORDER BY created_at DESC, id DESC
+LIMIT n+1 (o al revés en orden ascendente).
+Con un índice que termine en (created_at, id) la página 500 cuesta lo mismo
+que la primera. No hay total de páginas: la página sabe si hay una siguiente
+(pidiendo una fila de más) y entrega el cursor para pedirla.
+
+El cursor es opaco para el cliente (base64 de "microsegundos:id"); no se firma
+porque solo se usa sobre un queryset ya filtrado por restaurante y permisos.
+
+Lo usan el listado de pedidos del restaurante, las listas de cocina y bar y
+las notificaciones del garzón (HTML y ?format=json).
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+CURSOR_PARAM = 'cursor'
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    # Aritmética entera: un float perdería el último microsegundo
+    micros = (created_at - EPOCH) // MICROSECOND
+    raw = f"{micros}:{pk}".encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, model):
+    """
+    (fecha, pk) desde el texto del cursor; pk convertido al tipo del modelo
+
+    También lo usa la cola del KDS (kds.py) con (updated_at, id).
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        micros, pk = base64.urlsafe_b64decode(padded).decode('ascii').split(':', 1)
+        created_at = EPOCH + int(micros) * MICROSECOND
+        return created_at, model._meta.pk.to_python(pk)
+    except (ValueError, OverflowError, binascii.Error, UnicodeDecodeError, ValidationError):
+        raise InvalidCursor(cursor)
+
+
+class CursorPage:
+    """
+    Página de resultados con el cursor de la siguiente
+
+    Se itera como una lista; has_other_pages/has_previous permiten a las
+    plantillas mostrar "Primera" cuando no es la primera página.
+    """
+
+    def __init__(self, object_list, next_cursor, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def paginate(queryset, cursor=None, per_page=20, descending=True, field='created_at'):
+    """
+    Página de queryset ordenado por (field, pk) después del cursor
+
+    descending=True entrega primero lo más reciente. Lanza InvalidCursor si el
+    cursor no se puede leer.
+    """
+    direction = '-' if descending else ''
+    queryset = queryset.order_by(f'{direction}{field}', f'{direction}pk')
+
+    if cursor:
+        created_at, pk = decode_cursor(cursor, queryset.model)
+        lookup = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{field}__{lookup}': created_at}) |
+            Q(**{field: created_at, f'pk__{lookup}': pk})
+        )
+
+    rows = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+
+    return CursorPage(rows, next_cursor, cursor or None)
+
+
+def wants_json(request):
+    return request.GET.get('format') == 'json'
+
+
+def paginate_request(request, queryset, per_page=20, strict=False, **kwargs):
+    """
+    paginate() con el cursor de request.GET
+
+    Un cursor inválido vuelve a la primera página, como Paginator.get_page();
+    con strict=True (respuestas JSON) se propaga InvalidCursor.
+    """
+    cursor = request.GET.get(CURSOR_PARAM) or None
+    try:
+        return paginate(queryset, cursor, per_page, **kwargs)
+    except InvalidCursor:
+        if strict:
+            raise
+        return paginate(queryset, None, per_page, **kwargs)
+
+
+def page_payload(page, results):
+    """Cuerpo JSON de una página: resultados ya serializados y cursor siguiente"""
+    return {
+        'success': True,
+        'results': results,
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    }
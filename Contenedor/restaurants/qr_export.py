@@ -0,0 +1,217 @@
+"""
+Exportación masiva de códigos QR de mesas
+
+Genera, para todas las mesas activas de un restaurante (o de una ubicación):
+- un PDF imprimible con una mesa por página (el QR se dibuja como vectores), o
+- un ZIP con un PNG/SVG por mesa (reutiliza el caché de QRCodeService).
+
+Las mesas se procesan de a EXPORT_CHUNK_SIZE (lectura del caché y renderizado
+por tramo) y el archivo se produce en streaming, así la memoria no crece con la
+cantidad de mesas. En la descarga web (admin_views.tables_qr_export) se
+renderiza en el mismo proceso; el comando export_table_qrs usa un pool de
+QR_EXPORT_WORKERS procesos.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.text import slugify
+
+from .models import Table
+from .qr_service import QRCodeService, render_qr_bytes, render_qr_matrix
+from .streaming import StreamingPDFWriter, stream_zip
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_FORMATS = ('pdf', 'zip')
+IMAGE_FORMATS = ('png', 'svg')
+
+# Parámetros de los QR exportados (mismos que la descarga individual)
+EXPORT_BOX_SIZE = 10
+EXPORT_BORDER = 4
+EXPORT_ERROR_CORRECTION = 'M'
+
+# Mesas por tramo: una lectura del caché y un lote de renderizado
+EXPORT_CHUNK_SIZE = 50
+
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'zip': 'application/zip',
+}
+
+
+def get_export_tables(restaurant, location=None):
+    """Mesas activas a exportar (opcionalmente solo una ubicación)"""
+    tables = Table.objects.filter(
+        restaurant=restaurant,
+        is_active=True
+    ).select_related('restaurant__tenant').order_by('number')
+    if location:
+        tables = tables.filter(location__iexact=location)
+    return tables
+
+
+def export_filename(restaurant, export_format, location=None):
+    parts = ['qr', restaurant.tenant.slug]
+    if location:
+        parts.append(slugify(location))
+    return f"{'_'.join(parts)}.{export_format}"
+
+
+def export_workers():
+    return getattr(settings, 'QR_EXPORT_WORKERS', min(4, os.cpu_count() or 1))
+
+
+# ============================================================================
+# POOL DE PROCESOS
+# ============================================================================
+
+def _render_image_job(job):
+    url, image_format = job
+    return render_qr_bytes(url, image_format, EXPORT_BOX_SIZE, EXPORT_BORDER, EXPORT_ERROR_CORRECTION)
+
+
+def _render_matrix_job(url):
+    return render_qr_matrix(url, EXPORT_BORDER, EXPORT_ERROR_CORRECTION)
+
+
+@contextmanager
+def render_pool(workers=1):
+    """
+    map() para renderizar: en el proceso actual, o en un pool si workers > 1
+
+    El pool vive lo que dura la exportación; solo lo usa el comando
+    export_table_qrs (una descarga web no debe crear procesos).
+    """
+    if workers <= 1:
+        yield map
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield executor.map
+
+
+def _chunks(items, size=EXPORT_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# ============================================================================
+# ZIP DE IMÁGENES
+# ============================================================================
+
+def stream_qr_zip(tables, image_format='png', request=None, workers=1):
+    """
+    ZIP con un QR por mesa, agrupado en carpetas por ubicación
+    """
+    def files():
+        with render_pool(workers) as render_map:
+            for chunk in _chunks(tables):
+                entries = [(table, table.get_full_qr_url(request)) for table in chunk]
+                keys = [
+                    QRCodeService.cache_key(
+                        url, table.qr_code_uuid, image_format,
+                        EXPORT_BOX_SIZE, EXPORT_BORDER, EXPORT_ERROR_CORRECTION
+                    )
+                    for table, url in entries
+                ]
+
+                # Lo ya renderizado sale del caché; solo las faltantes se renderizan
+                cached = cache.get_many(keys)
+                missing = [
+                    (url, image_format)
+                    for (table, url), key in zip(entries, keys)
+                    if key not in cached
+                ]
+                rendered = render_map(_render_image_job, missing)
+
+                for (table, url), key in zip(entries, keys):
+                    if key in cached:
+                        content = cached.pop(key)['content']
+                    else:
+                        content = next(rendered)
+                        cache.set(key, QRCodeService.cache_entry(content), timeout=QRCodeService.cache_ttl())
+
+                    folder = slugify(table.location) or 'sin-ubicacion'
+                    yield f"{folder}/mesa_{table.number}.{image_format}", content, image_format == 'svg'
+
+    return stream_zip(files())
+
+
+# ============================================================================
+# PDF IMPRIMIBLE
+# ============================================================================
+
+QR_PAGE_SIZE = 360  # lado del QR en puntos (5 pulgadas)
+
+
+def _qr_page_content(table, matrix, url):
+    """Content stream de una página: títulos + módulos del QR como rectángulos"""
+    text = StreamingPDFWriter.text
+    page_width = StreamingPDFWriter.PAGE_WIDTH
+    left = (page_width - QR_PAGE_SIZE) / 2
+    top = 620
+    module = QR_PAGE_SIZE / len(matrix)
+
+    commands = [
+        b'BT /F1 30 Tf %.2f 700 Td (%s) Tj ET' % (left, text(table.display_name)),
+        b'BT /F1 14 Tf %.2f 675 Td (%s) Tj ET' % (left, text(table.restaurant.name)),
+        b'0 0 0 rg',
+    ]
+
+    # Un rectángulo por tramo horizontal de módulos oscuros
+    for row_index, row in enumerate(matrix):
+        y = top - (row_index + 1) * module
+        column = 0
+        while column < len(row):
+            if row[column] == '1':
+                start = column
+                while column < len(row) and row[column] == '1':
+                    column += 1
+                commands.append(
+                    b'%.3f %.3f %.3f %.3f re' % (left + start * module, y, (column - start) * module, module)
+                )
+            else:
+                column += 1
+    commands.append(b'f')
+
+    footer = table.location or ''
+    commands.append(b'BT /F1 14 Tf %.2f %.2f Td (%s) Tj ET' % (left, top - QR_PAGE_SIZE - 30, text(footer)))
+    commands.append(b'BT /F1 8 Tf %.2f %.2f Td (%s) Tj ET' % (left, top - QR_PAGE_SIZE - 50, text(url)))
+    return b'\n'.join(commands)
+
+
+def stream_qr_pdf(tables, request=None, workers=1):
+    """
+    PDF con una mesa por página
+    """
+    writer = StreamingPDFWriter()
+    yield writer.begin()
+    with render_pool(workers) as render_map:
+        for chunk in _chunks(tables):
+            entries = [(table, table.get_full_qr_url(request)) for table in chunk]
+            matrices = render_map(_render_matrix_job, [url for table, url in entries])
+            for (table, url), matrix in zip(entries, matrices):
+                yield writer.page(_qr_page_content(table, matrix, url))
+    yield writer.end()
+
+
+def stream_qr_export(tables, export_format='pdf', image_format='png', request=None, workers=1):
+    """
+    Generador de bytes del archivo exportado
+
+    workers > 1 renderiza en un pool de procesos (solo desde el comando).
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportación no soportado: {export_format}")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Formato de imagen no soportado: {image_format}")
+
+    tables = list(tables)
+    logger.info("Exportando %s QR (%s, %s procesos)", len(tables), export_format, workers)
+    if export_format == 'zip':
+        return stream_qr_zip(tables, image_format, request, workers)
+    return stream_qr_pdf(tables, request, workers)
@@ -0,0 +1,175 @@
+"""
+Servicio de renderizado de códigos QR de mesas
+
+Los bytes PNG/SVG se cachean por (qr_code_uuid, URL resuelta, formato, tamaño,
+borde, corrección de errores). Mientras la mesa conserve su UUID y el tenant su
+dominio, la URL no cambia y el QR nunca se vuelve a generar; si cambia alguno,
+cambia la clave y se renderiza de nuevo.
+
+qr_image_response() sirve la imagen con ETag y Last-Modified y responde 304 a
+los GET condicionales, así los navegadores no vuelven a descargarla.
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+logger = logging.getLogger(__name__)
+
+
+QR_CACHE_KEY = "qr_render_{digest}"
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+class RenderedQR:
+    """Imagen renderizada con sus metadatos para GET condicional"""
+
+    def __init__(self, content, content_type, etag, last_modified):
+        self.content = content
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified  # timestamp (segundos)
+
+
+class QRCodeService:
+    """
+    Renderiza y cachea los QR de las mesas
+    """
+
+    ERROR_CORRECTION_LEVELS = ('L', 'M', 'Q', 'H')
+
+    @classmethod
+    def render_table(cls, table, request=None, fmt='png', box_size=10, border=4, error_correction='L'):
+        """QR de una mesa (la URL se resuelve con el request si está disponible)"""
+        qr_url = table.get_full_qr_url(request)
+        return cls.render(
+            qr_url,
+            cache_scope=table.qr_code_uuid,
+            fmt=fmt,
+            box_size=box_size,
+            border=border,
+            error_correction=error_correction,
+        )
+
+    @classmethod
+    def render(cls, data, cache_scope='', fmt='png', box_size=10, border=4, error_correction='L'):
+        """
+        Bytes del QR para 'data' (desde el caché si ya se generó)
+        """
+        if fmt not in CONTENT_TYPES:
+            raise ValueError(f"Formato de QR no soportado: {fmt}")
+        if error_correction not in cls.ERROR_CORRECTION_LEVELS:
+            raise ValueError(f"Nivel de corrección no soportado: {error_correction}")
+
+        key = cls.cache_key(data, cache_scope, fmt, box_size, border, error_correction)
+
+        cached = cache.get(key)
+        if cached is None:
+            content = cls._render_bytes(data, fmt, box_size, border, error_correction)
+            cached = cls.cache_entry(content)
+            cache.set(key, cached, timeout=cls.cache_ttl())
+            logger.debug("QR renderizado (%s, %s bytes) para %s", fmt, len(content), data)
+
+        return RenderedQR(cached['content'], CONTENT_TYPES[fmt], cached['etag'], cached['last_modified'])
+
+    @staticmethod
+    def cache_key(data, cache_scope, fmt, box_size, border, error_correction):
+        digest = hashlib.sha1(
+            f"{cache_scope}|{data}|{fmt}|{box_size}|{border}|{error_correction}".encode('utf-8')
+        ).hexdigest()
+        return QR_CACHE_KEY.format(digest=digest)
+
+    @staticmethod
+    def cache_entry(content):
+        return {
+            'content': content,
+            'etag': '"%s"' % hashlib.sha1(content).hexdigest(),
+            'last_modified': int(timezone.now().timestamp()),
+        }
+
+    @staticmethod
+    def cache_ttl():
+        return getattr(settings, 'QR_CACHE_TTL', 60 * 60 * 24 * 30)
+
+    @staticmethod
+    def _render_bytes(data, fmt, box_size, border, error_correction):
+        return render_qr_bytes(data, fmt, box_size, border, error_correction)
+
+
+# ============================================================================
+# RENDERIZADO (funciones de módulo: se pueden ejecutar en un pool de procesos)
+# ============================================================================
+
+def _build_qr(data, border, error_correction, box_size=10):
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=getattr(qrcode.constants, f'ERROR_CORRECT_{error_correction}'),
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def render_qr_bytes(data, fmt='png', box_size=10, border=4, error_correction='L'):
+    """Bytes PNG o SVG del QR"""
+    import qrcode.image.svg
+
+    qr = _build_qr(data, border, error_correction, box_size)
+
+    buffer = BytesIO()
+    if fmt == 'svg':
+        img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        img.save(buffer)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_qr_matrix(data, border=4, error_correction='L'):
+    """Matriz de módulos del QR (filas de '1'/'0'), para dibujarlo como vectores"""
+    qr = _build_qr(data, border, error_correction)
+    return [''.join('1' if module else '0' for module in row) for row in qr.get_matrix()]
+
+
+def qr_format(request):
+    """Formato pedido por ?format= (png por defecto)"""
+    return 'svg' if request.GET.get('format') == 'svg' else 'png'
+
+
+def qr_image_response(request, rendered, filename=None):
+    """
+    Respuesta HTTP para un QR con soporte de If-None-Match / If-Modified-Since
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+
+    if if_none_match:
+        not_modified = rendered.etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+    else:
+        not_modified = if_modified_since is not None and rendered.last_modified <= if_modified_since
+
+    if not_modified:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(rendered.content, content_type=rendered.content_type)
+        if filename:
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    response['ETag'] = rendered.etag
+    response['Last-Modified'] = http_date(rendered.last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -2,5 +2,8 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
-    re_path(r'ws/waiter/(?P<tenant_slug>\w+)/(?P<waiter_id>\d+)/$', consumers.WaiterDashboardConsumer.as_asgi()),
+    re_path(r'ws/waiter/(?P<tenant_slug>[-\w]+)/(?P<waiter_id>\d+)/$', consumers.WaiterDashboardConsumer.as_asgi()),
+    re_path(r'ws/kitchen/(?P<tenant_slug>[-\w]+)/$', consumers.KitchenConsumer.as_asgi()),
+    re_path(r'ws/bar/(?P<tenant_slug>[-\w]+)/$', consumers.BarConsumer.as_asgi()),
+    re_path(r'ws/admin/orders/(?P<tenant_slug>[-\w]+)/$', consumers.AdminOrdersConsumer.as_asgi()),
 ] 
\ No newline at end of file
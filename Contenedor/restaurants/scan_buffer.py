@@ -0,0 +1,286 @@
+"""
+Buffer de escaneos QR
+
+Escanear el QR de una mesa no escribe en la BD: el evento se encola en un buffer
+en memoria del proceso y un hilo en segundo plano lo vacía cada
+SCAN_BUFFER_FLUSH_INTERVAL segundos (o antes, al llegar a SCAN_BUFFER_MAX_EVENTS):
+
+- los TableScanLog se insertan con un solo bulk_create por lote
+- Table.total_scans se incrementa con F('total_scans') + n (un UPDATE por mesa),
+  así varios procesos pueden vaciar sus buffers a la vez sin perder escaneos
+- last_scan solo avanza (Greatest), aunque los lotes lleguen desordenados
+
+Cada escaneo lleva un scan_id (UUID) generado al encolar, que se guarda en la
+sesión de mesa; mark_scan_converted() marca el registro como "resultó en pedido"
+aunque todavía no se haya escrito.
+
+Si un lote falla, sus escaneos se escriben de a uno, así un registro malo no
+bloquea a los demás; los que fallan solos siguen la política de reintentos de
+restaurants/background.py. El buffer no pasa de SCAN_BUFFER_MAX_PENDING
+escaneos (se descartan los más antiguos).
+"""
+import ipaddress
+import logging
+import threading
+import uuid
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .background import BackgroundFlusher, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+def clean_ip(value):
+    """IP normalizada o None (TableScanLog.ip_address es inet en Postgres)"""
+    if not value:
+        return None
+    try:
+        return str(ipaddress.ip_address(value.strip()))
+    except ValueError:
+        return None
+
+
+class ScanEvent:
+    """Escaneo pendiente de escribir"""
+
+    __slots__ = ('scan_id', 'table_id', 'scanned_at', 'ip_address', 'user_agent', 'resulted_in_order')
+
+    def __init__(self, scan_id, table_id, scanned_at, ip_address, user_agent):
+        self.scan_id = scan_id
+        self.table_id = table_id
+        self.scanned_at = scanned_at
+        self.ip_address = ip_address
+        self.user_agent = user_agent
+        self.resulted_in_order = False
+
+
+class ScanLogBuffer:
+    """
+    Cola de escaneos del proceso con su hilo de vaciado
+    """
+
+    # Conversiones que no encontraron su registro se reintentan durante N pasadas
+    CONVERSION_RETRIES = 30
+
+    def __init__(self, flush_interval=None, max_events=None, max_pending=None):
+        self.flush_interval = flush_interval or getattr(settings, 'SCAN_BUFFER_FLUSH_INTERVAL', 2)
+        self.max_events = max_events or getattr(settings, 'SCAN_BUFFER_MAX_EVENTS', 500)
+        self.max_pending = max_pending or getattr(settings, 'SCAN_BUFFER_MAX_PENDING', 10000)
+        self.retries = RetryPolicy('Buffer de escaneos')
+
+        self._events = deque()
+        self._by_scan_id = {}            # scan_id -> ScanEvent (aún en el buffer)
+        self._pending_conversions = {}   # scan_id -> pasadas restantes
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = BackgroundFlusher(self.flush, 'scan-log-flusher', interval=self.flush_interval)
+
+    # ------------------------------------------------------------------
+    # Productores
+    # ------------------------------------------------------------------
+
+    def record(self, table_id, ip_address=None, user_agent=''):
+        """Encolar un escaneo y devolver su scan_id (sin tocar la BD)"""
+        event = ScanEvent(
+            scan_id=uuid.uuid4(),
+            table_id=table_id,
+            scanned_at=timezone.now(),
+            ip_address=clean_ip(ip_address),
+            user_agent=user_agent or '',
+        )
+
+        with self._lock:
+            self._events.append(event)
+            self._by_scan_id[event.scan_id] = event
+            dropped = self._trim()
+            size = len(self._events)
+
+        if dropped:
+            logger.warning("Buffer de escaneos lleno: %s escaneos descartados", dropped)
+
+        if size >= self.max_events:
+            self._flusher.wake()
+        else:
+            self._flusher.ensure_started()
+        return event.scan_id
+
+    def mark_converted(self, scan_id):
+        """
+        Marcar un escaneo como convertido en pedido
+
+        Si sigue en el buffer se marca ahí; si no, se deja pendiente para
+        aplicarlo después de las próximas pasadas (puede estar en el buffer de
+        otro proceso).
+        """
+        with self._lock:
+            event = self._by_scan_id.get(scan_id)
+            if event is not None:
+                event.resulted_in_order = True
+                return
+            self._pending_conversions[scan_id] = self.CONVERSION_RETRIES
+
+        self._flusher.ensure_started()
+
+    def pending(self):
+        with self._lock:
+            return len(self._events)
+
+    def _trim(self):
+        """Descartar los escaneos más antiguos sobre max_pending (con el lock tomado)"""
+        dropped = 0
+        while len(self._events) > self.max_pending:
+            event = self._events.popleft()
+            self._by_scan_id.pop(event.scan_id, None)
+            dropped += 1
+        return dropped
+
+    # ------------------------------------------------------------------
+    # Vaciado
+    # ------------------------------------------------------------------
+
+    def flush(self):
+        """Escribir los escaneos pendientes (devuelve cuántos se escribieron)"""
+        with self._flush_lock:
+            with self._lock:
+                events = list(self._events)
+                self._events.clear()
+                conversions = dict(self._pending_conversions)
+
+            written = 0
+            if events:
+                try:
+                    self._write(events)
+                    written = len(events)
+                    failed = []
+                except Exception:
+                    logger.exception("Error escribiendo un lote de %s escaneos; se escriben de a uno", len(events))
+                    written, failed = self._write_each(events)
+
+                retry = self._requeue(failed)
+                done = [event for event in events if event not in retry]
+                for event in done:
+                    self.retries.succeeded(event.scan_id)
+                with self._lock:
+                    for event in done:
+                        self._by_scan_id.pop(event.scan_id, None)
+
+            if conversions:
+                self._apply_conversions(conversions)
+
+            if written:
+                logger.debug("Buffer de escaneos: %s registros escritos", written)
+            return written
+
+    def _write_each(self, events):
+        """Escribir cada escaneo por separado; devuelve (escritos, fallidos)"""
+        written = 0
+        failed = []
+        for event in events:
+            try:
+                self._write([event])
+                written += 1
+            except Exception:
+                failed.append(event)
+        return written, failed
+
+    def _requeue(self, failed):
+        """Devolver al buffer los escaneos con intentos disponibles; el resto se descarta"""
+        retry = [event for event in failed if self.retries.failed(event.scan_id)]
+        if retry:
+            with self._lock:
+                self._events.extendleft(reversed(retry))
+                dropped = self._trim()
+            if dropped:
+                logger.warning("Buffer de escaneos lleno: %s escaneos descartados", dropped)
+        return set(retry)
+
+    def _write(self, events):
+        from .models import Table, TableScanLog
+
+        scans_by_table = defaultdict(int)
+        last_scan_by_table = {}
+        for event in events:
+            scans_by_table[event.table_id] += 1
+            if last_scan_by_table.get(event.table_id) is None or event.scanned_at > last_scan_by_table[event.table_id]:
+                last_scan_by_table[event.table_id] = event.scanned_at
+
+        # Mesas borradas entre el escaneo y el vaciado se descartan
+        existing = set(Table.objects.filter(id__in=scans_by_table).values_list('id', flat=True))
+
+        with transaction.atomic():
+            TableScanLog.objects.bulk_create([
+                TableScanLog(
+                    scan_id=event.scan_id,
+                    table_id=event.table_id,
+                    scanned_at=event.scanned_at,
+                    ip_address=event.ip_address,
+                    user_agent=event.user_agent,
+                    resulted_in_order=event.resulted_in_order,
+                )
+                for event in events
+                if event.table_id in existing
+            ], batch_size=500)
+
+            for table_id, count in scans_by_table.items():
+                if table_id not in existing:
+                    continue
+                last_scan = last_scan_by_table[table_id]
+                Table.objects.filter(id=table_id).update(
+                    total_scans=F('total_scans') + count,
+                    last_scan=Greatest(Coalesce('last_scan', Value(last_scan)), Value(last_scan)),
+                )
+
+    def _apply_conversions(self, conversions):
+        from .models import TableScanLog
+
+        try:
+            found = set(
+                TableScanLog.objects.filter(scan_id__in=list(conversions)).values_list('scan_id', flat=True)
+            )
+            if found:
+                TableScanLog.objects.filter(scan_id__in=found).update(resulted_in_order=True)
+        except Exception:
+            logger.exception("Error marcando escaneos convertidos")
+            return
+
+        with self._lock:
+            for scan_id, retries in conversions.items():
+                if scan_id in found or retries <= 1:
+                    self._pending_conversions.pop(scan_id, None)
+                else:
+                    self._pending_conversions[scan_id] = retries - 1
+
+
+_buffer = ScanLogBuffer()
+
+
+def record_scan(table, ip_address=None, user_agent=''):
+    """Registrar el escaneo de una mesa; devuelve el scan_id"""
+    return _buffer.record(table.id, ip_address, user_agent)
+
+
+def mark_scan_converted(scan_id):
+    """El escaneo terminó en un pedido"""
+    if not scan_id:
+        return
+    if isinstance(scan_id, str):
+        try:
+            scan_id = uuid.UUID(scan_id)
+        except ValueError:
+            return
+    _buffer.mark_converted(scan_id)
+
+
+def flush_scan_buffer():
+    return _buffer.flush()
+
+
+def get_scan_buffer():
+    return _buffer
+
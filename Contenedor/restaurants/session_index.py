@@ -0,0 +1,173 @@
+"""
+Índice secundario de sesiones de mesa
+
+Mantiene en el caché (Redis) dos conjuntos:
+- table_sessions_{table_id}: tokens de sesión abiertos en una mesa
+- restaurant_active_tables_{restaurant_id}: mesas con al menos una sesión abierta
+
+Así, finalizar una mesa o listar las sesiones de un garzón/restaurante cuesta
+O(sesiones de esa mesa) y nunca requiere KEYS/SCAN sobre todo el keyspace.
+
+Con el backend de Redis de Django se usan SADD/SREM/SMEMBERS atómicos sobre el
+cliente crudo. Con otros backends (LocMem en desarrollo) se guarda un set de
+Python con get/set, suficiente para un solo proceso.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+
+class TableSessionIndex:
+    """
+    Conjuntos por mesa y por restaurante con expiración sincronizada
+    """
+
+    TABLE_KEY = "table_sessions_{table_id}"
+    RESTAURANT_KEY = "restaurant_active_tables_{restaurant_id}"
+
+    # Margen extra sobre la duración de la sesión antes de que expire el índice
+    EXPIRY_MARGIN = 600
+
+    # Expiración usada por el fallback sin Redis cuando se reescribe un set existente
+    DEFAULT_EXPIRY = getattr(settings, 'TABLE_SESSION_DURATION', 60) * 60 + EXPIRY_MARGIN
+
+    # ------------------------------------------------------------------
+    # Acceso al backend
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _redis(cls):
+        """Cliente Redis crudo si el backend es django.core.cache.backends.redis"""
+        try:
+            return cache._cache.get_client(write=True)
+        except AttributeError:
+            return None
+
+    @classmethod
+    def _table_key(cls, table_id):
+        return cls.TABLE_KEY.format(table_id=table_id)
+
+    @classmethod
+    def _restaurant_key(cls, restaurant_id):
+        return cls.RESTAURANT_KEY.format(restaurant_id=restaurant_id)
+
+    @staticmethod
+    def _decode(members):
+        return {m.decode('utf-8') if isinstance(m, bytes) else str(m) for m in members}
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def add(cls, session_token, table_id, restaurant_id, timeout):
+        """Registrar una sesión nueva de la mesa"""
+        expiry = int(timeout) + cls.EXPIRY_MARGIN
+        table_key = cls._table_key(table_id)
+        restaurant_key = cls._restaurant_key(restaurant_id)
+
+        client = cls._redis()
+        if client is not None:
+            pipe = client.pipeline()
+            pipe.sadd(cache.make_key(table_key), session_token)
+            pipe.expire(cache.make_key(table_key), expiry)
+            pipe.sadd(cache.make_key(restaurant_key), str(table_id))
+            pipe.expire(cache.make_key(restaurant_key), expiry)
+            pipe.execute()
+            return
+
+        tokens = cache.get(table_key) or set()
+        tokens.add(session_token)
+        cache.set(table_key, tokens, timeout=expiry)
+
+        tables = cache.get(restaurant_key) or set()
+        tables.add(str(table_id))
+        cache.set(restaurant_key, tables, timeout=expiry)
+
+    @classmethod
+    def touch(cls, table_id, restaurant_id, timeout):
+        """Extender la expiración del índice (ej: al extender una sesión)"""
+        expiry = int(timeout) + cls.EXPIRY_MARGIN
+        keys = [cls._table_key(table_id)]
+        if restaurant_id:
+            keys.append(cls._restaurant_key(restaurant_id))
+
+        client = cls._redis()
+        if client is not None:
+            pipe = client.pipeline()
+            for key in keys:
+                pipe.expire(cache.make_key(key), expiry)
+            pipe.execute()
+            return
+
+        for key in keys:
+            cache.touch(key, timeout=expiry)
+
+    @classmethod
+    def remove(cls, session_token, table_id, restaurant_id=None):
+        """Quitar una sesión del índice de su mesa"""
+        table_key = cls._table_key(table_id)
+
+        client = cls._redis()
+        if client is not None:
+            client.srem(cache.make_key(table_key), session_token)
+            if restaurant_id and not client.scard(cache.make_key(table_key)):
+                client.srem(cache.make_key(cls._restaurant_key(restaurant_id)), str(table_id))
+            return
+
+        tokens = cache.get(table_key)
+        if tokens:
+            tokens.discard(session_token)
+            if tokens:
+                cache.set(table_key, tokens, timeout=cls.DEFAULT_EXPIRY)
+            else:
+                cache.delete(table_key)
+        if restaurant_id and not tokens:
+            cls._discard_table(table_id, restaurant_id)
+
+    @classmethod
+    def clear_table(cls, table_id, restaurant_id):
+        """Eliminar todas las sesiones de una mesa del índice"""
+        cache.delete(cls._table_key(table_id))
+        cls._discard_table(table_id, restaurant_id)
+
+    @classmethod
+    def _discard_table(cls, table_id, restaurant_id):
+        restaurant_key = cls._restaurant_key(restaurant_id)
+
+        client = cls._redis()
+        if client is not None:
+            client.srem(cache.make_key(restaurant_key), str(table_id))
+            return
+
+        tables = cache.get(restaurant_key)
+        if tables and str(table_id) in tables:
+            tables.discard(str(table_id))
+            cache.set(restaurant_key, tables, timeout=cls.DEFAULT_EXPIRY)
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def tokens_for_table(cls, table_id):
+        """Tokens de sesión registrados en una mesa"""
+        table_key = cls._table_key(table_id)
+
+        client = cls._redis()
+        if client is not None:
+            return cls._decode(client.smembers(cache.make_key(table_key)))
+
+        return set(cache.get(table_key) or ())
+
+    @classmethod
+    def tables_for_restaurant(cls, restaurant_id):
+        """IDs de mesas con sesiones abiertas en un restaurante"""
+        restaurant_key = cls._restaurant_key(restaurant_id)
+
+        client = cls._redis()
+        if client is not None:
+            members = cls._decode(client.smembers(cache.make_key(restaurant_key)))
+        else:
+            members = set(cache.get(restaurant_key) or ())
+
+        return {int(table_id) for table_id in members}
@@ -0,0 +1,122 @@
+"""
+Señales de la app restaurants
+"""
+from django.db.models.signals import pre_save, post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Tenant, Restaurant, Table, KitchenStaff, BarStaff, WaiterStaff, Waiter
+from .staff_roles import invalidate_staff_role
+from .table_session_manager import TableSessionManager
+from .table_state import invalidate_waiter_table_state, mark_table_dirty
+from .tenant_cache import tenant_cache
+from .time_windows import invalidate_restaurant_timezone
+
+
+# ============================================================================
+# INVALIDACIÓN DEL CACHÉ DE TENANTS
+# ============================================================================
+
+@receiver(pre_save, sender=Tenant)
+def remember_previous_tenant_slug(sender, instance, **kwargs):
+    """Guardar el slug anterior para invalidarlo si cambia"""
+    if instance.pk and not instance._state.adding:
+        instance._previous_slug = (
+            Tenant.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_tenant_cache_for_tenant(sender, instance, **kwargs):
+    tenant_cache.invalidate(instance.slug, getattr(instance, '_previous_slug', None))
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_tenant_cache_for_restaurant(sender, instance, **kwargs):
+    slug = Tenant.objects.filter(pk=instance.tenant_id).values_list('slug', flat=True).first()
+    tenant_cache.invalidate(slug)
+    invalidate_restaurant_timezone(instance.pk)
+
+
+# ============================================================================
+# INVALIDACIÓN DEL SNAPSHOT DE MESAS (validación de sesiones)
+# ============================================================================
+
+# Campos contadores que no afectan la validez de una sesión
+TABLE_COUNTER_FIELDS = frozenset(['total_scans', 'last_scan', 'total_orders'])
+
+
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+def invalidate_table_snapshot(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= TABLE_COUNTER_FIELDS:
+        return
+    TableSessionManager.invalidate_table_snapshot(instance.pk)
+
+
+# ============================================================================
+# PROYECCIÓN DEL ESTADO DE MESAS POR GARZÓN
+# ============================================================================
+
+TABLE_ASSIGNMENT_FIELDS = frozenset(['assigned_waiter_id', 'is_active'])
+
+
+@receiver(post_init, sender=Table)
+def remember_table_assignment(sender, instance, **kwargs):
+    """Garzón y estado con que se cargó la mesa (para detectar reasignaciones sin consultar)"""
+    if TABLE_ASSIGNMENT_FIELDS & instance.get_deferred_fields():
+        # Cargada con only()/defer(): no se lee el campo para no disparar una consulta
+        instance._loaded_assignment = None
+    else:
+        instance._loaded_assignment = (instance.assigned_waiter_id, instance.is_active)
+
+
+@receiver(post_save, sender=Table)
+def refresh_waiter_table_state(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= TABLE_COUNTER_FIELDS:
+        return
+
+    previous = instance._loaded_assignment
+    instance._loaded_assignment = (instance.assigned_waiter_id, instance.is_active)
+
+    if created or previous is None or previous != instance._loaded_assignment:
+        if previous is not None:
+            invalidate_waiter_table_state(instance.restaurant_id, previous[0])
+        invalidate_waiter_table_state(instance.restaurant_id, instance.assigned_waiter_id)
+    else:
+        # Número o nombre de la mesa
+        mark_table_dirty(instance.pk)
+
+
+@receiver(post_delete, sender=Table)
+def drop_waiter_table_state(sender, instance, **kwargs):
+    invalidate_waiter_table_state(instance.restaurant_id, instance.assigned_waiter_id)
+
+
+# ============================================================================
+# INVALIDACIÓN DEL ROL DE EMPLEADO CACHEADO
+# ============================================================================
+
+STAFF_MODELS = (KitchenStaff, BarStaff, WaiterStaff, Waiter)
+
+
+def remember_previous_staff_owner(sender, instance, **kwargs):
+    """Guardar (usuario, restaurante) anteriores por si el registro se reasigna"""
+    if instance.pk and not instance._state.adding:
+        instance._previous_staff_owner = (
+            sender.objects.filter(pk=instance.pk).values_list('user_id', 'restaurant_id').first()
+        )
+
+
+def invalidate_staff_role_cache(sender, instance, **kwargs):
+    invalidate_staff_role(instance.user_id, instance.restaurant_id)
+    previous = getattr(instance, '_previous_staff_owner', None)
+    if previous and previous != (instance.user_id, instance.restaurant_id):
+        invalidate_staff_role(*previous)
+
+
+for staff_model in STAFF_MODELS:
+    pre_save.connect(remember_previous_staff_owner, sender=staff_model, dispatch_uid=f'staff_owner_{staff_model.__name__}')
+    post_save.connect(invalidate_staff_role_cache, sender=staff_model, dispatch_uid=f'staff_role_save_{staff_model.__name__}')
+    post_delete.connect(invalidate_staff_role_cache, sender=staff_model, dispatch_uid=f'staff_role_delete_{staff_model.__name__}')
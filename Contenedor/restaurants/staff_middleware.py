@@ -6,7 +6,8 @@ Detecta el tipo de empleado y proporciona contexto específico
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib.auth import logout
-from .models import KitchenStaff, BarStaff, WaiterStaff, Waiter
+from django.utils.functional import SimpleLazyObject
+from .staff_roles import resolve_staff_role, get_staff_member, load_staff_member
 
 
 class StaffRoleMiddleware:
@@ -46,40 +47,10 @@ class StaffRoleMiddleware:
         if not restaurant:
             return
         
-        # Detectar tipo de empleado
-        staff_member = None
-        staff_role = None
-        
-        # Verificar KitchenStaff
-        try:
-            staff_member = KitchenStaff.objects.get(user=request.user, restaurant=restaurant)
-            staff_role = 'kitchen'
-        except KitchenStaff.DoesNotExist:
-            pass
-        
-        # Verificar BarStaff
-        if not staff_member:
-            try:
-                staff_member = BarStaff.objects.get(user=request.user, restaurant=restaurant)
-                staff_role = 'bar'
-            except BarStaff.DoesNotExist:
-                pass
-        
-        # Verificar WaiterStaff
-        if not staff_member:
-            try:
-                staff_member = WaiterStaff.objects.get(user=request.user, restaurant=restaurant)
-                staff_role = 'waiter_new'
-            except WaiterStaff.DoesNotExist:
-                pass
-        
-        # Verificar Waiter original (compatibilidad)
-        if not staff_member:
-            try:
-                staff_member = Waiter.objects.get(user=request.user, restaurant=restaurant)
-                staff_role = 'waiter'
-            except Waiter.DoesNotExist:
-                pass
+        # Rol desde el caché (una consulta UNION si no está); el empleado se carga
+        # recién cuando una vista lo usa
+        staff_role, staff_pk = resolve_staff_role(request.user.pk, restaurant.pk)
+        staff_member = get_staff_member(staff_role, staff_pk)
         
         # Agregar información al request
         request.staff_member = staff_member
@@ -92,12 +63,13 @@ class StaffRoleMiddleware:
         """
         Verificar que el empleado acceda solo a sus rutas permitidas
         """
-        if not request.staff_member:
+        if not request.staff_role:
             return
         
         path = request.path
         role = request.staff_role
-        tenant_slug = getattr(request, 'tenant', {}).get('slug', '')
+        tenant = getattr(request, 'tenant', None)
+        tenant_slug = tenant.slug if tenant else ''
         
         # Definir rutas permitidas por rol
         role_routes = {
@@ -192,17 +164,27 @@ class StaffContextMiddleware:
     
     def add_staff_context(self, request):
         """
-        Agregar información contextual del empleado
+        Agregar información contextual del empleado (se calcula al primer uso)
+        """
+        if not getattr(request, 'staff_role', None) or request.staff_role == 'admin':
+            return
+        
+        request.staff_context = SimpleLazyObject(lambda: self.build_staff_context(request))
+    
+    @staticmethod
+    def build_staff_context(request):
+        """
+        Contexto específico por rol del empleado del request
         """
         staff_member = getattr(request, 'staff_member', None)
         staff_role = getattr(request, 'staff_role', None)
         
         if not staff_member:
-            return
+            return {}
         
         # Contexto específico por rol
         if staff_role == 'kitchen':
-            request.staff_context = {
+            staff_context = {
                 'role': 'kitchen',
                 'role_display': 'Cocina',
                 'icon': '👨‍🍳',
@@ -214,7 +196,7 @@ class StaffContextMiddleware:
             }
         
         elif staff_role == 'bar':
-            request.staff_context = {
+            staff_context = {
                 'role': 'bar',
                 'role_display': 'Bar',
                 'icon': '🍸',
@@ -226,7 +208,7 @@ class StaffContextMiddleware:
             }
         
         elif staff_role in ['waiter', 'waiter_new']:
-            request.staff_context = {
+            staff_context = {
                 'role': 'waiter',
                 'role_display': 'Garzón',
                 'icon': '🍽️',
@@ -236,38 +218,33 @@ class StaffContextMiddleware:
                 'can_take_orders': getattr(staff_member, 'can_take_orders', True),
             }
         
+        else:
+            return {}
+        
         # Información común
-        if hasattr(request, 'staff_context'):
-            request.staff_context.update({
-                'full_name': staff_member.full_name,
-                'status': staff_member.status,
-                'is_available': staff_member.is_available,
-                'is_working_hours': staff_member.is_working_hours,
-                'employee_id': staff_member.employee_id,
-                'last_active': staff_member.last_active,
-            })
+        staff_context.update({
+            'full_name': staff_member.full_name,
+            'status': staff_member.status,
+            'is_available': staff_member.is_available,
+            'is_working_hours': staff_member.is_working_hours,
+            'employee_id': staff_member.employee_id,
+            'last_active': staff_member.last_active,
+        })
+        return staff_context
 
 
 def get_staff_member_by_user(user, restaurant):
     """
     Función utilitaria para obtener el empleado según el usuario
     """
-    # Intentar en orden de prioridad
-    staff_models = [
-        (KitchenStaff, 'kitchen'),
-        (BarStaff, 'bar'), 
-        (WaiterStaff, 'waiter_new'),
-        (Waiter, 'waiter'),
-    ]
-    
-    for model_class, role in staff_models:
-        try:
-            staff_member = model_class.objects.get(user=user, restaurant=restaurant)
-            return staff_member, role
-        except model_class.DoesNotExist:
-            continue
+    staff_role, staff_pk = resolve_staff_role(user.pk, restaurant.pk)
+    if not staff_role:
+        return None, None
     
-    return None, None
+    staff_member = load_staff_member(staff_role, staff_pk)
+    if staff_member is None:
+        return None, None
+    return staff_member, staff_role
 
 
 def staff_required_by_role(*allowed_roles):
@@ -0,0 +1,95 @@
+"""
+Resolución del rol de empleado por (usuario, restaurante)
+
+El rol se obtiene con una sola consulta UNION sobre KitchenStaff, BarStaff,
+WaiterStaff y Waiter, y se guarda en el caché como (rol, pk). También se cachea
+el resultado "sin rol", para que un usuario que no es empleado no repita la
+consulta en cada request.
+
+El objeto del empleado no se carga hasta que una vista lo usa (get_staff_member
+devuelve un SimpleLazyObject). Las señales en restaurants/signals.py invalidan
+la entrada cuando se crea, modifica o elimina un registro de empleado.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import IntegerField, Value
+from django.utils.functional import SimpleLazyObject
+
+from .models import KitchenStaff, BarStaff, WaiterStaff, Waiter
+
+
+STAFF_ROLE_KEY = "staff_role_{restaurant_id}_{user_id}"
+
+# Modelos en orden de prioridad (si un usuario tiene varios registros gana el primero)
+ROLE_MODELS = (
+    ('kitchen', KitchenStaff),
+    ('bar', BarStaff),
+    ('waiter_new', WaiterStaff),
+    ('waiter', Waiter),
+)
+
+MODELS_BY_ROLE = dict(ROLE_MODELS)
+
+# Valor cacheado para "no es empleado de este restaurante"
+NO_ROLE = ('', None)
+
+
+def staff_role_cache_key(user_id, restaurant_id):
+    return STAFF_ROLE_KEY.format(restaurant_id=restaurant_id, user_id=user_id)
+
+
+def staff_role_ttl():
+    return getattr(settings, 'STAFF_ROLE_CACHE_TTL', 300)
+
+
+def _query_staff_role(user_id, restaurant_id):
+    """(rol, pk) del empleado con una sola consulta UNION"""
+    querysets = [
+        model.objects.filter(
+            user_id=user_id,
+            restaurant_id=restaurant_id
+        ).annotate(
+            priority=Value(priority, output_field=IntegerField())
+        ).order_by().values_list('pk', 'priority')
+        for priority, (role, model) in enumerate(ROLE_MODELS)
+    ]
+    rows = querysets[0].union(*querysets[1:], all=True)
+
+    best = min(rows, key=lambda row: row[1], default=None)
+    if best is None:
+        return NO_ROLE
+    pk, priority = best
+    return ROLE_MODELS[priority][0], pk
+
+
+def resolve_staff_role(user_id, restaurant_id):
+    """
+    (rol, pk) del empleado, o (None, None) si no trabaja en el restaurante
+    """
+    key = staff_role_cache_key(user_id, restaurant_id)
+    cached = cache.get(key)
+    if cached is None:
+        cached = _query_staff_role(user_id, restaurant_id)
+        cache.set(key, cached, timeout=staff_role_ttl())
+
+    role, pk = cached
+    if not role:
+        return None, None
+    return role, pk
+
+
+def invalidate_staff_role(user_id, restaurant_id):
+    cache.delete(staff_role_cache_key(user_id, restaurant_id))
+
+
+def load_staff_member(role, pk):
+    """Instancia del empleado (con su usuario) para un rol resuelto"""
+    model = MODELS_BY_ROLE[role]
+    return model.objects.select_related('user').filter(pk=pk).first()
+
+
+def get_staff_member(role, pk):
+    """Empleado diferido: la consulta se hace recién al acceder a un atributo"""
+    if not role:
+        return None
+    return SimpleLazyObject(lambda: load_staff_member(role, pk))
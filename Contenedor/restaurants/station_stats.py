@@ -0,0 +1,78 @@
+"""
+Estadísticas de las estaciones (cocina y bar) de un día
+
+Todos los conteos salen de una sola consulta de agregación condicional sobre
+OrderItem: items por (estación del item, estado) y pedidos distintos por
+pantalla. Los totales de cada pantalla se arman sumando las estaciones que le
+corresponden ('both' cuenta para cocina y para bar). La consulta filtra solo
+OrderItem por (restaurant, created_at), usando los campos que fija el ruteo, con
+el día local del restaurante como rango UTC (time_windows.day_range).
+El resultado se cachea por unos segundos (STATION_STATS_TTL) porque los
+dashboards lo piden en cada carga.
+
+Lo usan kitchen_views, bar_views y el dashboard administrativo.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from orders.models import OrderItem
+from orders.routing import STATION_QUEUES
+
+from .time_windows import day_range
+
+
+STATION_STATS_KEY = "station_stats_{restaurant_id}_{date}"
+
+STATIONS = ('kitchen', 'bar', 'both')
+ITEM_STATUSES = ('pending', 'preparing', 'ready', 'served')
+
+
+def _aggregations():
+    aggregations = {
+        f"{station}_{status}": Count('id', filter=Q(station=station, status=status))
+        for station in STATIONS
+        for status in ITEM_STATUSES
+    }
+    for queue, stations in STATION_QUEUES.items():
+        aggregations[f"{queue}_orders"] = Count(
+            'order', distinct=True, filter=Q(station__in=stations)
+        )
+    return aggregations
+
+
+def compute_station_stats(restaurant, date):
+    """
+    Conteos del día por estación del item y por pantalla (una consulta)
+    """
+    start, end = day_range(restaurant, date)
+    totals = OrderItem.objects.filter(
+        restaurant=restaurant,
+        created_at__gte=start,
+        created_at__lt=end
+    ).aggregate(**_aggregations())
+
+    by_station = {
+        station: {status: totals[f"{station}_{status}"] for status in ITEM_STATUSES}
+        for station in STATIONS
+    }
+
+    stats = {'by_station': by_station}
+    for queue, stations in STATION_QUEUES.items():
+        queue_stats = {
+            status: sum(by_station[station][status] for station in stations)
+            for status in ITEM_STATUSES
+        }
+        queue_stats['orders_count'] = totals[f"{queue}_orders"]
+        stats[queue] = queue_stats
+    return stats
+
+
+def get_station_stats(restaurant, date):
+    """Estadísticas de estaciones con caché de TTL corto"""
+    key = STATION_STATS_KEY.format(restaurant_id=restaurant.pk, date=date.isoformat())
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_station_stats(restaurant, date)
+        cache.set(key, stats, timeout=getattr(settings, 'STATION_STATS_TTL', 15))
+    return stats
@@ -0,0 +1,298 @@
+"""
+Utilidades para generar archivos grandes en streaming (ZIP, PDF, CSV y XLSX)
+
+Los generadores producen los bytes a medida que se escribe cada entrada, para
+usarlos con StreamingHttpResponse o escribirlos a un archivo sin mantener el
+documento completo en memoria.
+"""
+import csv
+import re
+import time
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+
+class ChunkBuffer:
+    """
+    Archivo de solo escritura que acumula bytes hasta que se leen con drain()
+    (zipfile lo acepta como stream no posicionable)
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """
+    Generador de un ZIP a partir de (nombre, contenido, comprimir)
+
+    El contenido puede ser bytes o un iterable de bytes; en ese caso la entrada
+    se escribe por partes y los bytes comprimidos salen mientras se genera.
+    """
+    buffer = ChunkBuffer()
+    with zipfile.ZipFile(buffer, mode='w') as archive:
+        for name, content, compress in entries:
+            compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            if isinstance(content, (bytes, str)):
+                archive.writestr(name, content, compress_type=compress_type)
+            else:
+                info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                info.compress_type = compress_type
+                with archive.open(info, mode='w') as entry:
+                    for part in content:
+                        entry.write(part)
+                        chunk = buffer.drain()
+                        if chunk:
+                            yield chunk
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    chunk = buffer.drain()
+    if chunk:
+        yield chunk
+
+
+class StreamingPDFWriter:
+    """
+    PDF mínimo escrito página por página (tamaño carta, fuente Helvetica)
+
+    Solo guarda los offsets de cada objeto para la tabla xref final; el árbol de
+    páginas se escribe al cerrar, cuando se conocen todas las páginas.
+    """
+
+    PAGE_WIDTH = 612   # 8.5in en puntos
+    PAGE_HEIGHT = 792  # 11in en puntos
+
+    CATALOG_ID = 1
+    PAGES_ID = 2
+    FONT_ID = 3
+
+    def __init__(self):
+        self._offsets = {}
+        self._position = 0
+        self._next_id = 4
+        self._page_ids = []
+
+    def _emit(self, data):
+        self._position += len(data)
+        return data
+
+    def _object(self, object_id, body):
+        self._offsets[object_id] = self._position
+        return self._emit(b'%d 0 obj\n' % object_id + body + b'\nendobj\n')
+
+    def begin(self):
+        """Cabecera, catálogo y fuente"""
+        return (
+            self._emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+            + self._object(self.CATALOG_ID, b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES_ID)
+            + self._object(
+                self.FONT_ID,
+                b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'
+            )
+        )
+
+    def page(self, content):
+        """Agregar una página con un content stream ya armado"""
+        content_id = self._next_id
+        page_id = self._next_id + 1
+        self._next_id += 2
+        self._page_ids.append(page_id)
+
+        return (
+            self._object(
+                content_id,
+                b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream'
+            )
+            + self._object(
+                page_id,
+                b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>'
+                % (self.PAGES_ID, self.PAGE_WIDTH, self.PAGE_HEIGHT, self.FONT_ID, content_id)
+            )
+        )
+
+    def end(self):
+        """Árbol de páginas, tabla xref y trailer"""
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self._page_ids)
+        data = self._object(
+            self.PAGES_ID,
+            b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self._page_ids))
+        )
+
+        xref_position = self._position
+        size = self._next_id
+        xref = [b'xref\n0 %d\n' % size, b'0000000000 65535 f \n']
+        for object_id in range(1, size):
+            xref.append(b'%010d 00000 n \n' % self._offsets[object_id])
+        xref.append(
+            b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%EOF\n'
+            % (size, self.CATALOG_ID, xref_position)
+        )
+        return data + self._emit(b''.join(xref))
+
+    @staticmethod
+    def text(value):
+        """Texto escapado para un string PDF (WinAnsi)"""
+        encoded = value.encode('cp1252', errors='replace')
+        return encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class _Echo:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla"""
+
+    def write(self, value):
+        return value
+
+
+# Prefijos que Excel/LibreOffice interpretan como fórmula al abrir un CSV
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_safe(value):
+    """Texto que empieza como fórmula se prefija con ' (inyección de fórmulas en CSV)"""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(headers, rows, batch_rows=500):
+    """
+    Generador de un CSV UTF-8 (con BOM, para que Excel respete los acentos)
+
+    Las filas se envían en bloques de batch_rows líneas. Las celdas de texto
+    pasan por csv_safe(): nombres y teléfonos los escriben los clientes.
+    """
+    writer = csv.writer(_Echo())
+    yield '\ufeff'.encode('utf-8') + writer.writerow(headers).encode('utf-8')
+
+    batch = []
+    for row in rows:
+        batch.append(writer.writerow([csv_safe(value) for value in row]))
+        if len(batch) >= batch_rows:
+            yield ''.join(batch).encode('utf-8')
+            batch = []
+    if batch:
+        yield ''.join(batch).encode('utf-8')
+
+
+# Caracteres no permitidos en XML 1.0 (controles salvo tab y saltos de línea)
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XLSX_CONTENT_TYPES = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    b'<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    b'<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    b'<Default Extension="xml" ContentType="application/xml"/>'
+    b'<Override PartName="/xl/workbook.xml" '
+    b'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    b'<Override PartName="/xl/worksheets/sheet1.xml" '
+    b'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    b'</Types>'
+)
+
+_XLSX_ROOT_RELS = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    b'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    b'<Relationship Id="rId1" '
+    b'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    b'Target="xl/workbook.xml"/>'
+    b'</Relationships>'
+)
+
+_XLSX_WORKBOOK_RELS = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    b'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    b'<Relationship Id="rId1" '
+    b'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    b'Target="worksheets/sheet1.xml"/>'
+    b'</Relationships>'
+)
+
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_XLSX_SHEET_START = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+
+_XLSX_SHEET_END = b'</sheetData></worksheet>'
+
+
+def xlsx_cell(value):
+    """Celda XLSX: números como valores, el resto como texto en línea"""
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f'<c t="n"><v>{value}</v></c>'
+    text = escape(_INVALID_XML_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _batched(rows, batch_bytes):
+    """Agrupar filas ya codificadas en bloques de ~batch_bytes"""
+    batch = []
+    size = 0
+    for row in rows:
+        batch.append(row)
+        size += len(row)
+        if size >= batch_bytes:
+            yield b''.join(batch)
+            batch = []
+            size = 0
+    if batch:
+        yield b''.join(batch)
+
+
+def _prepend(first, rows):
+    yield first
+    yield from rows
+
+
+def stream_xlsx(sheet_name, headers, rows, batch_bytes=64 * 1024):
+    """
+    Generador de un XLSX de una hoja (sin dependencias: ZIP + XML escrito por partes)
+
+    rows es un iterable de secuencias de valores; nunca se materializa completo.
+    """
+    def sheet():
+        yield _XLSX_SHEET_START
+        encoded = (
+            ('<row>' + ''.join(xlsx_cell(value) for value in row) + '</row>').encode('utf-8')
+            for row in _prepend(headers, rows)
+        )
+        yield from _batched(encoded, batch_bytes)
+        yield _XLSX_SHEET_END
+
+    workbook = _XLSX_WORKBOOK.format(name=escape(sheet_name[:31], {'"': '&quot;'})).encode('utf-8')
+    return stream_zip([
+        ('[Content_Types].xml', _XLSX_CONTENT_TYPES, True),
+        ('_rels/.rels', _XLSX_ROOT_RELS, True),
+        ('xl/workbook.xml', workbook, True),
+        ('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS, True),
+        ('xl/worksheets/sheet1.xml', sheet(), True),
+    ])
@@ -7,6 +7,9 @@ from django.utils import timezone
 from django.core.cache import cache
 from django.conf import settings
 from .models import Table, TableScanLog
+from .scan_buffer import clean_ip, record_scan
+from .session_index import TableSessionIndex
+from .table_state import mark_table_dirty
 
 
 class TableSessionManager:
@@ -18,6 +21,15 @@ class TableSessionManager:
     SESSION_DURATION = getattr(settings, 'TABLE_SESSION_DURATION', 60)  # 60 minutos por defecto
     INACTIVITY_TIMEOUT = getattr(settings, 'TABLE_INACTIVITY_TIMEOUT', 45)  # 45 min sin actividad
     
+    # Escritura de last_activity como máximo una vez cada N segundos por sesión
+    ACTIVITY_WRITE_INTERVAL = getattr(settings, 'TABLE_SESSION_ACTIVITY_WRITE_INTERVAL', 60)
+    
+    # TTL del snapshot de estado de mesa (is_active / qr_enabled)
+    TABLE_SNAPSHOT_TTL = getattr(settings, 'TABLE_SNAPSHOT_TTL', 300)
+    
+    # Atributo del request donde se memoiza la validación de la sesión
+    REQUEST_STATE_ATTR = '_table_session_state'
+    
     @classmethod
     def create_table_session(cls, table, request):
         """
@@ -26,9 +38,9 @@ class TableSessionManager:
         # Generar token único para esta sesión
         session_token = str(uuid.uuid4())
         
-        # Crear registro de escaneo
-        scan_log = TableScanLog.objects.create(
-            table=table,
+        # Registrar el escaneo en el buffer (log + contador se escriben en lote)
+        scan_id = record_scan(
+            table,
             ip_address=cls._get_client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', '')
         )
@@ -36,9 +48,10 @@ class TableSessionManager:
         # Datos de la sesión
         session_data = {
             'table_id': table.id,
+            'restaurant_id': table.restaurant_id,
             'table_number': table.number,
             'table_name': table.display_name,
-            'scan_log_id': scan_log.id,
+            'scan_id': str(scan_id),
             'session_token': session_token,
             'created_at': timezone.now().isoformat(),
             'last_activity': timezone.now().isoformat(),
@@ -51,6 +64,10 @@ class TableSessionManager:
         cache_key = f"table_session_{session_token}"
         cache.set(cache_key, session_data, timeout=cls.SESSION_DURATION * 60)
         
+        # Registrar en el índice de sesiones de la mesa/restaurante
+        TableSessionIndex.add(session_token, table.id, table.restaurant_id, cls.SESSION_DURATION * 60)
+        mark_table_dirty(table.id)
+        
         # También en sesión del navegador como backup
         request.session['table_session'] = {
             'token': session_token,
@@ -58,27 +75,76 @@ class TableSessionManager:
             'created_at': session_data['created_at']
         }
         
-        # Incrementar contador de mesa
-        table.increment_scan_count()
+        # La sesión recién creada es la válida para el resto del request
+        setattr(request, cls.REQUEST_STATE_ATTR, {
+            'token': session_token,
+            'session_data': session_data,
+            'invalidation': None,
+            'validated': True,
+            'result': session_data,
+        })
         
         return session_token, session_data
     
     @classmethod
-    def get_active_session(cls, request):
-        """
-        Obtener sesión activa si es válida
+    def _get_request_state(cls, request):
         """
-        browser_session = request.session.get('table_session')
-        if not browser_session:
-            return None
+        Lecturas de caché del request en un solo round trip (memoizado en el request)
         
+        Trae la sesión y el marcador de invalidación de la mesa con un get_many
+        """
+        browser_session = request.session.get('table_session') or {}
         session_token = browser_session.get('token')
+        
+        state = getattr(request, cls.REQUEST_STATE_ATTR, None)
+        if state is not None and state['token'] == session_token:
+            return state
+        
+        session_key = f"table_session_{session_token}" if session_token else None
+        table_id = browser_session.get('table_id')
+        invalidation_key = f"table_invalidated_{table_id}" if table_id else None
+        
+        keys = [key for key in (session_key, invalidation_key) if key]
+        found = cache.get_many(keys) if keys else {}
+        
+        state = {
+            'token': session_token,
+            'session_data': found.get(session_key),
+            'invalidation': found.get(invalidation_key),
+            'validated': False,
+            'result': None,
+        }
+        setattr(request, cls.REQUEST_STATE_ATTR, state)
+        return state
+    
+    @classmethod
+    def get_table_invalidation(cls, request):
+        """
+        Datos de cierre por garzón de la mesa del navegador (o None)
+        """
+        return cls._get_request_state(request)['invalidation']
+    
+    @classmethod
+    def get_active_session(cls, request):
+        """
+        Obtener sesión activa si es válida (se valida una sola vez por request)
+        """
+        state = cls._get_request_state(request)
+        if not state['validated']:
+            state['result'] = cls._validate_session(request, state)
+            state['validated'] = True
+        return state['result']
+    
+    @classmethod
+    def _validate_session(cls, request, state):
+        """
+        Validación completa de la sesión a partir del estado leído del caché
+        """
+        session_token = state['token']
         if not session_token:
             return None
         
-        # Verificar en caché
-        cache_key = f"table_session_{session_token}"
-        session_data = cache.get(cache_key)
+        session_data = state['session_data']
         
         if not session_data:
             # Sesión expirada
@@ -87,18 +153,16 @@ class TableSessionManager:
         
         # 🚨 VERIFICAR SI LA MESA FUE INVALIDADA POR GARZÓN
         table_id = session_data.get('table_id')
-        if table_id:
-            invalidation_key = f"table_invalidated_{table_id}"
-            invalidation_data = cache.get(invalidation_key)
-            if invalidation_data:
-                # Mesa fue finalizada por garzón - invalidar sesión y marcar para redirección especial
-                cls.invalidate_session(request, session_token)
-                # Marcar en la sesión del navegador que debe redirigir a página especial
-                request.session['redirect_to_session_closed'] = {
-                    'table_id': table_id,
-                    'waiter_info': invalidation_data
-                }
-                return None
+        invalidation_data = state['invalidation']
+        if table_id and invalidation_data:
+            # Mesa fue finalizada por garzón - invalidar sesión y marcar para redirección especial
+            cls.invalidate_session(request, session_token)
+            # Marcar en la sesión del navegador que debe redirigir a página especial
+            request.session['redirect_to_session_closed'] = {
+                'table_id': table_id,
+                'waiter_info': invalidation_data
+            }
+            return None
         
         # Verificar si la sesión sigue activa
         if not session_data.get('is_active', False):
@@ -106,37 +170,67 @@ class TableSessionManager:
             return None
         
         # Verificar timeout de inactividad
+        now = timezone.now()
         last_activity = timezone.datetime.fromisoformat(session_data['last_activity'])
-        if timezone.now() - last_activity > timedelta(minutes=cls.INACTIVITY_TIMEOUT):
+        if now - last_activity > timedelta(minutes=cls.INACTIVITY_TIMEOUT):
             cls.invalidate_session(request)
             return None
         
-        # Verificar que la mesa siga activa
-        try:
-            table = Table.objects.get(id=session_data['table_id'])
-            if not table.is_active or not table.qr_enabled:
-                cls.invalidate_session(request)
-                return None
-        except Table.DoesNotExist:
+        # Verificar que la mesa siga activa (snapshot en caché, no consulta por request)
+        table_snapshot = cls.get_table_snapshot(table_id)
+        if not table_snapshot or not table_snapshot['is_active'] or not table_snapshot['qr_enabled']:
             cls.invalidate_session(request)
             return None
         
-        # Actualizar última actividad
-        cls.update_activity(session_token)
+        # Actualizar última actividad (throttled)
+        if (now - last_activity).total_seconds() >= cls.ACTIVITY_WRITE_INTERVAL:
+            session_data['last_activity'] = now.isoformat()
+            cls._save_session(session_token, session_data)
         
         return session_data
     
+    @classmethod
+    def _save_session(cls, session_token, session_data, timeout=None):
+        """
+        Reescribir la sesión renovando su TTL y el del índice de la mesa
+        
+        El índice expira por su cuenta: toda renovación de la sesión debe
+        renovarlo, si no la sesión sigue viva pero deja de aparecer en el índice
+        """
+        timeout = timeout or cls.SESSION_DURATION * 60
+        cache.set(f"table_session_{session_token}", session_data, timeout=timeout)
+        TableSessionIndex.touch(session_data['table_id'], session_data.get('restaurant_id'), timeout)
+    
+    @classmethod
+    def get_table_snapshot(cls, table_id):
+        """
+        Estado mínimo de una mesa cacheado (invalidado por señales de Table)
+        Retorna {} si la mesa no existe
+        """
+        cache_key = f"table_snapshot_{table_id}"
+        snapshot = cache.get(cache_key)
+        if snapshot is None:
+            snapshot = Table.objects.filter(id=table_id).values(
+                'id', 'restaurant_id', 'number', 'is_active', 'qr_enabled', 'assigned_waiter_id'
+            ).first() or {}
+            cache.set(cache_key, snapshot, timeout=cls.TABLE_SNAPSHOT_TTL)
+        return snapshot
+    
+    @classmethod
+    def invalidate_table_snapshot(cls, table_id):
+        """Descartar el snapshot cacheado de una mesa"""
+        cache.delete(f"table_snapshot_{table_id}")
+    
     @classmethod
     def update_activity(cls, session_token):
         """
         Actualizar última actividad de la sesión
         """
-        cache_key = f"table_session_{session_token}"
-        session_data = cache.get(cache_key)
+        session_data = cache.get(f"table_session_{session_token}")
         
         if session_data:
             session_data['last_activity'] = timezone.now().isoformat()
-            cache.set(cache_key, session_data, timeout=cls.SESSION_DURATION * 60)
+            cls._save_session(session_token, session_data)
     
     @classmethod
     def invalidate_session(cls, request, session_token=None):
@@ -156,6 +250,20 @@ class TableSessionManager:
                 session_data['is_active'] = False
                 session_data['ended_at'] = timezone.now().isoformat()
                 cache.set(cache_key, session_data, timeout=3600)  # Mantener por 1 hora para logs
+                
+                # Quitar del índice de sesiones abiertas de la mesa
+                TableSessionIndex.remove(
+                    session_token,
+                    session_data['table_id'],
+                    session_data.get('restaurant_id')
+                )
+                mark_table_dirty(session_data['table_id'])
+        
+        # El resto del request ya no tiene sesión válida
+        state = getattr(request, cls.REQUEST_STATE_ATTR, None)
+        if state is not None:
+            state['validated'] = True
+            state['result'] = None
         
         # Limpiar sesión del navegador
         if 'table_session' in request.session:
@@ -175,12 +283,8 @@ class TableSessionManager:
         
         session_data = cls.get_active_session(request)
         if session_data:
-            session_token = session_data['session_token']
-            cache_key = f"table_session_{session_token}"
-            
-            # Extender tiempo en caché
-            cache.set(cache_key, session_data, timeout=minutes * 60)
-            
+            # Extender tiempo en caché (y en el índice de la mesa)
+            cls._save_session(session_data['session_token'], session_data, timeout=minutes * 60)
             return True
         return False
     
@@ -213,68 +317,78 @@ class TableSessionManager:
             'session_token': session_data['session_token']
         }
     
+    @classmethod
+    def get_table_sessions(cls, table_id, restaurant_id=None):
+        """
+        Sesiones abiertas de una mesa según el índice (O(sesiones de la mesa))
+        Limpia del índice los tokens cuya sesión ya expiró o fue cerrada
+        """
+        tokens = TableSessionIndex.tokens_for_table(table_id)
+        if not tokens:
+            return []
+        
+        cache_keys = {f"table_session_{token}": token for token in tokens}
+        found = cache.get_many(list(cache_keys))
+        
+        sessions = []
+        for cache_key, token in cache_keys.items():
+            session_data = found.get(cache_key)
+            if session_data and session_data.get('is_active', False):
+                sessions.append(session_data)
+            else:
+                TableSessionIndex.remove(token, table_id, restaurant_id)
+        
+        sessions.sort(key=lambda data: data['created_at'], reverse=True)
+        return sessions
+    
     @classmethod
     def get_active_sessions_for_restaurant(cls, restaurant):
         """
         Obtener todas las sesiones activas para un restaurante
         """
-        from django.core.cache import cache
-        
         active_sessions = []
         
-        # Obtener todas las mesas del restaurante
-        tables = restaurant.tables.filter(is_active=True)
+        table_ids = TableSessionIndex.tables_for_restaurant(restaurant.id)
+        if not table_ids:
+            return active_sessions
+        
+        tables = Table.objects.filter(id__in=table_ids, restaurant=restaurant, is_active=True)
         
         for table in tables:
-            # Buscar sesiones activas para esta mesa
-            # Nota: En producción podrías usar un patrón más eficiente
-            cache_pattern = f"table_session_*"
-            
-            # Por ahora, revisaremos las sesiones que conocemos
-            # En una implementación más avanzada, podrías usar Redis SCAN
             session_info = cls._get_session_for_table(table)
             if session_info:
                 active_sessions.append(session_info)
+            else:
+                # Mesa sin sesiones vivas: sacarla del índice del restaurante
+                TableSessionIndex.clear_table(table.id, restaurant.id)
         
         return active_sessions
     
     @classmethod
     def _get_session_for_table(cls, table):
         """
-        Buscar sesión activa específica para una mesa
+        Buscar sesión activa específica para una mesa (la más reciente)
         """
-        from django.core.cache import cache
-        
-        # Buscar en logs recientes de escaneo para encontrar sesiones activas
-        recent_scans = table.scan_logs.filter(
-            scanned_at__gte=timezone.now() - timedelta(hours=2)
-        ).order_by('-scanned_at')
-        
-        for scan in recent_scans:
-            # Intentar encontrar sesión basada en la IP y tiempo
-            session_data = cls._find_session_by_scan(scan)
-            if session_data:
-                return {
-                    'table': table,
-                    'session_data': session_data,
-                    'scan_log': scan
-                }
+        sessions = cls.get_table_sessions(table.id, table.restaurant_id)
+        if not sessions:
+            return None
         
-        return None
+        return {
+            'table': table,
+            'session_data': sessions[0],
+            'sessions': sessions,
+            'scan_id': sessions[0].get('scan_id'),
+        }
     
     @classmethod
     def _find_session_by_scan(cls, scan_log):
         """
-        Encontrar sesión activa basada en scan log
-        Nota: Método simplificado, en producción usarías un índice más eficiente
+        Encontrar sesión activa creada por un scan log específico
         """
-        from django.core.cache import cache
-        import re
-        
-        # Esto es una implementación simplificada
-        # En una versión más robusta, mantendrías un índice de sesiones por mesa
-        
-        return None  # Por ahora retornamos None, implementaremos método más directo
+        for session_data in cls.get_table_sessions(scan_log.table_id):
+            if session_data.get('scan_id') == str(scan_log.scan_id):
+                return session_data
+        return None
     
     @classmethod
     def get_active_sessions_for_waiter(cls, waiter):
@@ -298,29 +412,24 @@ class TableSessionManager:
         """
         Verificar si una mesa específica tiene sesión activa
         """
-        from django.core.cache import cache
-        
-        # Buscar en scans recientes
-        recent_scan = table.scan_logs.filter(
-            scanned_at__gte=timezone.now() - timedelta(minutes=cls.SESSION_DURATION + 10)
-        ).order_by('-scanned_at').first()
-        
-        if not recent_scan:
+        sessions = cls.get_table_sessions(table.id, table.restaurant_id)
+        if not sessions:
             return None
         
-        # Simular búsqueda de sesión activa
-        # En implementación real, tendrías un índice mejor
-        session_data = {
+        latest = sessions[0]
+        created_at = timezone.datetime.fromisoformat(latest['created_at'])
+        
+        return {
             'table_id': table.id,
             'table_number': table.number,
             'table_name': table.display_name,
-            'scan_time': recent_scan.scanned_at,
-            'ip_address': recent_scan.ip_address,
-            'estimated_expires': recent_scan.scanned_at + timedelta(minutes=cls.SESSION_DURATION),
-            'is_likely_active': (timezone.now() - recent_scan.scanned_at).total_seconds() < cls.SESSION_DURATION * 60
+            'scan_time': created_at,
+            'last_activity': timezone.datetime.fromisoformat(latest['last_activity']),
+            'ip_address': latest.get('ip_address'),
+            'estimated_expires': created_at + timedelta(minutes=cls.SESSION_DURATION),
+            'sessions_count': len(sessions),
+            'is_likely_active': True,
         }
-        
-        return session_data if session_data['is_likely_active'] else None
     
     @classmethod
     def waiter_end_table_session(cls, waiter, table, reason="finalizada_por_garzon"):
@@ -331,44 +440,19 @@ class TableSessionManager:
         if table.assigned_waiter != waiter:
             return False, "No tienes autoridad sobre esta mesa"
         
-        # 🔥 INVALIDAR TODAS LAS SESIONES ACTIVAS DE ESTA MESA
-        from django.core.cache import cache
-        sessions_ended = 0
+        # 🔥 INVALIDAR TODAS LAS SESIONES ACTIVAS DE ESTA MESA (vía índice, sin KEYS)
+        tokens = TableSessionIndex.tokens_for_table(table.id)
+        session_keys = [f"table_session_{token}" for token in tokens]
         
-        # 1. Buscar sesiones activas por escaneos recientes
-        recent_scans = table.scan_logs.filter(
-            scanned_at__gte=timezone.now() - timedelta(minutes=cls.SESSION_DURATION + 10)
-        )
+        sessions_ended = 0
+        if session_keys:
+            existing = cache.get_many(session_keys)
+            sessions_ended = sum(1 for data in existing.values() if data.get('is_active', False))
+            cache.delete_many(session_keys)
         
-        # 2. El método MÁS SEGURO: Encontrar sesiones por tokens específicos de esta mesa
-        # Las sesiones se almacenan como: "table_session_{uuid_token}"
-        # Necesitamos encontrar los tokens activos relacionados con esta mesa específica
-        
-        # Obtener tokens de sesiones activas desde la base de datos
-        for scan in recent_scans:
-            # Las sesiones están en caché como "table_session_{token}"
-            # Buscamos todas las claves que empiecen con "table_session_"
-            try:
-                from django.core.cache.backends.base import InvalidCacheBackendError
-                cache_keys = cache._cache.get_client().keys("table_session_*")
-                
-                for key in cache_keys:
-                    key_str = key.decode('utf-8') if isinstance(key, bytes) else key
-                    session_data = cache.get(key_str)
-                    
-                    # Verificar si esta sesión pertenece a NUESTRA mesa específica
-                    if session_data and session_data.get('table_id') == table.id:
-                        # Esta sesión ES de nuestra mesa - eliminarla
-                        cache.delete(key_str)
-                        sessions_ended += 1
-                        
-            except (AttributeError, InvalidCacheBackendError):
-                # Fallback si no podemos acceder a Redis directamente
-                # En este caso, el marcador de invalidación será suficiente
-                break
+        TableSessionIndex.clear_table(table.id, table.restaurant_id)
         
         # 4. Marcar mesa como "limpiada" por garzón en la BD
-        from .models import TableScanLog
         TableScanLog.objects.create(
             table=table,
             scanned_at=timezone.now(),
@@ -390,6 +474,8 @@ class TableSessionManager:
             'restaurant_name': table.restaurant.name
         }, timeout=3600)  # Válido por 1 hora
         
+        mark_table_dirty(table.id)
+        
         return True, f"Sesión de {table.display_name} finalizada por garzón ({sessions_ended} sesiones cerradas)"
     
     @classmethod
@@ -400,7 +486,8 @@ class TableSessionManager:
             ip = x_forwarded_for.split(',')[0]
         else:
             ip = request.META.get('REMOTE_ADDR')
-        return ip
+        # El encabezado lo controla el cliente: solo se acepta una IP válida
+        return clean_ip(ip)
 
 
 class TableSessionMiddleware:
@@ -415,7 +502,6 @@ class TableSessionMiddleware:
         # Validar sesión antes de cada request en rutas que requieren sesión
         if request.path.startswith('/menu/') or request.path.startswith('/orders/') or 'cart' in request.path:
             from django.shortcuts import redirect
-            from django.core.cache import cache
             
             # Verificar si hay información en la sesión del navegador
             browser_session = request.session.get('table_session')
@@ -425,8 +511,7 @@ class TableSessionMiddleware:
             
             # VERIFICAR SI LA MESA FUE INVALIDADA POR GARZÓN ANTES de validar sesión
             if table_id:
-                invalidation_key = f"table_invalidated_{table_id}"
-                invalidation_data = cache.get(invalidation_key)
+                invalidation_data = TableSessionManager.get_table_invalidation(request)
                 if invalidation_data:
                     # Sesión fue cerrada por garzón - redirigir a página especial
                     try:
@@ -469,7 +554,6 @@ class TableSessionDecorator:
         def wrapper(request, *args, **kwargs):
             from django.shortcuts import redirect
             from django.contrib import messages
-            from django.core.cache import cache
             
             # Verificar si hay información en la sesión del navegador
             browser_session = request.session.get('table_session')
@@ -479,8 +563,7 @@ class TableSessionDecorator:
             
             # Verificar si la mesa fue invalidada por garzón ANTES de validar sesión
             if table_id:
-                invalidation_key = f"table_invalidated_{table_id}"
-                invalidation_data = cache.get(invalidation_key)
+                invalidation_data = TableSessionManager.get_table_invalidation(request)
                 if invalidation_data:
                     # Sesión fue cerrada por garzón - redirigir a página especial
                     tenant_slug = kwargs.get('tenant_slug') or request.resolver_match.kwargs.get('tenant_slug')
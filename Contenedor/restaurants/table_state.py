@@ -0,0 +1,404 @@
+"""
+Proyección del estado de mesas por garzón
+
+El estado que muestra el dashboard del garzón (sesión activa, pedidos
+pendientes y listos, último pedido, cierre por garzón) se guarda en el caché:
+una entrada por garzón con sus mesas en orden y una entrada por mesa con su
+estado. La pantalla lo lee con un GET más un get_many (los clientes que siguen
+haciendo polling) o lo recibe por su WebSocket.
+
+La proyección se mantiene con eventos, no con consultas por request:
+- sesiones y escaneos (TableSessionManager) y eventos de pedidos
+  (OrderEventBus) marcan la mesa como modificada con mark_table_dirty()
+- un hilo del proceso junta las mesas marcadas durante TABLE_STATE_REFRESH_WINDOW,
+  recalcula solo esas mesas (una consulta de pedidos para todas), reescribe
+  sus entradas y las envía al garzón por el grupo waiter_{...}
+- cada mesa tiene su propia entrada: dos recálculos concurrentes de mesas
+  distintas no se pisan (no hay leer-modificar-escribir de la proyección)
+- si cambia la asignación de una mesa se descarta la entrada del garzón (se
+  reconstruye en la próxima lectura)
+
+Los datos se guardan con fechas absolutas; los textos relativos ("hace 5 min")
+y la expiración de la sesión se calculan al leer (render_table_state).
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .background import BackgroundFlusher, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+WAITER_TABLE_STATE_KEY = "waiter_table_state_{restaurant_id}_{waiter_id}"
+TABLE_STATE_KEY = "table_state_{table_id}"
+
+# Tipo del mensaje en el channel layer -> handler table_state del consumer del garzón
+TABLE_STATE_MESSAGE_TYPE = 'table.state'
+
+PENDING_ORDER_STATUSES = ('pending', 'preparing')
+PENDING_ORDERS_WINDOW = timedelta(hours=2)
+RECENT_ORDERS_WINDOW = timedelta(hours=4)
+
+
+def waiter_table_state_key(restaurant_id, waiter_id):
+    return WAITER_TABLE_STATE_KEY.format(restaurant_id=restaurant_id, waiter_id=waiter_id)
+
+
+def table_state_key(table_id):
+    return TABLE_STATE_KEY.format(table_id=table_id)
+
+
+def table_state_ttl():
+    return getattr(settings, 'WAITER_TABLE_STATE_TTL', 300)
+
+
+def _mask_ip(ip_address):
+    if not ip_address:
+        return ip_address
+    return ip_address[:12] + "..." if len(ip_address) > 12 else ip_address
+
+
+def compute_table_states(tables):
+    """
+    Estado de varias mesas: una consulta de pedidos más lecturas del caché de sesiones
+    """
+    from orders.models import Order
+    from .table_session_manager import TableSessionManager
+
+    if not tables:
+        return {}
+
+    now = timezone.now()
+    table_ids = [table.id for table in tables]
+    status_display = dict(Order.STATUS_CHOICES)
+
+    orders_by_table = {table_id: [] for table_id in table_ids}
+    recent_orders = Order.objects.filter(
+        table_id__in=table_ids,
+        created_at__gte=now - RECENT_ORDERS_WINDOW
+    ).annotate(
+        items_count=Count('items')
+    ).order_by('-created_at').values(
+        'id', 'table_id', 'status', 'total_amount', 'created_at', 'items_count'
+    )
+    for order in recent_orders:
+        orders_by_table[order['table_id']].append(order)
+
+    invalidations = cache.get_many([f"table_invalidated_{table_id}" for table_id in table_ids])
+
+    states = {}
+    for table in tables:
+        orders = orders_by_table[table.id]
+        pending_orders = sum(
+            1 for order in orders
+            if order['status'] in PENDING_ORDER_STATUSES and order['created_at'] >= now - PENDING_ORDERS_WINDOW
+        )
+        ready_orders = sum(1 for order in orders if order['status'] == 'ready')
+
+        last_order = None
+        if orders:
+            order = orders[0]
+            last_order = {
+                'id': str(order['id']),
+                'status': order['status'],
+                'status_display': status_display.get(order['status'], order['status']),
+                'total': float(order['total_amount']),
+                'created_at': order['created_at'].isoformat(),
+                'items_count': order['items_count'],
+            }
+
+        invalidation = invalidations.get(f"table_invalidated_{table.id}")
+        invalidation_info = None
+        if invalidation:
+            invalidation_info = {
+                'waiter_name': invalidation.get('waiter_name'),
+                'reason': invalidation.get('reason'),
+                'sessions_ended': invalidation.get('sessions_ended', 0)
+            }
+
+        session_info = None
+        sessions = TableSessionManager.get_table_sessions(table.id, table.restaurant_id)
+        if sessions and not invalidation:
+            latest = sessions[0]
+            session_info = {
+                'scan_time': latest['created_at'],
+                'last_activity': latest['last_activity'],
+                'ip_address': _mask_ip(latest.get('ip_address')),
+            }
+
+        states[table.id] = {
+            'id': table.id,
+            'number': table.number,
+            'name': table.display_name,
+            'session': session_info,
+            'pending_orders_count': pending_orders,
+            'ready_orders_count': ready_orders,
+            'last_order': last_order,
+            'was_invalidated': invalidation is not None,
+            'invalidation_info': invalidation_info,
+        }
+    return states
+
+
+def _minutes_since(iso_timestamp, now):
+    return int((now - datetime.fromisoformat(iso_timestamp)).total_seconds() // 60)
+
+
+def render_table_state(state, now=None):
+    """
+    Estado de una mesa en el formato del dashboard (campos relativos a ahora)
+    """
+    from .table_session_manager import TableSessionManager
+
+    now = now or timezone.now()
+    session = state['session']
+
+    # Las sesiones expiran por TTL sin generar eventos: se descartan al leer
+    if session:
+        last_activity_minutes = _minutes_since(session['last_activity'], now)
+        scan_minutes = _minutes_since(session['scan_time'], now)
+        if (scan_minutes >= TableSessionManager.SESSION_DURATION
+                or last_activity_minutes >= TableSessionManager.INACTIVITY_TIMEOUT):
+            session = None
+
+    session_info = None
+    if session:
+        session_info = {
+            'scan_time': session['scan_time'],
+            'time_ago': scan_minutes,
+            'ip_address': session['ip_address'],
+            'time_ago_text': f"{scan_minutes} min" if scan_minutes > 0 else "Recién conectado"
+        }
+
+    last_order_info = None
+    if state['last_order']:
+        last_order = state['last_order']
+        minutes_ago = _minutes_since(last_order['created_at'], now)
+        last_order_info = {
+            'id': last_order['id'],
+            'status': last_order['status'],
+            'status_display': last_order['status_display'],
+            'total': last_order['total'],
+            'minutes_ago': minutes_ago,
+            'items_count': last_order['items_count'],
+            'time_text': f"hace {minutes_ago} min" if minutes_ago > 0 else "Recién"
+        }
+
+    pending_orders = state['pending_orders_count']
+    ready_orders = state['ready_orders_count']
+    return {
+        'id': state['id'],
+        'number': state['number'],
+        'name': state['name'],
+        'has_active_session': session_info is not None,
+        'session_info': session_info,
+        'pending_orders_count': pending_orders,
+        'ready_orders_count': ready_orders,
+        'last_order': last_order_info,
+        'was_invalidated': state['was_invalidated'],
+        'invalidation_info': state['invalidation_info'],
+        'needs_attention': pending_orders > 0 or ready_orders > 0
+    }
+
+
+def render_waiter_tables(projection, now=None):
+    """Mesas de la proyección en el orden del dashboard"""
+    now = now or timezone.now()
+    return [
+        render_table_state(projection['tables'][str(table_id)], now)
+        for table_id in projection['table_ids']
+    ]
+
+
+# ============================================================================
+# PROYECCIÓN POR GARZÓN
+# ============================================================================
+
+def _store_table_states(states):
+    cache.set_many(
+        {table_state_key(table_id): state for table_id, state in states.items()},
+        timeout=table_state_ttl()
+    )
+
+
+def build_waiter_table_state(waiter):
+    """Reconstruir la proyección completa del garzón y guardarla en el caché"""
+    tables = list(
+        waiter.assigned_tables.filter(is_active=True).only(
+            'id', 'number', 'name', 'restaurant_id'
+        ).order_by('number')
+    )
+    states = compute_table_states(tables)
+    _store_table_states(states)
+
+    waiter_state = {
+        'waiter_id': waiter.id,
+        'waiter_name': waiter.full_name,
+        'table_ids': [table.id for table in tables],
+        'built_at': timezone.now().isoformat(),
+    }
+    cache.set(waiter_table_state_key(waiter.restaurant_id, waiter.id), waiter_state, timeout=table_state_ttl())
+    return dict(waiter_state, tables={str(table_id): state for table_id, state in states.items()})
+
+
+def _load_table_states(table_ids):
+    """
+    Estado de las mesas del garzón: un get_many (las que faltan se recalculan)
+    """
+    from .models import Table
+
+    cached = cache.get_many([table_state_key(table_id) for table_id in table_ids])
+    states = {}
+    missing = []
+    for table_id in table_ids:
+        state = cached.get(table_state_key(table_id))
+        if state is None:
+            missing.append(table_id)
+        else:
+            states[table_id] = state
+
+    if missing:
+        tables = list(Table.objects.filter(id__in=missing).only('id', 'number', 'name', 'restaurant_id'))
+        recomputed = compute_table_states(tables)
+        _store_table_states(recomputed)
+        states.update(recomputed)
+    return states
+
+
+def get_waiter_table_state(restaurant_id, waiter_id):
+    """
+    Proyección del garzón: un GET y un get_many del caché (se reconstruye si no está)
+    """
+    waiter_state = cache.get(waiter_table_state_key(restaurant_id, waiter_id))
+    if waiter_state is None:
+        from .models import Waiter
+
+        waiter = Waiter.objects.select_related('user').filter(id=waiter_id, restaurant_id=restaurant_id).first()
+        if waiter is None:
+            return None
+        return build_waiter_table_state(waiter)
+
+    states = _load_table_states(waiter_state['table_ids'])
+    # Una mesa borrada entre lecturas no tiene estado: se omite hasta la reconstrucción
+    table_ids = [table_id for table_id in waiter_state['table_ids'] if table_id in states]
+    return dict(
+        waiter_state,
+        table_ids=table_ids,
+        tables={str(table_id): states[table_id] for table_id in table_ids}
+    )
+
+
+def invalidate_waiter_table_state(restaurant_id, waiter_id):
+    if waiter_id:
+        cache.delete(waiter_table_state_key(restaurant_id, waiter_id))
+
+
+def refresh_tables(table_ids):
+    """
+    Recalcular las mesas indicadas, reescribir su estado y enviarlas a su garzón
+    """
+    from .models import Table
+
+    tables = list(
+        Table.objects.filter(
+            id__in=table_ids,
+            assigned_waiter__isnull=False
+        ).only('id', 'number', 'name', 'restaurant_id', 'assigned_waiter_id', 'is_active')
+    )
+
+    tables_by_waiter = {}
+    for table in tables:
+        tables_by_waiter.setdefault((table.restaurant_id, table.assigned_waiter_id), []).append(table)
+
+    for (restaurant_id, waiter_id), waiter_tables in tables_by_waiter.items():
+        active_tables = [table for table in waiter_tables if table.is_active]
+        states = compute_table_states(active_tables)
+        # Mesas desactivadas o reasignadas: las señales descartan la entrada del garzón
+        _store_table_states(states)
+        if states:
+            now = timezone.now()
+            push_table_states(restaurant_id, waiter_id, [render_table_state(state, now) for state in states.values()])
+
+
+def push_table_states(restaurant_id, waiter_id, tables):
+    """Enviar mesas actualizadas al WebSocket del garzón"""
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from orders.events import waiter_group
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        async_to_sync(channel_layer.group_send)(
+            waiter_group(restaurant_id, waiter_id),
+            {'type': TABLE_STATE_MESSAGE_TYPE, 'tables': tables}
+        )
+    except Exception:
+        logger.exception("Error enviando estado de mesas al garzón %s", waiter_id)
+
+
+# ============================================================================
+# MESAS MODIFICADAS (recalculadas en lote por un hilo del proceso)
+# ============================================================================
+
+class TableStateRefresher:
+    """
+    Conjunto de mesas modificadas, recalculadas juntas al cerrar la ventana
+    """
+
+    def __init__(self, window=None):
+        self.window = window if window is not None else getattr(settings, 'TABLE_STATE_REFRESH_WINDOW', 0.5)
+
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.retries = RetryPolicy('Estado de mesas')
+        self._flusher = BackgroundFlusher(self.flush, 'table-state-refresher', window=self.window)
+
+    def mark_dirty(self, table_id):
+        with self._lock:
+            self._dirty.add(table_id)
+        self._flusher.wake()
+
+    def flush(self):
+        """Recalcular las mesas pendientes (devuelve cuántas)"""
+        with self._flush_lock:
+            with self._lock:
+                table_ids = list(self._dirty)
+                self._dirty.clear()
+            if not table_ids:
+                return 0
+            try:
+                refresh_tables(table_ids)
+            except Exception:
+                logger.exception("Error recalculando el estado de %s mesas", len(table_ids))
+                retry = [table_id for table_id in table_ids if self.retries.failed(table_id)]
+                if retry:
+                    with self._lock:
+                        self._dirty.update(retry)
+                    self._flusher.wake()
+                return 0
+            for table_id in table_ids:
+                self.retries.succeeded(table_id)
+            return len(table_ids)
+
+
+_refresher = TableStateRefresher()
+
+
+def mark_table_dirty(table_id):
+    """La mesa cambió (sesión, escaneo o pedido): recalcular su estado en breve"""
+    if table_id:
+        _refresher.mark_dirty(table_id)
+
+
+def flush_table_states():
+    return _refresher.flush()
+
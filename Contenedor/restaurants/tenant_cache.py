@@ -0,0 +1,168 @@
+"""
+Caché de resolución de tenants para TenantMiddleware
+
+Dos niveles:
+1. LRU en memoria del proceso con TTL corto (evita incluso el round trip al caché compartido)
+2. Caché compartido de Django (Redis en producción) con TTL más largo
+
+Las señales post_save/post_delete de Tenant y Restaurant invalidan ambos niveles
+(ver restaurants/signals.py). Los otros procesos ven el cambio cuando expira su TTL local.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Tenant, Restaurant
+
+
+# Estados de tenant que pueden atender requests
+ACTIVE_TENANT_STATUSES = ['ACTIVE', 'TRIAL']
+
+# Marcador para slugs inexistentes/inactivos (cacheo negativo)
+_MISSING = '__missing__'
+
+
+class TenantResolutionCache:
+    """
+    LRU por proceso con TTL, respaldado por el caché compartido de Django
+    """
+
+    def __init__(self, max_entries=None, local_ttl=None, shared_ttl=None):
+        self.max_entries = max_entries or getattr(settings, 'TENANT_CACHE_MAX_ENTRIES', 512)
+        self.local_ttl = local_ttl if local_ttl is not None else getattr(settings, 'TENANT_CACHE_LOCAL_TTL', 30)
+        self.shared_ttl = shared_ttl if shared_ttl is not None else getattr(settings, 'TENANT_CACHE_TTL', 300)
+
+        self._entries = OrderedDict()  # slug -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+        }
+
+    @staticmethod
+    def _shared_key(slug):
+        return f"tenant_resolution_{slug}"
+
+    def _bump(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    # ------------------------------------------------------------------
+    # Nivel local (LRU)
+    # ------------------------------------------------------------------
+
+    def _local_get(self, slug):
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[slug]
+                return None
+            self._entries.move_to_end(slug)
+            self._stats['local_hits'] += 1
+            return value
+
+    def _local_set(self, slug, value):
+        with self._lock:
+            self._entries[slug] = (time.monotonic() + self.local_ttl, value)
+            self._entries.move_to_end(slug)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def resolve(self, slug):
+        """
+        Obtener (tenant, restaurant) activos para un slug.
+        Lanza Tenant.DoesNotExist o Restaurant.DoesNotExist igual que la consulta original.
+        """
+        value = self._local_get(slug)
+
+        if value is None:
+            value = cache.get(self._shared_key(slug))
+            if value is not None:
+                self._bump('shared_hits')
+                self._local_set(slug, value)
+
+        if value is None:
+            self._bump('misses')
+            value = self._load(slug)
+            cache.set(self._shared_key(slug), value, timeout=self.shared_ttl)
+            self._local_set(slug, value)
+
+        if value == _MISSING:
+            raise Tenant.DoesNotExist(f"Tenant '{slug}' no encontrado o inactivo")
+
+        tenant, restaurant = value
+        if restaurant is None:
+            raise Restaurant.DoesNotExist(f"Tenant '{slug}' sin restaurant asociado")
+
+        return tenant, restaurant
+
+    def _load(self, slug):
+        """Consulta a la BD (solo en miss)"""
+        try:
+            tenant = Tenant.objects.select_related('restaurant').get(
+                slug=slug,
+                status__in=ACTIVE_TENANT_STATUSES
+            )
+        except Tenant.DoesNotExist:
+            return _MISSING
+
+        try:
+            restaurant = tenant.restaurant
+        except Restaurant.DoesNotExist:
+            restaurant = None
+
+        return tenant, restaurant
+
+    def invalidate(self, *slugs):
+        """Invalidar uno o más slugs en ambos niveles"""
+        slugs = [slug for slug in slugs if slug]
+        if not slugs:
+            return
+
+        with self._lock:
+            for slug in slugs:
+                self._entries.pop(slug, None)
+            self._stats['invalidations'] += len(slugs)
+
+        cache.delete_many([self._shared_key(slug) for slug in slugs])
+
+    def clear(self):
+        """Vaciar el nivel local (útil en tests)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Contadores de hits/misses de este proceso"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['local_entries'] = len(self._entries)
+
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['lookups'] = lookups
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+tenant_cache = TenantResolutionCache()
+
+
+def resolve_tenant(slug):
+    """Atajo para usar desde el middleware"""
+    return tenant_cache.resolve(slug)
+
+
+def get_tenant_cache_stats():
+    """Estadísticas del caché de tenants de este proceso"""
+    return tenant_cache.stats()
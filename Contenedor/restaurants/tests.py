@@ -1,3 +1,430 @@
-from django.test import TestCase
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from menu.models import MenuCategory, MenuItem
+from orders.models import Order, OrderItem
+from .background import RetryPolicy
+from .kds import get_station_changes
+from .models import Tenant, Restaurant, Table, Waiter
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, paginate
+from .scan_buffer import ScanLogBuffer, clean_ip
+from .session_index import TableSessionIndex
+from .table_state import (
+    get_waiter_table_state, refresh_tables, table_state_key, waiter_table_state_key,
+)
+from .time_windows import day_range
+from .table_session_manager import TableSessionManager
+
+
+def create_restaurant(slug='test'):
+    owner = User.objects.create_user(f'owner-{slug}', password='x')
+    tenant = Tenant.objects.create(name='Test', slug=slug, status='ACTIVE')
+    return Restaurant.objects.create(
+        tenant=tenant, name='Test', address='-', phone='-',
+        email='test@example.com', owner=owner
+    )
+
+
+def create_menu_item(restaurant, name='Plato'):
+    category, _ = MenuCategory.objects.get_or_create(tenant=restaurant.tenant, name='Platos')
+    return MenuItem.objects.create(
+        tenant=restaurant.tenant, category=category, name=name,
+        description='-', base_price=Decimal('1000')
+    )
+
+
+def table_session_request(session_data):
+    """Request con la sesión de mesa en la sesión del navegador (un dict basta)"""
+    request = RequestFactory().get('/menu/')
+    request.session = {'table_session': {
+        'token': session_data['session_token'],
+        'table_id': session_data['table_id'],
+        'created_at': session_data['created_at'],
+    }}
+    return request
+
+
+def cache_table_session(table_id=1, restaurant_id=1, last_activity=None):
+    """Sesión de mesa abierta en el caché, con su índice y el snapshot de la mesa"""
+    now = timezone.now()
+    session_data = {
+        'table_id': table_id,
+        'restaurant_id': restaurant_id,
+        'table_number': str(table_id),
+        'table_name': f'Mesa {table_id}',
+        'scan_id': None,
+        'session_token': f'token-{table_id}',
+        'created_at': now.isoformat(),
+        'last_activity': (last_activity or now).isoformat(),
+        'is_active': True,
+    }
+    timeout = TableSessionManager.SESSION_DURATION * 60
+    cache.set(f"table_session_{session_data['session_token']}", session_data, timeout=timeout)
+    TableSessionIndex.add(session_data['session_token'], table_id, restaurant_id, timeout)
+    cache.set(f"table_snapshot_{table_id}", {
+        'id': table_id, 'restaurant_id': restaurant_id, 'number': str(table_id),
+        'is_active': True, 'qr_enabled': True, 'assigned_waiter_id': None,
+    })
+    return session_data
+
+
+class TableSessionIndexTests(SimpleTestCase):
+    """
+    Índice de sesiones por mesa y restaurante (sin KEYS)
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tables_stay_indexed_until_their_last_session_is_removed(self):
+        TableSessionIndex.add('a', 1, 10, 60)
+        TableSessionIndex.add('b', 1, 10, 60)
+        TableSessionIndex.add('c', 2, 10, 60)
+
+        self.assertEqual(TableSessionIndex.tokens_for_table(1), {'a', 'b'})
+        self.assertEqual(TableSessionIndex.tables_for_restaurant(10), {1, 2})
+
+        TableSessionIndex.remove('a', 1, 10)
+        self.assertEqual(TableSessionIndex.tables_for_restaurant(10), {1, 2})
+
+        TableSessionIndex.remove('b', 1, 10)
+        self.assertEqual(TableSessionIndex.tokens_for_table(1), set())
+        self.assertEqual(TableSessionIndex.tables_for_restaurant(10), {2})
+
+    def test_clear_table(self):
+        TableSessionIndex.add('a', 1, 10, 60)
+        TableSessionIndex.clear_table(1, 10)
+
+        self.assertEqual(TableSessionIndex.tokens_for_table(1), set())
+        self.assertEqual(TableSessionIndex.tables_for_restaurant(10), set())
+
+    def test_activity_refreshes_the_index_ttl(self):
+        session_data = cache_table_session(table_id=3, restaurant_id=10)
+
+        with mock.patch.object(TableSessionIndex, 'touch') as touch:
+            TableSessionManager.update_activity(session_data['session_token'])
+
+        touch.assert_called_once_with(3, 10, TableSessionManager.SESSION_DURATION * 60)
+
+    def test_throttled_activity_write_refreshes_the_index_ttl(self):
+        stale = timezone.now() - timedelta(seconds=TableSessionManager.ACTIVITY_WRITE_INTERVAL + 1)
+        session_data = cache_table_session(table_id=4, restaurant_id=10, last_activity=stale)
+
+        with mock.patch.object(TableSessionIndex, 'touch') as touch:
+            self.assertIsNotNone(TableSessionManager.get_active_session(table_session_request(session_data)))
+
+        touch.assert_called_once_with(4, 10, TableSessionManager.SESSION_DURATION * 60)
+        cached = cache.get(f"table_session_{session_data['session_token']}")
+        self.assertGreater(cached['last_activity'], stale.isoformat())
+
+
+class ActiveSessionValidationTests(SimpleTestCase):
+    """
+    La sesión de mesa se valida una vez por request con una sola lectura del caché
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_validation_is_memoized_per_request(self):
+        session_data = cache_table_session(table_id=5)
+        request = table_session_request(session_data)
+
+        with mock.patch('restaurants.table_session_manager.cache', wraps=cache) as wrapped:
+            first = TableSessionManager.get_active_session(request)
+            second = TableSessionManager.get_active_session(request)
+            self.assertIsNone(TableSessionManager.get_table_invalidation(request))
+
+        self.assertEqual(first['session_token'], session_data['session_token'])
+        self.assertIs(first, second)
+        # Sesión e invalidación de la mesa en un solo get_many
+        self.assertEqual(wrapped.get_many.call_count, 1)
+
+    def test_table_closed_by_waiter_ends_the_session(self):
+        session_data = cache_table_session(table_id=6)
+        cache.set('table_invalidated_6', {'waiter_name': 'Ana'})
+        request = table_session_request(session_data)
+
+        with mock.patch('restaurants.table_session_manager.mark_table_dirty'):
+            self.assertIsNone(TableSessionManager.get_active_session(request))
+
+        self.assertNotIn('table_session', request.session)
+        self.assertEqual(request.session['redirect_to_session_closed']['table_id'], 6)
+        self.assertEqual(TableSessionIndex.tokens_for_table(6), set())
+
+    def test_inactive_session_is_rejected(self):
+        stale = timezone.now() - timedelta(minutes=TableSessionManager.INACTIVITY_TIMEOUT + 1)
+        session_data = cache_table_session(table_id=7, last_activity=stale)
+
+        with mock.patch('restaurants.table_session_manager.mark_table_dirty'):
+            self.assertIsNone(TableSessionManager.get_active_session(table_session_request(session_data)))
+
+
+class ScanLogBufferFlushTests(SimpleTestCase):
+    """
+    Un lote que falla se escribe de a uno; lo que sigue fallando se reintenta y se descarta
+    """
+
+    def setUp(self):
+        # Intervalo largo: el hilo del buffer no corre durante el test
+        self.buffer = ScanLogBuffer(flush_interval=3600)
+        self.buffer.retries = RetryPolicy('Buffer de escaneos', max_attempts=2)
+
+    def test_client_ip_is_validated(self):
+        self.assertEqual(clean_ip(' 10.0.0.1 '), '10.0.0.1')
+        self.assertEqual(clean_ip('2001:DB8::1'), '2001:db8::1')
+        self.assertIsNone(clean_ip('10.0.0.1; DROP TABLE'))
+        self.assertIsNone(clean_ip(''))
+
+    def test_failed_scans_are_retried_then_dropped(self):
+        self.buffer.record(1, '10.0.0.1')
+        self.buffer.record(2, 'no es una ip')
+
+        with mock.patch.object(self.buffer, '_write', side_effect=Exception('BD caída')):
+            self.assertEqual(self.buffer.flush(), 0)
+            self.assertEqual(self.buffer.pending(), 2)
+
+            with self.assertLogs('restaurants.background', 'ERROR'):
+                self.assertEqual(self.buffer.flush(), 0)
+
+        self.assertEqual(self.buffer.pending(), 0)
+        self.assertEqual(self.buffer.retries.pending(), 0)
+
+    def test_bad_scan_does_not_block_the_batch(self):
+        def write(events):
+            if any(event.table_id == 2 for event in events):
+                raise Exception('Mesa inválida')
+
+        self.buffer.record(1)
+        self.buffer.record(2)
+        self.buffer.record(3)
+
+        with mock.patch.object(self.buffer, '_write', side_effect=write) as patched:
+            self.assertEqual(self.buffer.flush(), 2)
+            self.assertEqual(self.buffer.pending(), 1)
+
+            patched.side_effect = None
+            self.assertEqual(self.buffer.flush(), 1)
+
+        self.assertEqual(self.buffer.pending(), 0)
+        self.assertEqual(self.buffer.retries.pending(), 0)
+
+
+class StationChangesTests(TestCase):
+    """
+    Cola del KDS: items con el mismo updated_at y commits tardíos detrás del cursor
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = create_restaurant()
+        menu_item = create_menu_item(cls.restaurant)
+        orders = [
+            Order.objects.create(
+                restaurant=cls.restaurant, customer_name='Cliente',
+                subtotal=Decimal('0'), total_amount=Decimal('0')
+            )
+            for _ in range(5)
+        ]
+        cls.items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, menu_item=menu_item, restaurant=cls.restaurant,
+                station='kitchen', unit_price=Decimal('1000'), total_price=Decimal('1000')
+            )
+            for order in orders
+        ])
+        cls.timestamp = timezone.now().replace(microsecond=123456)
+        OrderItem.objects.filter(restaurant=cls.restaurant).update(updated_at=cls.timestamp)
+
+    def test_ties_are_split_by_id(self):
+        # Con cursor cada respuesta repite el solape anterior; el cursor avanza solo con lo nuevo
+        cursor = encode_cursor(self.timestamp - timedelta(microseconds=1), 0)
+        seen = set()
+        while True:
+            items, next_cursor, has_more = get_station_changes(self.restaurant, 'kitchen', cursor, limit=2)
+            ids = [item.id for item in items]
+            self.assertEqual(ids, sorted(set(ids)))
+            self.assertNotEqual(next_cursor, cursor)
+            seen.update(ids)
+            cursor = next_cursor
+            if not has_more:
+                break
+
+        item_ids = sorted(item.id for item in self.items)
+        self.assertEqual(sorted(seen), item_ids)
+        self.assertEqual(decode_cursor(cursor, OrderItem), (self.timestamp, item_ids[-1]))
+
+    def test_late_commits_inside_the_overlap_are_returned(self):
+        late = self.items[1]
+        OrderItem.objects.filter(pk=late.pk).update(updated_at=self.timestamp - timedelta(seconds=1))
+        cursor = encode_cursor(self.timestamp, max(item.id for item in self.items))
+
+        items, next_cursor, has_more = get_station_changes(self.restaurant, 'kitchen', cursor)
+
+        self.assertIn(late.id, [item.id for item in items])
+        self.assertEqual(next_cursor, cursor)
+        self.assertFalse(has_more)
+
+    def test_rows_older_than_the_overlap_are_not_repeated(self):
+        old = self.items[2]
+        OrderItem.objects.filter(pk=old.pk).update(updated_at=self.timestamp - timedelta(minutes=5))
+        cursor = encode_cursor(self.timestamp, max(item.id for item in self.items))
+
+        items, _, _ = get_station_changes(self.restaurant, 'kitchen', cursor)
+
+        self.assertNotIn(old.id, [item.id for item in items])
+
+
+@mock.patch('restaurants.table_state.push_table_states')
+class WaiterTableStateTests(TestCase):
+    """
+    Proyección del garzón: una entrada por garzón y una por mesa
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = create_restaurant()
+        user = User.objects.create_user('garzon', password='x', first_name='Ana')
+        cls.waiter = Waiter.objects.create(restaurant=cls.restaurant, user=user)
+        cls.table_a = Table.objects.create(restaurant=cls.restaurant, number='1', assigned_waiter=cls.waiter)
+        cls.table_b = Table.objects.create(restaurant=cls.restaurant, number='2', assigned_waiter=cls.waiter)
+
+    def setUp(self):
+        cache.clear()
+
+    def _projection(self):
+        return get_waiter_table_state(self.restaurant.id, self.waiter.id)
+
+    def test_cached_projection_is_read_without_queries(self, push):
+        built = self._projection()
+
+        with self.assertNumQueries(0):
+            projection = self._projection()
+
+        self.assertEqual(projection['table_ids'], [self.table_a.id, self.table_b.id])
+        self.assertEqual(projection['tables'], built['tables'])
+        self.assertEqual(projection['waiter_name'], 'Ana')
+
+    def test_refresh_rewrites_only_its_table(self, push):
+        self._projection()
+        waiter_state = cache.get(waiter_table_state_key(self.restaurant.id, self.waiter.id))
+        # Otro proceso reescribió la mesa B mientras tanto
+        state_b = dict(cache.get(table_state_key(self.table_b.id)), ready_orders_count=1)
+        cache.set(table_state_key(self.table_b.id), state_b)
+
+        Order.objects.create(
+            restaurant=self.restaurant, table=self.table_a, customer_name='Cliente',
+            subtotal=Decimal('0'), total_amount=Decimal('0')
+        )
+        refresh_tables([self.table_a.id])
+
+        projection = self._projection()
+        self.assertEqual(projection['tables'][str(self.table_a.id)]['pending_orders_count'], 1)
+        self.assertEqual(projection['tables'][str(self.table_b.id)], state_b)
+        self.assertEqual(cache.get(waiter_table_state_key(self.restaurant.id, self.waiter.id)), waiter_state)
+        push.assert_called_once()
+
+    def test_missing_table_entry_is_recomputed_alone(self, push):
+        self._projection()
+        cache.delete(table_state_key(self.table_b.id))
+
+        projection = self._projection()
+
+        self.assertEqual(projection['table_ids'], [self.table_a.id, self.table_b.id])
+        self.assertEqual(projection['tables'][str(self.table_b.id)]['number'], '2')
+        self.assertIsNotNone(cache.get(table_state_key(self.table_b.id)))
+
+    def test_deactivated_table_leaves_the_projection(self, push):
+        self._projection()
+
+        self.table_b.is_active = False
+        self.table_b.save()
+
+        self.assertEqual(self._projection()['table_ids'], [self.table_a.id])
+
+
+class DayRangeTests(SimpleTestCase):
+    """
+    Rangos UTC de días locales en Chile, incluidos los cambios de horario
+    """
+
+    def setUp(self):
+        self.restaurant = Restaurant(timezone='America/Santiago')
+
+    def assertDay(self, day, start, hours):
+        day_start, day_end = day_range(self.restaurant, day)
+        self.assertEqual(day_start, start)
+        self.assertEqual(day_end - day_start, timedelta(hours=hours))
+        # Días consecutivos no se solapan ni dejan huecos
+        self.assertEqual(day_end, day_range(self.restaurant, day + timedelta(days=1))[0])
+
+    def test_regular_day(self):
+        self.assertDay(date(2024, 6, 1), datetime(2024, 6, 1, 4, tzinfo=dt_timezone.utc), 24)
+
+    def test_end_of_daylight_saving_day_has_25_hours(self):
+        # 7 de abril de 2024 a las 00:00 los relojes vuelven a las 23:00 del 6
+        self.assertDay(date(2024, 4, 6), datetime(2024, 4, 6, 3, tzinfo=dt_timezone.utc), 25)
+        self.assertDay(date(2024, 4, 7), datetime(2024, 4, 7, 4, tzinfo=dt_timezone.utc), 24)
+
+    def test_start_of_daylight_saving_day_has_23_hours(self):
+        # 8 de septiembre de 2024 la medianoche no existe: el día empieza a la 01:00
+        self.assertDay(date(2024, 9, 7), datetime(2024, 9, 7, 4, tzinfo=dt_timezone.utc), 24)
+        self.assertDay(date(2024, 9, 8), datetime(2024, 9, 8, 4, tzinfo=dt_timezone.utc), 23)
+
+
+class CursorCodecTests(SimpleTestCase):
+    """
+    El cursor de paginación (también el del KDS) conserva el microsegundo y el tipo del pk
+    """
+
+    def test_round_trip_with_integer_pk(self):
+        updated_at = datetime(2024, 9, 8, 4, 0, 0, 999999, tzinfo=dt_timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(updated_at, 42), OrderItem), (updated_at, 42))
+
+    def test_round_trip_with_uuid_pk(self):
+        created_at = datetime(2024, 4, 6, 3, 0, 0, 1, tzinfo=dt_timezone.utc)
+        pk = uuid.uuid4()
+        self.assertEqual(decode_cursor(encode_cursor(created_at, pk), Order), (created_at, pk))
+
+    def test_invalid_cursor(self):
+        for cursor in ('no-es-un-cursor', encode_cursor(timezone.now(), 'x'), '%%%'):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor, OrderItem)
+
+
+class CursorPaginationTests(TestCase):
+    """
+    Pedidos con la misma fecha se reparten entre páginas por pk, sin repetir ni saltar
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = create_restaurant()
+        cls.orders = [
+            Order.objects.create(
+                restaurant=cls.restaurant, customer_name='Cliente',
+                subtotal=Decimal('0'), total_amount=Decimal('0')
+            )
+            for _ in range(5)
+        ]
+        Order.objects.filter(restaurant=cls.restaurant).update(created_at=timezone.now().replace(microsecond=123456))
+
+    def test_paginate_splits_ties_by_pk(self):
+        queryset = Order.objects.filter(restaurant=self.restaurant)
+        seen = []
+        cursor = None
+        while True:
+            page = paginate(queryset, cursor, per_page=2)
+            seen.extend(order.pk for order in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(seen, sorted((order.pk for order in self.orders), reverse=True))
@@ -0,0 +1,116 @@
+"""
+Ventanas de tiempo en la zona horaria del restaurante
+
+Los pedidos se guardan en UTC, pero "hoy" para un local en Chile termina a las
+21:00 o 20:00 UTC según la época del año. Estas funciones convierten un día o
+un rango de días locales del restaurante en un rango semiabierto de datetimes
+UTC [inicio, fin), para filtrar con created_at__gte / created_at__lt: la BD
+recorre el índice de created_at en vez de aplicar DATE() fila por fila como
+hace created_at__date.
+
+La zona horaria es Restaurant.timezone. Con un id (hilos en segundo plano,
+señales) se lee del caché compartido; el caché se invalida al guardar el
+restaurante (restaurants/signals.py).
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+
+DEFAULT_TIMEZONE = 'America/Santiago'
+
+RESTAURANT_TZ_KEY = "restaurant_tz_{restaurant_id}"
+RESTAURANT_TZ_TTL = 60 * 60 * 24
+
+
+@lru_cache(maxsize=None)
+def _zone(name):
+    return ZoneInfo(name)
+
+
+def validate_timezone(value):
+    """Validador de Restaurant.timezone (nombre IANA, ej. 'America/Santiago')"""
+    try:
+        _zone(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f"Zona horaria desconocida: {value}")
+
+
+def _timezone_name(restaurant_id):
+    key = RESTAURANT_TZ_KEY.format(restaurant_id=restaurant_id)
+    name = cache.get(key)
+    if name is None:
+        from .models import Restaurant
+        name = Restaurant.objects.filter(pk=restaurant_id).values_list('timezone', flat=True).first() or DEFAULT_TIMEZONE
+        cache.set(key, name, timeout=RESTAURANT_TZ_TTL)
+    return name
+
+
+def invalidate_restaurant_timezone(restaurant_id):
+    cache.delete(RESTAURANT_TZ_KEY.format(restaurant_id=restaurant_id))
+
+
+def get_timezone(restaurant):
+    """ZoneInfo del restaurante (instancia o id)"""
+    if isinstance(restaurant, int):
+        name = _timezone_name(restaurant)
+    else:
+        name = restaurant.timezone
+    try:
+        return _zone(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return _zone(settings.TIME_ZONE)
+
+
+def local_now(restaurant):
+    return timezone.localtime(timezone.now(), get_timezone(restaurant))
+
+
+def local_today(restaurant):
+    """Fecha de hoy en la zona del restaurante"""
+    return local_now(restaurant).date()
+
+
+def local_date(restaurant, value):
+    """Día local del restaurante para un datetime (agrupación por día)"""
+    return timezone.localtime(value, get_timezone(restaurant)).date()
+
+
+def day_start(restaurant, day):
+    """Medianoche local del día, en UTC"""
+    return datetime.combine(day, time.min, tzinfo=get_timezone(restaurant)).astimezone(dt_timezone.utc)
+
+
+def date_range(restaurant, date_from, date_to=None):
+    """
+    [inicio, fin) en UTC para los días locales date_from..date_to (inclusive)
+
+    Sin date_to el rango llega hasta el final de hoy.
+    """
+    date_to = date_to or local_today(restaurant)
+    return day_start(restaurant, date_from), day_start(restaurant, date_to + timedelta(days=1))
+
+
+def day_range(restaurant, day):
+    """[inicio, fin) en UTC de un día local"""
+    return date_range(restaurant, day, day)
+
+
+def today_range(restaurant):
+    return day_range(restaurant, local_today(restaurant))
+
+
+def range_filter(restaurant, date_from, date_to=None, field='created_at'):
+    """Kwargs de filtro para los días locales date_from..date_to sobre un campo datetime"""
+    start, end = date_range(restaurant, date_from, date_to)
+    return {f'{field}__gte': start, f'{field}__lt': end}
+
+
+def today_filter(restaurant, field='created_at'):
+    today = local_today(restaurant)
+    return range_filter(restaurant, today, today, field)
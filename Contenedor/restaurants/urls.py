@@ -14,6 +14,7 @@ urlpatterns = [
     
     # API para información del tenant (dentro del contexto)
     path('api/tenant-info/', views.tenant_info_api, name='tenant_info_api'),
+    path('api/tenant-cache-stats/', views.tenant_cache_stats_api, name='tenant_cache_stats_api'),
     
     # Autenticación
     path('staff/login/', views.StaffLoginPageView.as_view(), name='staff_login'),
@@ -79,9 +80,13 @@ urlpatterns = [
     path('admin/tables/<int:table_id>/delete/', admin_views.delete_table, name='admin_tables_delete'),
     path('admin/tables/<int:table_id>/qr/preview/', admin_views.table_qr_preview, name='admin_tables_qr_preview'),
     path('admin/tables/<int:table_id>/qr/download/', admin_views.table_qr_download, name='admin_tables_qr_download'),
+    path('admin/tables/<int:table_id>/qr/image/', admin_views.table_qr_image, name='admin_tables_qr_image'),
+    path('admin/tables/qr/export/', admin_views.tables_qr_export, name='admin_tables_qr_export'),
     
     # Reportes y Analytics
     path('admin/reports/sales/', admin_views.SalesReportView.as_view(), name='admin_sales_report'),
+    path('admin/reports/export/', admin_views.orders_export, name='admin_reports_export'),
+    path('admin/realtime/metrics/', admin_views.realtime_metrics, name='admin_realtime_metrics'),
     
     # 🍳 SISTEMA DE COCINA
     path('kitchen/', kitchen_views.kitchen_dashboard, name='kitchen_dashboard'),
@@ -89,6 +94,7 @@ urlpatterns = [
     path('kitchen/item/<int:item_id>/status/', kitchen_views.update_item_status, name='kitchen_update_item_status'),
     path('kitchen/item/<int:item_id>/prep-time/', kitchen_views.update_prep_time, name='kitchen_update_prep_time'),
     path('kitchen/status/update/', kitchen_views.update_kitchen_status, name='update_kitchen_status'),
+    path('api/kitchen/queue/', kitchen_views.kitchen_queue_api, name='kitchen_queue_api'),
     
     # 🍸 SISTEMA DE BAR
     path('bar/', bar_views.bar_dashboard, name='bar_dashboard'),
@@ -115,6 +121,7 @@ urlpatterns = [
     path('tables/create/', views.create_table, name='create_table'),
     path('tables/<int:table_id>/qr/', views.generate_table_qr, name='generate_table_qr'),
     path('tables/<int:table_id>/qr/preview/', views.table_qr_preview, name='table_qr_preview'),
+    path('tables/<int:table_id>/qr/image/', views.table_qr_image, name='table_qr_image'),
     
     # Solicitar asistencia desde mesa
     path('table/<int:table_id>/request-assistance/', waiter_views.request_customer_assistance, name='request_customer_assistance'),
@@ -7,12 +7,11 @@ from django.urls import reverse_lazy
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
-from django.utils import timezone
 from django.urls import reverse
-import qrcode
-from io import BytesIO
-import base64
 from .models import Tenant, Restaurant, Table, TableScanLog
+from .counters import table_counter_totals
+from .time_windows import today_filter
+from .qr_service import QRCodeService, qr_format, qr_image_response
 from .middleware import get_current_tenant, get_current_restaurant
 
 # Create your views here.
@@ -349,6 +348,20 @@ def tenant_info_api(request, tenant_slug=None):
     return JsonResponse({'error': 'No tenant found'}, status=404)
 
 
+@login_required
+def tenant_cache_stats_api(request, tenant_slug=None):
+    """API para verificar hits/misses del caché de tenants (solo superusuarios)"""
+    from .tenant_cache import get_tenant_cache_stats
+    
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Sin permisos'}, status=403)
+    
+    return JsonResponse({
+        'success': True,
+        'stats': get_tenant_cache_stats(),
+    })
+
+
 # Vista de test SÚPER simple
 def ultra_simple_view(request, tenant_slug=None):
     """Vista de test súper básica"""
@@ -497,12 +510,15 @@ def tables_management(request, tenant_slug):
             'qr_enabled_tables': tables.filter(qr_enabled=True).count(),
             'total_scans_today': TableScanLog.objects.filter(
                 table__restaurant=restaurant,
-                scanned_at__date=timezone.now().date()
+                **today_filter(restaurant, 'scanned_at')
             ).count(),
-            'total_scans_all_time': sum(table.total_scans for table in tables),
-            'total_orders_from_qr': sum(table.total_orders for table in tables)
         }
         
+        # Contadores de escaneos y pedidos QR (un solo aggregate)
+        counters = table_counter_totals(restaurant)
+        stats['total_scans_all_time'] = counters['total_scans']
+        stats['total_orders_from_qr'] = counters['total_orders']
+        
         context = {
             'restaurant': restaurant,
             'tenant': tenant,
@@ -589,32 +605,11 @@ def generate_table_qr(request, tenant_slug, table_id):
         if not (request.user.is_superuser or restaurant.owner == request.user):
             return HttpResponse('Sin permisos', status=403)
         
-        # Generar código QR
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        
-        # Usar URL dinámica basada en el request
-        qr_url = table.get_full_qr_url(request)
-        qr.add_data(qr_url)
-        qr.make(fit=True)
-        
-        # Crear imagen QR
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convertir a bytes
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
+        # QR cacheado (se renderiza solo si cambió la URL o el UUID de la mesa)
+        fmt = qr_format(request)
+        rendered = QRCodeService.render_table(table, request, fmt=fmt, box_size=10, border=4)
         
-        # Retornar como imagen
-        response = HttpResponse(buffer.getvalue(), content_type='image/png')
-        response['Content-Disposition'] = f'attachment; filename="qr_mesa_{table.number}.png"'
-        
-        return response
+        return qr_image_response(request, rendered, filename=f"qr_mesa_{table.number}.{fmt}")
         
     except Exception as e:
         return HttpResponse(f'Error al generar QR: {str(e)}', status=500)
@@ -635,30 +630,13 @@ def table_qr_preview(request, tenant_slug, table_id):
             messages.error(request, 'Sin permisos')
             return redirect('restaurants:tables_management', tenant_slug=tenant_slug)
         
-        # Generar código QR como base64 para mostrar en HTML
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=8,
-            border=4,
-        )
-        
-        # Usar URL dinámica basada en el request
+        # La imagen se sirve aparte (table_qr_image) con caché y ETag
         qr_url = table.get_full_qr_url(request)
-        qr.add_data(qr_url)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
         
         context = {
             'restaurant': restaurant,
             'tenant': tenant,
             'table': table,
-            'qr_image': img_str,
             'qr_url': qr_url  # URL dinámica ya calculada
         }
         
@@ -669,6 +647,23 @@ def table_qr_preview(request, tenant_slug, table_id):
         return redirect('restaurants:tables_management', tenant_slug=tenant_slug)
 
 
+@login_required
+def table_qr_image(request, tenant_slug, table_id):
+    """
+    Imagen del código QR de una mesa (para mostrar en la vista previa)
+    """
+    tenant = get_object_or_404(Tenant, slug=tenant_slug)
+    restaurant = tenant.restaurant
+    table = get_object_or_404(Table, id=table_id, restaurant=restaurant)
+    
+    # Verificar permisos
+    if not (request.user.is_superuser or restaurant.owner == request.user):
+        return HttpResponse('Sin permisos', status=403)
+    
+    rendered = QRCodeService.render_table(table, request, fmt=qr_format(request), box_size=8, border=4)
+    return qr_image_response(request, rendered)
+
+
 def get_client_ip(request):
     """Obtener IP del cliente"""
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
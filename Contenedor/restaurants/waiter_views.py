@@ -5,9 +5,9 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-from django.core.paginator import Paginator
 
 from .models import Waiter, WaiterNotification, Table
+from . import pagination
 from .waiter_notifications import WaiterNotificationService, WaiterDashboardService
 
 
@@ -118,7 +118,7 @@ def waiter_notifications(request, tenant_slug):
         status_filter = request.GET.get('status', 'all')
         notification_type = request.GET.get('type', 'all')
         
-        notifications = WaiterNotificationService.get_waiter_notifications(waiter)
+        notifications = WaiterNotificationService.get_waiter_notifications(waiter).select_related('table')
         
         if status_filter != 'all':
             notifications = notifications.filter(status=status_filter)
@@ -126,10 +126,28 @@ def waiter_notifications(request, tenant_slug):
         if notification_type != 'all':
             notifications = notifications.filter(notification_type=notification_type)
         
-        # Paginación
-        paginator = Paginator(notifications, 20)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        # Paginación por cursor sobre (created_at, id): sin COUNT ni OFFSET
+        as_json = pagination.wants_json(request)
+        try:
+            page_obj = pagination.paginate_request(request, notifications, 20, strict=as_json)
+        except pagination.InvalidCursor:
+            return JsonResponse({'success': False, 'error': 'Cursor inválido'}, status=400)
+        
+        if as_json:
+            return JsonResponse(pagination.page_payload(page_obj, [
+                {
+                    'id': notification.id,
+                    'type': notification.notification_type,
+                    'title': notification.title,
+                    'message': notification.message,
+                    'status': notification.status,
+                    'priority': notification.priority,
+                    'table': notification.table.number,
+                    'order_id': notification.order_id,
+                    'created_at': notification.created_at,
+                }
+                for notification in page_obj
+            ]))
         
         context = {
             'restaurant': restaurant,
@@ -445,104 +463,30 @@ def waiter_end_table_session(request, tenant_slug):
 def waiter_table_sessions_status(request, tenant_slug):
     """
     API mejorada para obtener estado de sesiones de mesas y pedidos en tiempo real
+    
+    Lee la proyección del garzón (restaurants/table_state.py) con un GET del caché;
+    el dashboard la recibe por WebSocket y solo usa este endpoint como respaldo.
     """
     try:
-        from .table_session_manager import TableSessionManager
-        from django.core.cache import cache
+        from .staff_roles import resolve_staff_role
+        from .table_state import get_waiter_table_state, render_waiter_tables
         
         restaurant = request.restaurant
-        waiter = get_object_or_404(Waiter, restaurant=restaurant, user=request.user)
         
-        # Obtener mesas asignadas
-        assigned_tables = waiter.assigned_tables.filter(is_active=True).order_by('number')
+        # Garzón desde el rol cacheado (sin consulta); si no, búsqueda directa
+        staff_role, waiter_id = resolve_staff_role(request.user.pk, restaurant.pk)
+        if staff_role != 'waiter':
+            waiter_id = get_object_or_404(Waiter, restaurant=restaurant, user=request.user).pk
         
-        tables_status = []
-        for table in assigned_tables:
-            # 1. Verificar sesión activa real
-            recent_scan = table.scan_logs.filter(
-                scanned_at__gte=timezone.now() - timedelta(minutes=60),
-                ip_address__isnull=False
-            ).exclude(ip_address="WAITER_CLEANUP").order_by('-scanned_at').first()
-            
-            # 2. Verificar si fue invalidada por garzón
-            invalidation_key = f"table_invalidated_{table.id}"
-            invalidation_data = cache.get(invalidation_key)
-            was_invalidated = invalidation_data is not None
-            
-            has_active_session = bool(recent_scan and not was_invalidated)
-            session_info = None
-            
-            if has_active_session and recent_scan:
-                time_diff = timezone.now() - recent_scan.scanned_at
-                minutes_ago = int(time_diff.total_seconds() // 60)
-                session_info = {
-                    'scan_time': recent_scan.scanned_at.isoformat(),
-                    'time_ago': minutes_ago,
-                    'ip_address': recent_scan.ip_address[:12] + "..." if len(recent_scan.ip_address) > 12 else recent_scan.ip_address,
-                    'time_ago_text': f"{minutes_ago} min" if minutes_ago > 0 else "Recién conectado"
-                }
-            
-            # 3. Contar pedidos nuevos/pendientes (últimas 2 horas)
-            pending_orders = table.orders.filter(
-                status__in=['pending', 'preparing'],
-                created_at__gte=timezone.now() - timedelta(hours=2)
-            ).count()
-            
-            # 4. Pedidos listos para entregar
-            ready_orders = table.orders.filter(
-                status='ready',
-                created_at__gte=timezone.now() - timedelta(hours=4)
-            ).count()
-            
-            # 5. Último pedido información
-            last_order = table.orders.filter(
-                created_at__gte=timezone.now() - timedelta(hours=4)
-            ).order_by('-created_at').first()
-            
-            last_order_info = None
-            if last_order:
-                time_diff = timezone.now() - last_order.created_at
-                minutes_ago = int(time_diff.total_seconds() // 60)
-                last_order_info = {
-                    'id': last_order.id,
-                    'status': last_order.status,
-                    'status_display': last_order.get_status_display(),
-                    'total': float(last_order.total_amount),
-                    'minutes_ago': minutes_ago,
-                    'items_count': last_order.items.count(),
-                    'time_text': f"hace {minutes_ago} min" if minutes_ago > 0 else "Recién"
-                }
-            
-            # 6. Información de invalidación si existe
-            invalidation_info = None
-            if was_invalidated and invalidation_data:
-                invalidation_info = {
-                    'waiter_name': invalidation_data.get('waiter_name'),
-                    'reason': invalidation_data.get('reason'),
-                    'sessions_ended': invalidation_data.get('sessions_ended', 0)
-                }
-            
-            table_data = {
-                'id': table.id,
-                'number': table.number,
-                'name': table.display_name,
-                'has_active_session': has_active_session,
-                'session_info': session_info,
-                'pending_orders_count': pending_orders,
-                'ready_orders_count': ready_orders,
-                'last_order': last_order_info,
-                'was_invalidated': was_invalidated,
-                'invalidation_info': invalidation_info,
-                'needs_attention': pending_orders > 0 or ready_orders > 0
-            }
-            
-            tables_status.append(table_data)
+        projection = get_waiter_table_state(restaurant.id, waiter_id)
+        if projection is None:
+            return JsonResponse({'success': False, 'error': 'Garzón no encontrado'}, status=404)
         
         return JsonResponse({
             'success': True,
-            'tables': tables_status,
+            'tables': render_waiter_tables(projection),
             'timestamp': timezone.now().isoformat(),
-            'waiter_name': waiter.full_name
+            'waiter_name': projection['waiter_name']
         })
         
     except Exception as e: